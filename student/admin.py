@@ -1,5 +1,14 @@
 from django.contrib import admin
-from .models import Course, Batch, Paper, Student, StudentMark, Profile
+from .grading import batches_using, regrade_batches
+from .models import (Course, Batch, Paper, Student, StudentMark, Profile, ExportJob, ReportRun, ReportSnapshot,
+                     GradingScheme, GradeBoundary, ExamWeight, PaperGrade, StudentGPA)
+
+class BatchListFilter(admin.RelatedFieldListFilter):
+    """Batch choices with their course loaded (Batch.__str__ shows it), not one query per batch."""
+    def field_choices(self, field, request, model_admin):
+        ordering = self.field_admin_ordering(field, request, model_admin) or ('course__name', 'name')
+        return [(b.pk, str(b)) for b in Batch.objects.select_related('course').order_by(*ordering)]
+
 
 @admin.register(Profile)
 class ProfileAdmin(admin.ModelAdmin):
@@ -16,7 +25,8 @@ class CourseAdmin(admin.ModelAdmin):
 
 @admin.register(Batch)
 class BatchAdmin(admin.ModelAdmin):
-    list_display = ('id', 'name', 'course', 'year', 'is_active')
+    list_display = ('id', 'name', 'course', 'year', 'is_active', 'grading_scheme')
+    list_select_related = ('course', 'grading_scheme')
     search_fields = ('name', 'course__name', 'course__courseid')
     list_filter = ('is_active',)
     ordering = ('course__name', 'name')
@@ -24,7 +34,7 @@ class BatchAdmin(admin.ModelAdmin):
 
 @admin.register(Paper)
 class PaperAdmin(admin.ModelAdmin):
-    list_display = ('id', 'code', 'name', 'paper_type', 'max_marks')
+    list_display = ('id', 'code', 'name', 'paper_type', 'max_marks', 'credits')
     search_fields = ('code', 'name')
     list_filter = ('paper_type',)
 
@@ -39,5 +49,67 @@ class StudentAdmin(admin.ModelAdmin):
 @admin.register(StudentMark)
 class StudentMarkAdmin(admin.ModelAdmin):
     list_display = ('id', 'student', 'paper', 'exam_type', 'batch', 'marks', 'created_at')
+    list_select_related = ('student', 'paper', 'batch__course')
     search_fields = ('student__name', 'student__regno', 'paper__code')
-    list_filter = ('exam_type', 'batch')
+    list_filter = ('exam_type', ('batch', BatchListFilter))
+
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'status', 'rows_done', 'rows_total', 'requested_by', 'created_at', 'finished_at')
+    list_filter = ('status', 'kind')
+    readonly_fields = ('params_hash', 'data_etag', 'file_path')
+
+
+@admin.register(ReportRun)
+class ReportRunAdmin(admin.ModelAdmin):
+    list_display = ('id', 'started_at', 'finished_at', 'full', 'partitions')
+
+
+@admin.register(ReportSnapshot)
+class ReportSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('id', 'batch', 'paper', 'exam_type', 'taken_at', 'is_current', 'mark_count', 'pass_rate', 'avg_marks')
+    list_select_related = ('batch__course', 'paper')
+    list_filter = ('is_current', 'exam_type', ('batch', BatchListFilter))
+
+
+class GradeBoundaryInline(admin.TabularInline):
+    model = GradeBoundary
+    extra = 0
+
+
+class ExamWeightInline(admin.TabularInline):
+    model = ExamWeight
+    extra = 0
+
+
+@admin.register(GradingScheme)
+class GradingSchemeAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'is_default', 'updated_at')
+    inlines = (GradeBoundaryInline, ExamWeightInline)
+
+    def save_related(self, request, form, formsets, change):
+        """Boundaries and weights are saved here, so regrade after them."""
+        super().save_related(request, form, formsets, change)
+        scheme = form.instance
+        if 'is_default' in form.changed_data:
+            regrade_batches(list(Batch.objects.filter(grading_scheme__isnull=True).values_list('pk', flat=True))
+                            + batches_using(scheme))
+        elif form.has_changed() or any(fs.has_changed() for fs in formsets):
+            regrade_batches(batches_using(scheme))
+
+
+@admin.register(PaperGrade)
+class PaperGradeAdmin(admin.ModelAdmin):
+    list_display = ('id', 'student', 'paper', 'batch', 'weighted_percentage', 'letter', 'grade_point', 'credits')
+    list_select_related = ('student', 'paper', 'batch__course')
+    search_fields = ('student__regno', 'student__name', 'paper__code')
+    list_filter = ('letter', ('batch', BatchListFilter))
+
+
+@admin.register(StudentGPA)
+class StudentGPAAdmin(admin.ModelAdmin):
+    list_display = ('id', 'student', 'batch', 'gpa', 'credits_attempted', 'credits_earned', 'updated_at')
+    list_select_related = ('student', 'batch__course')
+    search_fields = ('student__regno', 'student__name')
+    list_filter = (('batch', BatchListFilter),)
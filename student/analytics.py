@@ -0,0 +1,67 @@
+"""
+Score analytics computed in NumPy.
+
+The marks column for the requested slice is pulled once (already cast to float
+by the database) and every statistic is derived from that single array.
+"""
+import numpy as np
+from django.db.models import FloatField
+from django.db.models.functions import Cast
+
+from .models import StudentMark
+from .scores import pass_cutoff
+
+DEFAULT_BINS = 10
+MAX_BINS = 100
+
+
+def _r(value):
+    return round(float(value), 2)
+
+
+def score_distribution(batch, paper, exam_type=None, bins=DEFAULT_BINS):
+    """Summary statistics and a histogram of marks for one batch/paper (optionally one exam)."""
+    qs = StudentMark.objects.filter(batch=batch, paper=paper)
+    if exam_type:
+        qs = qs.filter(exam_type=exam_type)
+    scores = np.fromiter(
+        qs.annotate(score=Cast("marks", FloatField())).values_list("score", flat=True).iterator(chunk_size=5000),
+        dtype=np.float64,
+    )
+
+    max_marks = float(paper.max_marks or 0)
+    cutoff = pass_cutoff(paper.max_marks)
+    upper = max_marks if max_marks > 0 else (float(scores.max()) if scores.size else 1.0)
+    counts, edges = np.histogram(scores, bins=bins, range=(0.0, upper))
+    histogram = [
+        {"from": _r(edges[i]), "to": _r(edges[i + 1]), "count": int(counts[i])}
+        for i in range(len(counts))
+    ]
+
+    result = {
+        "batch": batch.pk,
+        "paper": paper.pk,
+        "paper_code": paper.code,
+        "exam_type": exam_type or None,
+        "max_marks": paper.max_marks,
+        "count": int(scores.size),
+        "mean": None, "median": None, "std": None,
+        "min": None, "max": None, "q1": None, "q3": None,
+        "pass_mark": _r(cutoff) if cutoff is not None else None,
+        "pass_rate": None,
+        "histogram": histogram,
+    }
+    if scores.size:
+        q1, median, q3 = np.percentile(scores, [25, 50, 75])
+        result.update({
+            "mean": _r(scores.mean()),
+            "median": _r(median),
+            "std": _r(scores.std()),
+            "min": _r(scores.min()),
+            "max": _r(scores.max()),
+            "q1": _r(q1),
+            "q3": _r(q3),
+        })
+        if cutoff is not None:
+            result["pass_rate"] = _r((scores >= float(cutoff)).mean() * 100)
+    return result
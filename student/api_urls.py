@@ -1,8 +1,12 @@
+from django.urls import re_path
 from rest_framework.routers import DefaultRouter
-from .api_views import StudentViewSet, StudentMarkViewSet
+from .api_views import StudentViewSet, StudentMarkViewSet, StudentGradeViewSet, ScoreDistributionView
 
 router = DefaultRouter()
 router.register(r'students', StudentViewSet, basename='api-students')
 router.register(r'marks', StudentMarkViewSet, basename='api-marks')
+router.register(r'grades', StudentGradeViewSet, basename='api-grades')
 
-urlpatterns = router.urls
+urlpatterns = router.urls + [
+    re_path(r'^analytics/distribution/?$', ScoreDistributionView.as_view(), name='api-distribution'),
+]
@@ -1,24 +1,141 @@
-from rest_framework import viewsets, filters, permissions
+from rest_framework import viewsets, filters, permissions, serializers
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db.models import Q
-from .models import Student, StudentMark
-from .serializers import StudentSerializer, StudentMarkSerializer
+from rest_framework.views import APIView
+from decimal import Decimal, InvalidOperation
+from django.db.models import Prefetch, Q
+from .analytics import DEFAULT_BINS, MAX_BINS, score_distribution
+from .cache import DERIVED_REBUILT, cached
+from .conditional import not_modified, stamp, version_validators
+from .identity import resolve_identity
+from .importers import bulk_create_marks, bulk_update_marks
+from .models import Batch, Paper, PaperGrade, Student, StudentGPA, StudentMark
+from .pagination import KeysetPagination
+from .search import search
+from .serializers import (BulkMarkCreateItemSerializer, BulkMarkUpdateItemSerializer, StudentFlatSerializer,
+                          StudentGPASerializer, StudentMarkFlatSerializer, StudentMarkSerializer, StudentSerializer)
 
-class StudentViewSet(viewsets.ModelViewSet):
-    queryset = Student.objects.select_related('batch__course').all().order_by('regno')
+class DocumentSearchFilter(filters.SearchFilter):
+    """?search= answered by the search backend (student.search) instead of OR'ed icontains.
+    search_fields on the view are kept for the browsable API form only."""
+
+    def filter_queryset(self, request, queryset, view):
+        return search(queryset, request.query_params.get(self.search_param, ''))
+
+
+def request_identity(request):
+    """request.identity, or a fresh one when DRF authenticated someone other than the session user."""
+    identity = request.identity
+    if identity.user.pk != request.user.pk:
+        identity = resolve_identity(request.user)
+    return identity
+
+
+class HasRole(permissions.BasePermission):
+    """Authenticated and holding one of `roles` (Profile.role, see student/identity.py)."""
+    roles = ()
+
+    def has_permission(self, request, view):
+        return bool(request.user and request.user.is_authenticated
+                    and request_identity(request).has_role(*self.roles))
+
+
+class IsAdminOrStaff(HasRole):
+    roles = ('admin', 'staff')
+
+
+class CachedReadMixin:
+    """
+    list/retrieve answered from the versioned cache (student.cache); any write to a model in
+    cache_depends_on bumps its version. Only response data is cached, rendering stays per request.
+    """
+    cache_depends_on = ()
+
+    def cached_response(self, request, build, per_user=False):
+        # absolute URI: paginated responses embed absolute next/previous links
+        parts = (self.action, request.build_absolute_uri(), request.user.pk if per_user else None)
+
+        def data():
+            response = build()
+            return response.status_code, response.data
+
+        status, payload = cached(f"api:{self.basename}", self.cache_depends_on, parts, data)
+        return Response(payload, status=status)
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, lambda: super(CachedReadMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(request, lambda: super(CachedReadMixin, self).retrieve(request, *args, **kwargs))
+
+
+class SparseFieldsMixin:
+    """
+    GET ?fields=regno,paper_code,marks and/or ?expand=student switch reads to the flat
+    serializer (flat_serializer_class); without them the nested representation is kept.
+    """
+    flat_serializer_class = None
+
+    def _param_list(self, name):
+        raw = self.request.query_params.get(name, '')
+        return [part.strip() for part in raw.split(',') if part.strip()]
+
+    def wants_flat(self):
+        request = getattr(self, 'request', None)
+        return (self.flat_serializer_class is not None and request is not None and request.method == 'GET'
+                and ('fields' in request.query_params or 'expand' in request.query_params))
+
+    def get_serializer_class(self):
+        if self.wants_flat():
+            return self.flat_serializer_class
+        return super().get_serializer_class()
+
+    def get_serializer(self, *args, **kwargs):
+        if self.wants_flat():
+            kwargs.update(fields=self._param_list('fields'), expand=self._param_list('expand'))
+        return super().get_serializer(*args, **kwargs)
+
+
+class ConditionalGetMixin:
+    """
+    ETag on list and retrieve, from the cache versions of cache_depends_on (student.conditional);
+    a matching If-None-Match gets a 304 before any query runs.
+    """
+
+    def conditional_response(self, request, build):
+        validators = version_validators(self.cache_depends_on, variant=(
+            request.get_full_path(), request.accepted_media_type, request.user.pk))
+        return not_modified(request, validators) or stamp(build(), validators)
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(request,
+                                         lambda: super(ConditionalGetMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(request,
+                                         lambda: super(ConditionalGetMixin, self).retrieve(request, *args, **kwargs))
+
+
+class StudentViewSet(SparseFieldsMixin, ConditionalGetMixin, CachedReadMixin, viewsets.ModelViewSet):
+    queryset = Student.objects.select_related('batch__course').all().order_by('-created_at', '-id')
     serializer_class = StudentSerializer
+    flat_serializer_class = StudentFlatSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    # keyset pages are always (created_at, id) ordered, so there is no ?ordering=
+    pagination_class = KeysetPagination
+    filter_backends = [DocumentSearchFilter]
     search_fields = ['regno', 'name', 'email', 'batch__name', 'batch__course__name']
-    ordering_fields = ['regno', 'name']
+    cache_depends_on = ['Student', 'Batch', 'Course']
 
-class StudentMarkViewSet(viewsets.ModelViewSet):
-    queryset = StudentMark.objects.select_related('student__batch__course', 'paper', 'batch').all().order_by('-created_at')
+class StudentMarkViewSet(SparseFieldsMixin, ConditionalGetMixin, CachedReadMixin, viewsets.ModelViewSet):
+    queryset = StudentMark.objects.select_related('student__batch__course', 'paper', 'batch__course', 'rank').all().order_by('-created_at', '-id')
     serializer_class = StudentMarkSerializer
+    flat_serializer_class = StudentMarkFlatSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    pagination_class = KeysetPagination
+    filter_backends = [DocumentSearchFilter]
     search_fields = ['student__regno', 'student__name', 'paper__code', 'paper__name', 'exam_type', 'batch__name']
+    cache_depends_on = ['StudentMark', 'Student', 'Paper', 'Batch', 'Course', DERIVED_REBUILT]
 
     def get_queryset(self):
         qs = super().get_queryset()
@@ -35,22 +152,136 @@ class StudentMarkViewSet(viewsets.ModelViewSet):
         paper_id = self.request.GET.get('paper_id')
         if paper_id:
             qs = qs.filter(paper__id=paper_id)
+        # stored scores (student.scores): ?passed=false, ?min_percentage=90
+        passed = self.request.GET.get('passed', '').lower()
+        if passed in ('true', 'false'):
+            qs = qs.filter(passed=passed == 'true')
+        min_percentage = self.request.GET.get('min_percentage')
+        if min_percentage:
+            try:
+                qs = qs.filter(percentage__gte=Decimal(min_percentage))
+            except InvalidOperation:
+                pass
         return qs
 
+    bulk_max_items = 5000
+
+    @action(detail=False, methods=['post', 'patch'], permission_classes=[IsAdminOrStaff])
+    def bulk(self, request, format=None):
+        """
+        POST   [{student_id, paper_id, exam_type, batch_id, marks}, ...]  create
+        PATCH  [{id, marks}, ...]                                          update
+        Every valid item is written in one transaction; each item gets its own status.
+        """
+        items = request.data
+        if not isinstance(items, list):
+            return Response({"detail": "Expected a list of items."}, status=400)
+        if len(items) > self.bulk_max_items:
+            return Response({"detail": f"At most {self.bulk_max_items} items per request."}, status=400)
+
+        creating = request.method == 'POST'
+        # one serializer instance checks every item (no per-item field setup)
+        checker = (BulkMarkCreateItemSerializer if creating else BulkMarkUpdateItemSerializer)()
+        statuses, valid = {}, []
+        for index, item in enumerate(items):
+            try:
+                valid.append((index, checker.run_validation(item)))
+            except serializers.ValidationError as exc:
+                statuses[index] = {"index": index, "status": "error", "errors": exc.detail}
+
+        if valid:
+            statuses.update((bulk_create_marks if creating else bulk_update_marks)(valid))
+        results = [statuses[i] for i in range(len(items))]
+        counts = {"created": 0, "updated": 0, "error": 0}
+        for row in results:
+            counts[row["status"]] += 1
+        return Response({"created": counts["created"], "updated": counts["updated"],
+                         "failed": counts["error"], "results": results})
+
     @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated])
-    def my(self, request):
-        # returns marks for logged in user mapped by regno/email -> Student
-        user = request.user
-        student_qs = Student.objects.filter(regno__iexact=user.username)
-        if not student_qs.exists() and user.email:
-            student_qs = Student.objects.filter(email__iexact=user.email)
-        if not student_qs.exists():
+    def my(self, request, format=None):
+        # returns marks for logged in user mapped by regno/email -> Student (student/identity.py)
+        identity = request_identity(request)
+        if identity.student_id is None:
             return Response({"detail": "No student record found for this user."}, status=404)
-        student = student_qs.first()
-        qs = self.get_queryset().filter(student=student)
+        qs = self.get_queryset().filter(student_id=identity.student_id)
+        return self.conditional_response(request, lambda: self.cached_response(
+            request, lambda: self._my_page(qs), per_user=True))
+
+    def _my_page(self, qs):
         page = self.paginate_queryset(qs)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
             return self.get_paginated_response(serializer.data)
         serializer = self.get_serializer(qs, many=True)
         return Response(serializer.data)
+
+
+class GradePagination(KeysetPagination):
+    field = "updated_at"
+
+
+class StudentGradeViewSet(ConditionalGetMixin, CachedReadMixin, viewsets.ReadOnlyModelViewSet):
+    """GPA per (student, batch) with the paper grades behind it; see student/grading.py."""
+    queryset = StudentGPA.objects.select_related('student', 'batch').prefetch_related(
+        Prefetch('student__paper_grades', queryset=PaperGrade.objects.select_related('paper').order_by('paper__code'))
+    ).order_by('-updated_at', '-id')
+    serializer_class = StudentGPASerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = GradePagination
+    cache_depends_on = ['StudentMark', 'Student', 'Paper', 'Batch', DERIVED_REBUILT]
+
+    def get_queryset(self):
+        qs = super().get_queryset()
+        # ?batch_id=, ?student_id=, ?student_regno=
+        batch_id = self.request.GET.get('batch_id')
+        if batch_id:
+            qs = qs.filter(batch__id=batch_id)
+        student_id = self.request.GET.get('student_id')
+        if student_id:
+            qs = qs.filter(student__id=student_id)
+        student_regno = self.request.GET.get('student_regno')
+        if student_regno:
+            qs = qs.filter(student__regno__iexact=student_regno)
+        return qs
+
+    @action(detail=False, methods=['get'])
+    def my(self, request, format=None):
+        identity = request_identity(request)
+        if identity.student_id is None:
+            return Response({"detail": "No student record found for this user."}, status=404)
+        qs = self.get_queryset().filter(student_id=identity.student_id)
+        return self.conditional_response(request, lambda: self.cached_response(
+            request, lambda: Response(self.get_serializer(qs, many=True).data), per_user=True))
+
+
+class ScoreDistributionView(APIView):
+    """
+    GET /api/analytics/distribution?batch=<id>&paper=<id>[&exam_type=External][&bins=10]
+    Mean, median, std, quartiles, pass rate and a histogram for one batch/paper.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        try:
+            batch_id = int(request.GET.get('batch', ''))
+            paper_id = int(request.GET.get('paper', ''))
+        except ValueError:
+            return Response({"detail": "batch and paper must be numeric ids."}, status=400)
+        try:
+            bins = int(request.GET.get('bins', DEFAULT_BINS))
+        except ValueError:
+            return Response({"detail": "bins must be an integer."}, status=400)
+        if not 1 <= bins <= MAX_BINS:
+            return Response({"detail": f"bins must be between 1 and {MAX_BINS}."}, status=400)
+
+        batch = Batch.objects.filter(pk=batch_id).first()
+        paper = Paper.objects.filter(pk=paper_id).first()
+        if not batch or not paper:
+            return Response({"detail": "Batch or paper not found."}, status=404)
+
+        exam_type = request.GET.get('exam_type', '').strip() or None
+        data = cached("api:distribution", ["Paper", f"StudentMark:batch:{batch.pk}"],
+                      (batch.pk, paper.pk, exam_type, bins),
+                      lambda: score_distribution(batch, paper, exam_type=exam_type, bins=bins))
+        return Response(data)
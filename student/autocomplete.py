@@ -0,0 +1,102 @@
+"""
+Prefix-search autocomplete for the student / paper / batch pickers.
+
+The mark and student forms used to render every Student, Paper and Batch as
+an <option>. AutocompleteSelect now renders only the chosen option; the rest
+are fetched as the user types from /student/autocomplete/<source>/?q=..., in
+pages of PAGE_SIZE, by static/js/autocomplete.js.
+
+A term matches the start of any of a source's fields (case-insensitive),
+which compiles to `UPPER(col) LIKE UPPER('term%')`; on PostgreSQL migration
+0009 adds text_pattern_ops indexes on those expressions. Pages are keyset
+pages on (order field, id), so "more" never needs a COUNT or an OFFSET.
+"""
+import base64
+import json
+
+from django import forms
+from django.db.models import Q
+from django.urls import reverse
+
+from .models import Batch, Paper, Student
+
+PAGE_SIZE = 20
+MAX_TERM = 64
+
+
+class Source:
+    def __init__(self, queryset, fields, order):
+        self.queryset = queryset
+        self.fields = fields
+        self.order = order
+
+
+SOURCES = {
+    "students": Source(Student.objects.all(), ("regno", "name"), "regno"),
+    "papers": Source(Paper.objects.all(), ("code", "name"), "code"),
+    "batches": Source(Batch.objects.select_related("course"), ("name", "course__courseid"), "name"),
+}
+
+
+def _encode(value, pk):
+    return base64.urlsafe_b64encode(json.dumps([value, pk]).encode()).decode().rstrip("=")
+
+
+def _decode(token):
+    try:
+        value, pk = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        return str(value), int(pk)
+    except (ValueError, TypeError):
+        return None
+
+
+def lookup(source, term="", cursor=None, page_size=PAGE_SIZE):
+    """{"results": [{"id", "text"}, ...], "next": cursor or None} for one page of matches."""
+    src = SOURCES[source]
+    qs = src.queryset
+    term = term.strip()[:MAX_TERM]
+    if term:
+        match = Q()
+        for field in src.fields:
+            match |= Q(**{f"{field}__istartswith": term})
+        qs = qs.filter(match)
+    after = _decode(cursor) if cursor else None
+    if after:
+        value, pk = after
+        qs = qs.filter(Q(**{f"{src.order}__gt": value}) | Q(**{src.order: value, "pk__gt": pk}))
+    rows = list(qs.order_by(src.order, "pk")[:page_size + 1])
+    page = rows[:page_size]
+    last = page[-1] if page else None
+    return {
+        "results": [{"id": obj.pk, "text": str(obj)} for obj in page],
+        "next": _encode(getattr(last, src.order), last.pk) if len(rows) > page_size else None,
+    }
+
+
+class AutocompleteSelect(forms.Select):
+    """<select> that renders only the selected option; other options are fetched from `source`."""
+
+    class Media:
+        js = ("js/autocomplete.js",)
+
+    def __init__(self, source, attrs=None):
+        super().__init__(attrs={"class": "form-select", **(attrs or {})})
+        self.source = source
+
+    def build_attrs(self, base_attrs, extra_attrs=None):
+        attrs = super().build_attrs(base_attrs, extra_attrs)
+        attrs["data-autocomplete"] = reverse("autocomplete", args=[self.source])
+        return attrs
+
+    def optgroups(self, name, value, attrs=None):
+        chosen = [v for v in value if v not in (None, "")]
+        field = self.choices.field
+        options = [self.create_option(name, "", field.empty_label or "", not chosen, 0)]
+        if chosen:
+            try:
+                objs = list(self.choices.queryset.filter(pk__in=chosen))
+            except (ValueError, TypeError):  # a garbled id posted back
+                objs = []
+            for index, obj in enumerate(objs, 1):
+                options.append(self.create_option(name, str(obj.pk), field.label_from_instance(obj), True, index))
+        return [(None, options, 0)]
@@ -0,0 +1,174 @@
+"""
+Benchmarks for the hot pages and API endpoints (`manage.py benchmark`).
+
+A synthetic dataset of configurable size is bulk-inserted into a throwaway
+test database, then every case is requested through the test client and
+measured: wall time cold (empty cache) and warm, SQL query count, bytes sent,
+and peak Python memory (tracemalloc, on a separate cold pass so it doesn't
+skew the timings). Results are plain dicts, written out as JSON so runs can be
+diffed across commits.
+"""
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+from urllib.parse import quote
+
+import django
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .models import Batch, Course, Paper, Profile, Student, StudentMark
+from .pagination import encode_cursor
+from .sampledata import generate
+
+PASSWORD = "bench"
+
+
+def seed_dataset(students=1000, papers=10, batches=10, exams=3, seed=0):
+    """Generate the benchmark dataset (see student.sampledata); returns the row counts."""
+    return generate(courses=max(1, batches // 4), batches=batches, papers=papers, students=students,
+                    exams=exams, seed=seed, prefix="BN")
+
+
+def _user(username, role):
+    user = User.objects.create_user(username, password=PASSWORD)
+    Profile.objects.filter(user=user).update(role=role)
+    client = Client()
+    client.login(username=username, password=PASSWORD)
+    return client
+
+
+def _deep_cursor(queryset, depth=0.9):
+    """Keyset cursor that starts a page `depth` of the way through `queryset`."""
+    offset = int(queryset.count() * depth)
+    row = queryset.order_by("-created_at", "-id").values_list("created_at", "id")[offset:offset + 1].first()
+    return encode_cursor("next", *row) if row else ""
+
+
+def _last_page(queryset, per_page):
+    return max(1, -(-queryset.count() // per_page))
+
+
+def cases():
+    """(name, client role, path) for every benchmarked request; call after seeding."""
+    marks_cursor = _deep_cursor(StudentMark.objects.all())
+    students_cursor = _deep_cursor(Student.objects.all())
+    student = Student.objects.order_by("regno").first()
+    term = quote(student.name)
+    return [
+        ("student_dashboard", "student", "/student/student/dashboard/"),
+        ("displaycourse", "admin", "/student/displaycourse/"),
+        ("displaycourse_deep", "admin", f"/student/displaycourse/?page={_last_page(Course.objects.all(), 10)}"),
+        ("displaybatch", "admin", "/student/displaybatch/"),
+        ("displaybatch_deep", "admin", f"/student/displaybatch/?page={_last_page(Batch.objects.all(), 10)}"),
+        ("displaypaper", "admin", "/student/displaypaper/"),
+        ("displaypaper_deep", "admin", f"/student/displaypaper/?page={_last_page(Paper.objects.all(), 10)}"),
+        ("displaystudent", "admin", "/student/displaystudent/"),
+        ("displaystudent_deep", "admin", f"/student/displaystudent/?page={_last_page(Student.objects.all(), 10)}"),
+        ("displaystudentmarks", "admin", "/student/displaystudentmarks/"),
+        ("displaystudentmarks_deep", "admin", f"/student/displaystudentmarks/?cursor={marks_cursor}"),
+        ("search_students", "admin", f"/student/displaystudent/?query={term}"),
+        ("search_marks", "admin", f"/student/displaystudentmarks/?query={term}"),
+        ("export_courses_csv", "admin", "/student/export/courses/"),
+        ("export_batches_csv", "admin", "/student/export/batches/"),
+        ("export_papers_csv", "admin", "/student/export/papers/"),
+        ("export_students_csv", "admin", "/student/export/students/"),
+        ("export_marks_csv", "admin", "/student/reports/export/marks/"),
+        ("export_marks_csv_regno", "admin", f"/student/reports/export/marks/?regno={student.regno}"),
+        ("api_students", "admin", "/api/students/"),
+        ("api_students_deep", "admin", f"/api/students/?cursor={students_cursor}"),
+        ("api_students_search", "admin", f"/api/students/?search={term}"),
+        ("api_marks", "admin", "/api/marks/"),
+        ("api_marks_deep", "admin", f"/api/marks/?cursor={marks_cursor}"),
+        ("api_marks_flat", "admin", "/api/marks/?fields=regno,paper_code,exam_type,marks&page_size=200"),
+        ("api_marks_search", "admin", f"/api/marks/?search={term}"),
+    ]
+
+
+def _request(client, path):
+    """GET `path` and read the whole body (streaming responses included); returns (status, bytes)."""
+    response = client.get(path)
+    if response.streaming:
+        size = sum(len(chunk) for chunk in response.streaming_content)
+    else:
+        size = len(response.content)
+    response.close()
+    return response.status_code, size
+
+
+def _timed(client, path):
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        status, size = _request(client, path)
+        elapsed = time.perf_counter() - started
+    return status, size, elapsed * 1000, len(queries)
+
+
+def measure(client, path, repeat=3):
+    """Cold (cache cleared) and warm timings, query counts and peak memory for one request."""
+    cache.clear()
+    status, size, cold_ms, cold_queries = _timed(client, path)
+    warm = [_timed(client, path) for _ in range(max(1, repeat))]
+
+    cache.clear()
+    tracemalloc.start()
+    try:
+        _request(client, path)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "status": status,
+        "bytes": size,
+        "cold_ms": round(cold_ms, 2),
+        "warm_ms": round(statistics.median(w[2] for w in warm), 2),
+        "queries": cold_queries,
+        "warm_queries": warm[-1][3],
+        "peak_kib": round(peak / 1024, 1),
+    }
+
+
+def _commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def run_benchmarks(students=1000, papers=10, batches=10, exams=3, repeat=3, only=None, seed=0):
+    """Seed, run every case (or those named in `only`) and return the JSON-ready report."""
+    started = time.perf_counter()
+    sizes = seed_dataset(students=students, papers=papers, batches=batches, exams=exams, seed=seed)
+    seed_seconds = time.perf_counter() - started
+
+    clients = {"admin": _user("bench_admin", "admin")}
+    # the dashboard resolves the student by username == regno
+    clients["student"] = _user(Student.objects.order_by("regno").values_list("regno", flat=True).first(), "student")
+
+    results = []
+    for name, role, path in cases():
+        if only and name not in only:
+            continue
+        results.append({"name": name, "path": path, **measure(clients[role], path, repeat=repeat)})
+
+    return {
+        "meta": {
+            "commit": _commit(),
+            "timestamp": timezone.now().isoformat(),
+            "database": connection.vendor,
+            "django": django.get_version(),
+            "python": platform.python_version(),
+            "dataset": sizes,
+            "seed_seconds": round(seed_seconds, 2),
+            "repeat": repeat,
+        },
+        "results": results,
+    }
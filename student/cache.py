@@ -0,0 +1,102 @@
+"""
+Versioned read cache.
+
+Every cached value is stored under a key that embeds the current version
+counter of each thing it was built from ("Course", "StudentMark",
+"StudentMark:batch:7", ...). Writes never delete cache entries; they bump the
+relevant counter (one cache.incr), so the next read simply misses and rebuilds.
+Old entries age out via the timeout.
+
+Counters are bumped from post_save/post_delete and marks_changed
+(see student.signals). Works with any Django cache backend, but the counters
+must be shared by every worker process: the settings default to a file cache
+(TMS_CACHE_DIR) or Redis (TMS_REDIS_URL), and keep local memory for tests.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+_MISSING = object()
+
+# bumped by the full summary/rank rebuilds, which bypass marks_changed
+DERIVED_REBUILT = "StudentMark:rebuilt"
+
+
+def _cache():
+    return caches[getattr(settings, "TMS_CACHE_ALIAS", "default")]
+
+
+def _timeout():
+    return getattr(settings, "TMS_CACHE_TIMEOUT", 300)
+
+
+def _version_key(name):
+    return f"tms:v:{name}"
+
+
+def _stamp_key(name):
+    return f"tms:t:{name}"
+
+
+def _fresh_version():
+    # never restart at 1 after eviction, or stale entries built at an old "1" would match again
+    return int(time.time() * 1000)
+
+
+def versions(names):
+    """Current counters for the given names (created on first use)."""
+    cache = _cache()
+    keys = [_version_key(n) for n in names]
+    found = cache.get_many(keys)
+    result = []
+    for key in keys:
+        if key not in found:
+            cache.add(key, _fresh_version(), None)
+            found[key] = cache.get(key)
+        result.append(found[key])
+    return tuple(result)
+
+
+def changed_at(names):
+    """
+    Unix time of the latest bump of any of `names` (for Last-Modified). A name
+    never bumped (or evicted) counts as changed now, which can only cost a 200.
+    """
+    cache = _cache()
+    keys = [_stamp_key(n) for n in names]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, time.time(), None)
+            found[key] = cache.get(key)
+    return max(found.values(), default=0)
+
+
+def bump(*names):
+    """Invalidate everything built from any of `names`."""
+    cache = _cache()
+    now = time.time()
+    for name in names:
+        key = _version_key(name)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _fresh_version(), None)
+        cache.set(_stamp_key(name), now, None)
+
+
+def cached(namespace, depends_on, parts, builder, timeout=None):
+    """
+    Return builder() from cache, keyed on `parts` plus the versions of `depends_on`.
+    `parts` must capture every input the result depends on (query string, user, ...).
+    """
+    cache = _cache()
+    digest = hashlib.md5(repr((versions(depends_on), parts)).encode()).hexdigest()
+    key = f"tms:{namespace}:{digest}"
+    value = cache.get(key, _MISSING)
+    if value is _MISSING:
+        value = builder()
+        cache.set(key, value, _timeout() if timeout is None else timeout)
+    return value
@@ -0,0 +1,48 @@
+"""
+The worker side of student.reportcards: card dicts in, file bytes out.
+
+Kept apart from the models so a freshly spawned worker can import it (to
+unpickle its tasks) before Django is set up; init_worker then sets Django up
+once per process. Nothing here touches the database.
+"""
+import os
+
+from django.template.loader import render_to_string
+from django.utils.text import get_valid_filename
+
+FORMATS = ("html", "pdf")
+TEMPLATE = "reportcards/card.html"
+
+
+class ReportCardError(Exception):
+    """The report cards cannot be produced as requested."""
+
+
+def weasyprint():
+    try:
+        import weasyprint
+    except ImportError:
+        raise ReportCardError("PDF report cards need weasyprint (pip install weasyprint).")
+    return weasyprint
+
+
+def init_worker(settings_module):
+    if settings_module:
+        os.environ.setdefault("DJANGO_SETTINGS_MODULE", settings_module)
+    import django
+    django.setup()
+
+
+def render_cards(cards, formats, generated_at):
+    """[(zip member name, bytes), ...] for a list of card dicts."""
+    out = []
+    pdf = weasyprint() if "pdf" in formats else None
+    for card in cards:
+        html = render_to_string(TEMPLATE, {"card": card, "generated_at": generated_at})
+        # batch names repeat across courses: one folder per course, then per batch
+        base = "/".join(get_valid_filename(card[key]) for key in ("course_id", "batch", "regno"))
+        if "html" in formats:
+            out.append((base + ".html", html.encode()))
+        if pdf:
+            out.append((base + ".pdf", pdf.HTML(string=html).write_pdf()))
+    return out
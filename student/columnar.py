@@ -0,0 +1,178 @@
+"""
+Typed export formats: Parquet, Arrow IPC and XLSX.
+
+Rows come straight off a database cursor as raw values (Decimal marks, aware
+datetimes, ints) described by the export's `columns`, and are written in
+batches of ROW_GROUP_SIZE rows, so memory is bounded by one batch. Category
+columns (exam_type, paper code, batch, course ...) get one dictionary for the
+whole file, read up front with a DISTINCT per column.
+
+pyarrow (parquet, arrow) and openpyxl (xlsx) are optional dependencies.
+"""
+import re
+from itertools import islice
+
+from django.utils import timezone
+
+from .exports import EXPORT_CHUNK_SIZE, EXPORTS
+
+ROW_GROUP_SIZE = 64000
+XLSX_MAX_ROWS = 1048575  # Excel sheet limit, minus the header row
+# characters Excel refuses in a sheet title (a RegNo like MCA/2024/01 ends up in the filename)
+XLSX_TITLE_INVALID = re.compile(r"[\\/?*\[\]:]")
+
+# format -> (file extension, content type)
+FORMATS = {
+    "parquet": (".parquet", "application/vnd.apache.parquet"),
+    "arrow": (".arrow", "application/vnd.apache.arrow.file"),
+    "xlsx": (".xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+
+
+class ExportFormatError(Exception):
+    """The export cannot be produced in the requested format."""
+
+
+def available_formats(kind):
+    _, params, _ = EXPORTS[kind]
+    return ["csv"] + list(FORMATS) if "format" in params else ["csv"]
+
+
+def filename_for(export, fmt):
+    base = export.filename[:-4] if export.filename.endswith(".csv") else export.filename
+    return base + FORMATS[fmt][0]
+
+
+def _batches(export, progress=None):
+    rows = export.queryset.values_list(*[c.field for c in export.columns]).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    done = 0
+    while True:
+        batch = list(islice(rows, ROW_GROUP_SIZE))
+        if not batch:
+            return
+        done += len(batch)
+        if progress:
+            progress(done)
+        yield batch
+
+
+# ---- pyarrow ----
+
+def _pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise ExportFormatError("Parquet/Arrow export needs pyarrow (pip install pyarrow).")
+    return pyarrow
+
+
+def _arrow_type(pa, column):
+    if column.kind == "decimal":
+        return pa.decimal128(column.precision, column.scale)
+    return {
+        "int": pa.int64(),
+        "bool": pa.bool_(),
+        "string": pa.string(),
+        "category": pa.dictionary(pa.int32(), pa.string()),
+        "timestamp": pa.timestamp("us", tz="UTC"),
+    }[column.kind]
+
+
+def _dictionaries(pa, export):
+    """One fixed dictionary per category column, so every batch (and IPC files) share it."""
+    found = {}
+    for column in export.columns:
+        if column.kind == "category":
+            values = sorted(v for v in export.queryset.order_by().values_list(column.field, flat=True).distinct()
+                            if v is not None)
+            found[column.name] = (pa.array(values, pa.string()), {v: i for i, v in enumerate(values)})
+    return found
+
+
+def _record_batches(pa, export, progress):
+    schema = pa.schema([pa.field(c.name, _arrow_type(pa, c)) for c in export.columns])
+    dictionaries = _dictionaries(pa, export)
+
+    def generate():
+        for batch in _batches(export, progress):
+            arrays = []
+            for i, column in enumerate(export.columns):
+                values = [row[i] for row in batch]
+                if column.kind == "category":
+                    dictionary, index = dictionaries[column.name]
+                    codes = pa.array([None if v is None else index[v] for v in values], pa.int32())
+                    arrays.append(pa.DictionaryArray.from_arrays(codes, dictionary))
+                else:
+                    arrays.append(pa.array(values, schema.field(i).type))
+            yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+    return schema, generate()
+
+
+def write_parquet(export, fileobj, progress=None):
+    pa = _pyarrow()
+    import pyarrow.parquet as pq
+    schema, batches = _record_batches(pa, export, progress)
+    rows = 0
+    with pq.ParquetWriter(fileobj, schema, compression="zstd") as writer:
+        for batch in batches:
+            writer.write_batch(batch, row_group_size=ROW_GROUP_SIZE)
+            rows += batch.num_rows
+    return rows
+
+
+def write_arrow(export, fileobj, progress=None):
+    pa = _pyarrow()
+    schema, batches = _record_batches(pa, export, progress)
+    rows = 0
+    options = pa.ipc.IpcWriteOptions(compression="zstd")
+    with pa.ipc.new_file(fileobj, schema, options=options) as writer:
+        for batch in batches:
+            writer.write_batch(batch)
+            rows += batch.num_rows
+    return rows
+
+
+# ---- openpyxl ----
+
+def write_xlsx(export, fileobj, progress=None):
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        raise ExportFormatError("XLSX export needs openpyxl (pip install openpyxl).")
+
+    total = export.queryset.count()
+    if total > XLSX_MAX_ROWS:
+        raise ExportFormatError(f"{total} rows do not fit in one XLSX sheet; use parquet or csv.")
+
+    wb = Workbook(write_only=True)
+    title = XLSX_TITLE_INVALID.sub("_", export.filename.rsplit(".", 1)[0])[:31].strip("'")
+    ws = wb.create_sheet(title or "export")
+    ws.append([c.name for c in export.columns])
+    timestamps = [i for i, c in enumerate(export.columns) if c.kind == "timestamp"]
+    rows = 0
+    for batch in _batches(export, progress):
+        for row in batch:
+            if timestamps:
+                # Excel has no time zones: write local wall-clock time
+                row = list(row)
+                for i in timestamps:
+                    if row[i] is not None:
+                        row[i] = timezone.localtime(row[i]).replace(tzinfo=None)
+            ws.append(row)
+            rows += 1
+    wb.save(fileobj)
+    return rows
+
+
+WRITERS = {"parquet": write_parquet, "arrow": write_arrow, "xlsx": write_xlsx}
+
+
+def write_export(export, fmt, fileobj, progress=None):
+    """
+    Write `export` as `fmt` to a binary file object; returns the number of rows.
+    `progress(rows_read)` is called once per batch.
+    """
+    if not export.columns or fmt not in WRITERS:
+        raise ExportFormatError(f"{fmt} is not available for this export.")
+    return WRITERS[fmt](export, fileobj, progress)
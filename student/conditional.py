@@ -0,0 +1,48 @@
+"""
+Conditional GET (ETag / Last-Modified) for cached reads and exports.
+
+The ETag of a response is a hash of the student.cache version counters of
+every model its body is built from, plus a variant (URL, content type, user).
+Any committed write to one of those models bumps its counter (see
+student.signals), so an unchanged result answers 304 from one cache read,
+before any query runs or anything is serialized. Last-Modified is the time of
+the latest of those bumps; HTTP dates have one-second resolution, so clients
+that can send If-None-Match should prefer it (it wins when both are sent).
+"""
+import hashlib
+
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+
+from . import cache
+
+
+class Validators:
+    def __init__(self, etag, last_modified=None):
+        self.etag = etag  # quoted, weak
+        self.last_modified = last_modified  # whole Unix seconds, or None
+
+
+def version_validators(depends_on, variant=()):
+    """
+    Validators for a body built from the models in `depends_on` (student.cache names);
+    `variant` is anything else the body depends on (URL, content type, user ...).
+    """
+    raw = repr((cache.versions(depends_on), variant))
+    return Validators("W/" + quote_etag(hashlib.md5(raw.encode()).hexdigest()),
+                      int(cache.changed_at(depends_on)))
+
+
+def not_modified(request, validators):
+    """A 304 (or 412 for a failed If-Match) response when the request's preconditions say so, else None."""
+    response = get_conditional_response(request, etag=validators.etag,
+                                        last_modified=validators.last_modified)
+    return stamp(response, validators) if response is not None else None
+
+
+def stamp(response, validators):
+    if response.status_code in (200, 304):
+        response["ETag"] = validators.etag
+        if validators.last_modified is not None:
+            response["Last-Modified"] = http_date(validators.last_modified)
+    return response
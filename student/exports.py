@@ -0,0 +1,270 @@
+"""
+Export definitions shared by the streaming export views and the
+background export jobs (student.jobs). CSV for everything; exports that
+declare typed `columns` can also be written as parquet/arrow/xlsx
+(student.columnar).
+
+Each export is built from a small dict of request parameters, so a job can be
+stored, hashed (for coalescing) and rebuilt later in a worker thread.
+"""
+import hashlib
+import json
+from dataclasses import dataclass
+from decimal import Decimal, InvalidOperation
+from typing import Any, Iterable, Optional
+
+from django.db.models import DecimalField, OuterRef, Q, QuerySet, Subquery
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+
+from .cache import DERIVED_REBUILT
+from .models import Batch, Course, Paper, PaperGrade, Student, StudentGPA, StudentMark
+from .search import search
+
+# rows are fetched from a server-side cursor in chunks of this size
+EXPORT_CHUNK_SIZE = 2000
+
+
+@dataclass
+class Column:
+    """A typed output column for the columnar formats (student.columnar)."""
+    name: str
+    field: str                 # values_list() path
+    kind: str                  # int | bool | string | category | timestamp | decimal
+    precision: Optional[int] = None
+    scale: Optional[int] = None
+
+
+@dataclass
+class Export:
+    filename: str
+    header: list
+    queryset: QuerySet   # the filtered rows, for progress counts
+    rows: Iterable[Any]  # lazy tuples, one per CSV line
+    columns: Optional[list] = None  # typed columns, when parquet/arrow/xlsx are offered
+
+
+def _csv_filename(prefix):
+    ts = timezone.now().strftime("%Y%m%d_%H%M%S")
+    return f"{prefix}_{ts}.csv"
+
+
+def courses(params):
+    q = params.get('query', '')
+    qs = Course.objects.all().order_by('courseid')
+    if q:
+        qs = qs.filter(Q(name__icontains=q) | Q(courseid__icontains=q))
+
+    rows = (
+        (pk, courseid, name, created_at.isoformat())
+        for pk, courseid, name, created_at in qs.values_list('id', 'courseid', 'name', 'created_at')
+                                                 .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    return Export(_csv_filename("courses"), ['id','courseid','name','created_at'], qs, rows)
+
+
+def batches(params):
+    q = params.get('query', '')
+    qs = Batch.objects.all().order_by('course__courseid','name')
+    if q:
+        qs = qs.filter(Q(name__icontains=q) | Q(year__icontains=q) |
+                       Q(course__courseid__icontains=q) | Q(course__name__icontains=q))
+
+    rows = qs.values_list('id', 'course__courseid', 'course__name', 'name', 'year', 'is_active')\
+             .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    return Export(_csv_filename("batches"), ['id','courseid','course_name','batch_name','year','is_active'], qs, rows)
+
+
+def papers(params):
+    q = params.get('query', '')
+    qs = Paper.objects.all().order_by('code')
+    if q:
+        qs = qs.filter(Q(name__icontains=q) | Q(code__icontains=q) | Q(paper_type__icontains=q))
+
+    rows = qs.values_list('id', 'code', 'name', 'paper_type', 'max_marks').iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    return Export(_csv_filename("papers"), ['id','code','name','paper_type','max_marks'], qs, rows)
+
+
+STUDENT_COLUMNS = [
+    Column('id', 'id', 'int'),
+    Column('regno', 'regno', 'string'),
+    Column('name', 'name', 'string'),
+    Column('email', 'email', 'string'),
+    Column('batch_name', 'batch__name', 'category'),
+    Column('course_name', 'batch__course__name', 'category'),
+    Column('is_active', 'is_active', 'bool'),
+    Column('created_at', 'created_at', 'timestamp'),
+]
+
+
+def students(params):
+    q = params.get('query', '')
+    qs = Student.objects.all().order_by('regno')
+    if q:
+        qs = search(qs, q)
+
+    rows = (
+        (pk, regno, name, email, batch_name, course_name, is_active, created_at.isoformat())
+        for pk, regno, name, email, batch_name, course_name, is_active, created_at in qs.values_list(
+            'id', 'regno', 'name', 'email', 'batch__name', 'batch__course__name', 'is_active', 'created_at'
+        ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    return Export(_csv_filename("students"),
+                  ['id','regno','name','email','batch_name','course_name','is_active','created_at'], qs, rows,
+                  columns=STUDENT_COLUMNS)
+
+
+MARK_COLUMNS = [
+    Column('regno', 'student__regno', 'string'),
+    Column('student_name', 'student__name', 'string'),
+    Column('course', 'student__batch__course__name', 'category'),
+    Column('batch', 'batch__name', 'category'),
+    Column('paper_code', 'paper__code', 'category'),
+    Column('paper_name', 'paper__name', 'category'),
+    Column('exam_type', 'exam_type', 'category'),
+    Column('marks', 'marks', 'decimal', 5, 2),
+    Column('max_marks', 'paper__max_marks', 'int'),
+    Column('created_at', 'created_at', 'timestamp'),
+    Column('rank', 'rank__dense_rank', 'int'),
+    Column('percentile', 'rank__percentile', 'decimal', 5, 2),
+    Column('percentage', 'percentage', 'decimal', 6, 2),
+    Column('passed', 'passed', 'bool'),
+]
+
+
+def marks(params):
+    q_regno = params.get('regno', '')
+    q = params.get('query', '')
+
+    # build base queryset
+    qs = StudentMark.objects.all().order_by('-created_at')
+
+    # Prefer regno param
+    if q_regno:
+        qs = qs.filter(student__regno__iexact=q_regno)
+    elif q:
+        qs = search(qs, q)
+
+    # stored score filters (student.scores): e.g. ?batch=3&result=fail, ?paper=7&min_percentage=90
+    if params.get('batch', '').isdigit():
+        qs = qs.filter(batch_id=int(params['batch']))
+    if params.get('paper', '').isdigit():
+        qs = qs.filter(paper_id=int(params['paper']))
+    if params.get('result') in ("pass", "fail"):
+        qs = qs.filter(passed=params['result'] == "pass")
+    try:
+        qs = qs.filter(percentage__gte=Decimal(params['min_percentage']))
+    except (KeyError, InvalidOperation):
+        pass
+
+    # -----------------------------
+    # SECURITY / PRIVACY: optional restriction for students
+    # If you want to ensure students can only download:
+    #   - their own marks, or
+    #   - marks from their own batch,
+    # filter qs here (and pass the user in params so background jobs apply it too), e.g.
+    #
+    # OPTION A: only allow the student's own regno
+    #     qs = qs.filter(student__regno__iexact=username)
+    #
+    # OPTION B (alternative): allow students to download marks only for students in the *same batch*
+    #     student_obj = Student.objects.filter(regno__iexact=username).first()
+    #     qs = qs.filter(batch=student_obj.batch) if student_obj else StudentMark.objects.none()
+    # -----------------------------
+
+    filename = "student_marks"
+    if q_regno:
+        filename = f"marks_{q_regno}"
+    elif q:
+        filename = f"marks_filtered"
+    # a RegNo may hold "/" (MCA/2024/01): keep the name usable as a file and download name
+    filename = f"{get_valid_filename(filename)}.csv"
+
+    header = [
+        "RegNo", "Student Name", "Course", "Batch", "Paper Code", "Paper Name",
+        "Exam Type", "Marks", "Max Marks", "Created At", "Rank", "Percentile", "Percentage", "Result"
+    ]
+    # plain tuples straight off the cursor: no model instances, no select_related objects
+    columns = qs.values_list(
+        'student__regno', 'student__name', 'student__batch__course__name', 'batch__name',
+        'paper__code', 'paper__name', 'exam_type', 'marks', 'paper__max_marks', 'created_at',
+        'rank__dense_rank', 'rank__percentile', 'percentage', 'passed',
+    ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    rows = (
+        (regno, name, course, batch, code, paper, exam_type, str(marks),
+         str(max_marks) if max_marks else "", created_at.strftime("%Y-%m-%d %H:%M"), rank, percentile,
+         percentage, "PASS" if passed else "FAIL")
+        for regno, name, course, batch, code, paper, exam_type, marks, max_marks, created_at, rank, percentile,
+        percentage, passed in columns
+    )
+    return Export(filename, header, qs, rows, columns=MARK_COLUMNS)
+
+
+GRADE_COLUMNS = [
+    Column('regno', 'student__regno', 'string'),
+    Column('student_name', 'student__name', 'string'),
+    Column('batch', 'batch__name', 'category'),
+    Column('paper_code', 'paper__code', 'category'),
+    Column('paper_name', 'paper__name', 'category'),
+    Column('credits', 'credits', 'decimal', 4, 1),
+    Column('weighted_percentage', 'weighted_percentage', 'decimal', 6, 2),
+    Column('grade', 'letter', 'category'),
+    Column('grade_point', 'grade_point', 'decimal', 4, 2),
+    Column('gpa', 'gpa', 'decimal', 4, 2),
+]
+
+
+def grades(params):
+    """One row per PaperGrade (student.grading) with the student's GPA for that batch."""
+    gpa = StudentGPA.objects.filter(student_id=OuterRef('student_id'), batch_id=OuterRef('batch_id')).values('gpa')[:1]
+    qs = PaperGrade.objects.annotate(gpa=Subquery(gpa, output_field=DecimalField(max_digits=4, decimal_places=2)))\
+                           .order_by('batch__name', 'student__regno', 'paper__code')
+    if params.get('regno'):
+        qs = qs.filter(student__regno__iexact=params['regno'])
+    if params.get('batch', '').isdigit():
+        qs = qs.filter(batch_id=int(params['batch']))
+
+    header = ["RegNo", "Name", "Batch", "Paper Code", "Paper Name", "Credits", "Weighted %", "Grade", "Grade Point", "GPA"]
+    rows = qs.values_list(*(column.field for column in GRADE_COLUMNS)).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    return Export(_csv_filename("grades"), header, qs, rows, columns=GRADE_COLUMNS)
+
+
+# kind -> (builder, request parameters it reads, cache versions its rows depend on);
+# "format" marks the exports with typed columns
+EXPORTS = {
+    "courses": (courses, ("query",), ("Course",)),
+    "batches": (batches, ("query",), ("Batch", "Course")),
+    "papers": (papers, ("query",), ("Paper",)),
+    "students": (students, ("query", "format"), ("Student", "Batch", "Course")),
+    "marks": (marks, ("regno", "query", "batch", "paper", "result", "min_percentage", "format"),
+              ("StudentMark", "Student", "Paper", "Batch", "Course", DERIVED_REBUILT)),
+    "grades": (grades, ("regno", "batch", "format"), ("StudentMark", "Student", "Paper", "Batch", DERIVED_REBUILT)),
+}
+
+
+def export_params(kind, querydict):
+    """The parameters `kind` depends on, stripped, with blanks dropped."""
+    _, names, _ = EXPORTS[kind]
+    params = {}
+    for name in names:
+        value = querydict.get(name, '').strip()
+        if name == "format":
+            # csv is the default, so it doesn't split coalescing/caching from a plain request
+            value = "" if value.lower() == "csv" else value.lower()
+        if value:
+            params[name] = value
+    return params
+
+
+def build_export(kind, params):
+    builder, _, _ = EXPORTS[kind]
+    return builder(params)
+
+
+def export_depends_on(kind):
+    """student.cache names whose versions identify the data behind export `kind`."""
+    return EXPORTS[kind][2]
+
+
+def params_hash(kind, params):
+    return hashlib.sha256(json.dumps([kind, params], sort_keys=True).encode()).hexdigest()
@@ -3,6 +3,7 @@ from django.contrib.auth.models import User
 import re
 from student.models import Profile
 
+from .autocomplete import AutocompleteSelect
 from .models import *
 
 
@@ -56,6 +57,64 @@ class StudentSearchForm(forms.Form):
     query = forms.CharField(label='Search', max_length=100,
                             widget=forms.TextInput(attrs={'placeholder': 'Enter StudentName'}))
 
+class MarksImportForm(forms.Form):
+    file = forms.FileField(
+        label='Marks file',
+        help_text='CSV or XLSX with columns: regno, paper_code, exam_type, batch, marks (course optional)',
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv,.xlsx'})
+    )
+    dry_run = forms.BooleanField(
+        label='Dry run (validate only)',
+        required=False,
+        initial=True,
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'})
+    )
+
+
+class GradebookForm(forms.Form):
+    """Picks the (batch, paper, exam_type) sheet shown on the gradebook grid."""
+    batch = forms.ModelChoiceField(queryset=Batch.objects.none(), widget=forms.Select(attrs={'class':'form-select'}))
+    paper = forms.ModelChoiceField(queryset=Paper.objects.none(), widget=forms.Select(attrs={'class':'form-select'}))
+    exam_type = forms.CharField(max_length=32, widget=forms.TextInput(
+        attrs={'class':'form-control','placeholder':'e.g. Internal-I / External'}))
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['batch'].queryset = Batch.objects.select_related('course').all().order_by('course__courseid', 'name')
+        self.fields['paper'].queryset = Paper.objects.all().order_by('code', 'name')
+        self.fields['batch'].empty_label = "Select batch"
+        self.fields['paper'].empty_label = "Select paper"
+
+    def clean_exam_type(self):
+        return self.cleaned_data.get('exam_type', '').strip()
+
+
+class ReportCardForm(forms.Form):
+    """A batch or a course (all of its batches) to print report cards for (student/reportcards.py)."""
+    batch = forms.ModelChoiceField(queryset=Batch.objects.select_related('course'), required=False,
+                                   widget=AutocompleteSelect('batches'))
+    course = forms.ModelChoiceField(queryset=Course.objects.order_by('courseid'), required=False,
+                                    widget=forms.Select(attrs={'class':'form-select'}))
+    formats = forms.MultipleChoiceField(choices=[('html', 'HTML'), ('pdf', 'PDF')], initial=['html'],
+                                        widget=forms.CheckboxSelectMultiple)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['batch'].empty_label = "Select batch"
+        self.fields['course'].empty_label = "or a whole course"
+
+    def clean(self):
+        cleaned = super().clean()
+        if bool(cleaned.get('batch')) == bool(cleaned.get('course')):
+            raise forms.ValidationError("Choose either a batch or a course.")
+        return cleaned
+
+    def batch_ids(self):
+        if self.cleaned_data['batch']:
+            return [self.cleaned_data['batch'].pk]
+        return list(self.cleaned_data['course'].batches.values_list('pk', flat=True))
+
+
 class TransactionSearchForm(forms.Form):
     query = forms.CharField(
         label='Search',
@@ -96,11 +155,20 @@ class CourseForm(forms.ModelForm):
 class BatchForm(forms.ModelForm):
     class Meta:
         model = Batch
-        fields = ['course', 'name', 'year', 'is_active']
+        fields = ['course', 'name', 'year', 'is_active', 'grading_scheme']
+        labels = {
+            'grading_scheme': 'Grading scheme',
+        }
+        help_texts = {
+            'grading_scheme': 'Leave empty to use the default scheme.',
+        }
         widgets = {
             'course': forms.Select(attrs={
                 'class': 'form-select'
             }),
+            'grading_scheme': forms.Select(attrs={
+                'class': 'form-select'
+            }),
             'name': forms.TextInput(attrs={
                 'class': 'form-control',
                 'placeholder': 'e.g. 2023-24-A'
@@ -133,7 +201,7 @@ class BatchForm(forms.ModelForm):
 class PaperForm(forms.ModelForm):
     class Meta:
         model = Paper
-        fields = ['code', 'name', 'paper_type', 'max_marks']
+        fields = ['code', 'name', 'paper_type', 'max_marks', 'credits']
         widgets = {
             'code': forms.TextInput(attrs={
                 'class': 'form-control',
@@ -151,6 +219,11 @@ class PaperForm(forms.ModelForm):
                 'class': 'form-control',
                 'placeholder': '100'
             }),
+            'credits': forms.NumberInput(attrs={
+                'class': 'form-control',
+                'placeholder': '4',
+                'step': '0.5'
+            }),
         }
 
     def clean(self):
@@ -178,8 +251,9 @@ class PaperForm(forms.ModelForm):
 
 
 class StudentForm(forms.ModelForm):
-    # populate batches dynamically
-    batch = forms.ModelChoiceField(queryset=Batch.objects.none(), widget=forms.Select(attrs={'class':'form-select'}))
+    # options are searched as you type (student/autocomplete.py)
+    batch = forms.ModelChoiceField(queryset=Batch.objects.select_related('course'),
+                                   widget=AutocompleteSelect('batches'))
 
     class Meta:
         model = Student
@@ -193,8 +267,6 @@ class StudentForm(forms.ModelForm):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        # show all batches by default 
-        self.fields['batch'].queryset = Batch.objects.select_related('course').all()
         self.fields['batch'].empty_label = "Select batch"
 
     def clean(self):
@@ -212,9 +284,11 @@ class StudentForm(forms.ModelForm):
 
 
 class StudentMarkForm(forms.ModelForm):
-    student = forms.ModelChoiceField(queryset=Student.objects.none(), widget=forms.Select(attrs={'class':'form-select'}))
-    paper = forms.ModelChoiceField(queryset=Paper.objects.none(), widget=forms.Select(attrs={'class':'form-select'}))
-    batch = forms.ModelChoiceField(queryset=Batch.objects.none(), widget=forms.Select(attrs={'class':'form-select'}))
+    # options are searched as you type (student/autocomplete.py); only the chosen ones are rendered
+    student = forms.ModelChoiceField(queryset=Student.objects.all(), widget=AutocompleteSelect('students'))
+    paper = forms.ModelChoiceField(queryset=Paper.objects.all(), widget=AutocompleteSelect('papers'))
+    batch = forms.ModelChoiceField(queryset=Batch.objects.select_related('course'),
+                                   widget=AutocompleteSelect('batches'))
 
     class Meta:
         model = StudentMark
@@ -226,10 +300,6 @@ class StudentMarkForm(forms.ModelForm):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        # populate selects
-        self.fields['student'].queryset = Student.objects.select_related('batch__course').all().order_by('regno')
-        self.fields['paper'].queryset = Paper.objects.all().order_by('code', 'name')
-        self.fields['batch'].queryset = Batch.objects.select_related('course').all().order_by('course__courseid', 'name')
         self.fields['student'].empty_label = "Select student"
         self.fields['paper'].empty_label = "Select paper"
         self.fields['batch'].empty_label = "Select batch"
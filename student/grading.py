@@ -0,0 +1,173 @@
+"""
+Letter grades and GPA, computed per batch in NumPy.
+
+A batch is graded with its GradingScheme (or the default one):
+
+  weighted %  - per (student, paper): the stored StudentMark.percentage of each
+                exam, averaged with the scheme's ExamWeight weights over the
+                exams the student has sat (exam types the scheme doesn't weigh
+                are left out; a scheme without weights counts every exam once)
+  letter      - the GradeBoundary with the highest min_percentage reached
+                (below the lowest boundary: the lowest grade)
+  GPA         - sum(grade_point * credits) / sum(credits) over the graded papers;
+                credits earned are those of papers with a grade point above 0
+
+The marks of the batch (or of just the students that changed) are pulled as
+one column set, scattered into (student x paper) matrices with np.add.at and
+graded in a single vectorised pass; PaperGrade / StudentGPA rows for those
+students are then replaced, all under a lock on the Batch row. marks_changed
+regrades only the students whose marks changed, after the change commits
+(student.signals); a change of paper credits, of a batch's
+scheme or of a scheme (saved in the admin) regrades the affected batches
+whole. `manage.py compute_grades` regrades everything.
+"""
+from collections import namedtuple
+from decimal import Decimal
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import cache
+from .models import Batch, ExamWeight, GradeBoundary, GradingScheme, Paper, PaperGrade, StudentGPA, StudentMark
+
+# students regraded per round trip
+GRADE_CHUNK_SIZE = 2000
+
+Scheme = namedtuple("Scheme", "mins letters points weights")
+
+
+def _dec(value, places="0.01"):
+    return Decimal(str(value)).quantize(Decimal(places))
+
+
+def load_schemes(batch_ids):
+    """batch id -> Scheme for the given batches (None when no scheme applies)."""
+    scheme_of = dict(Batch.objects.filter(pk__in=batch_ids).values_list("pk", "grading_scheme_id"))
+    default = GradingScheme.objects.filter(is_default=True).values_list("pk", flat=True).first()
+    scheme_ids = {sid or default for sid in scheme_of.values()} - {None}
+
+    bounds, weights = {}, {}
+    for sid, letter, lo, gp in GradeBoundary.objects.filter(scheme_id__in=scheme_ids).order_by(
+            "scheme_id", "min_percentage").values_list("scheme_id", "letter", "min_percentage", "grade_point"):
+        bounds.setdefault(sid, []).append((float(lo), letter, gp))
+    for sid, exam_type, weight in ExamWeight.objects.filter(scheme_id__in=scheme_ids).values_list(
+            "scheme_id", "exam_type", "weight"):
+        weights.setdefault(sid, {})[exam_type] = float(weight)
+
+    schemes = {}
+    for sid in scheme_ids:
+        rows = bounds.get(sid)
+        if rows:
+            schemes[sid] = Scheme(np.array([r[0] for r in rows]), [r[1] for r in rows],
+                                  [r[2] for r in rows], weights.get(sid, {}))
+    return {b: schemes.get(sid or default) for b, sid in scheme_of.items()}
+
+
+def grade_marks(rows, scheme, credits_of):
+    """
+    rows: [(student_id, paper_id, exam_type, percentage), ...] of one batch.
+    Returns ([(student_id, paper_id, weighted, letter, grade_point, credits)],
+             [(student_id, gpa, attempted, earned)]).
+    """
+    if not rows:
+        return [], []
+    student_col, paper_col, exam_col, pct_col = zip(*rows)
+    students, s_idx = np.unique(np.array(student_col), return_inverse=True)
+    papers, p_idx = np.unique(np.array(paper_col), return_inverse=True)
+    exams, e_idx = np.unique(np.array(exam_col), return_inverse=True)
+    pct = np.array(pct_col, dtype=float)
+
+    exam_weight = np.array([scheme.weights.get(e, 0.0) if scheme.weights else 1.0 for e in exams])
+    w = exam_weight[e_idx]
+    shape = (len(students), len(papers))
+    wsum, wtot = np.zeros(shape), np.zeros(shape)
+    np.add.at(wsum, (s_idx, p_idx), w * pct)
+    np.add.at(wtot, (s_idx, p_idx), w)
+
+    graded = wtot > 0
+    weighted = np.round(np.divide(wsum, wtot, out=np.zeros(shape), where=graded), 2)
+    band = np.clip(np.searchsorted(scheme.mins, weighted, side="right") - 1, 0, None)
+    points = np.array([float(p) for p in scheme.points])[band]
+
+    credits = np.array([float(credits_of.get(p, 0)) for p in papers])
+    counted = credits[None, :] * graded
+    attempted = counted.sum(axis=1)
+    earned = (counted * (points > 0)).sum(axis=1)
+    gpa = np.divide((points * counted).sum(axis=1), attempted, out=np.zeros(len(students)), where=attempted > 0)
+
+    paper_rows = [
+        (int(students[i]), int(papers[j]), weighted[i, j], scheme.letters[band[i, j]], scheme.points[band[i, j]],
+         credits_of.get(papers[j], Decimal(0)))
+        for i, j in zip(*np.nonzero(graded))
+    ]
+    gpa_rows = [(int(students[i]), gpa[i], attempted[i], earned[i]) for i in range(len(students)) if graded[i].any()]
+    return paper_rows, gpa_rows
+
+
+def _grade_batch(batch_id, scheme, student_ids=None):
+    """Replace the grade rows of a batch (or of `student_ids` in it)."""
+    marks = StudentMark.objects.filter(batch_id=batch_id, percentage__isnull=False)
+    grades = PaperGrade.objects.filter(batch_id=batch_id)
+    gpas = StudentGPA.objects.filter(batch_id=batch_id)
+    if student_ids is not None:
+        marks = marks.filter(student_id__in=student_ids)
+        grades = grades.filter(student_id__in=student_ids)
+        gpas = gpas.filter(student_id__in=student_ids)
+
+    now = timezone.now()
+    with transaction.atomic():
+        # the batch row serialises regrades of one batch: the marks are read and the grade
+        # rows replaced under the lock, so two regrades can't both insert the same rows
+        list(Batch.objects.select_for_update().filter(pk=batch_id).values_list("pk"))
+        if scheme is None:
+            paper_rows, gpa_rows = [], []
+        else:
+            rows = list(marks.values_list("student_id", "paper_id", "exam_type", "percentage"))
+            credits_of = dict(Paper.objects.filter(pk__in={r[1] for r in rows}).values_list("pk", "credits"))
+            paper_rows, gpa_rows = grade_marks(rows, scheme, credits_of)
+
+        grades.delete()
+        gpas.delete()
+        PaperGrade.objects.bulk_create([
+            PaperGrade(student_id=s, batch_id=batch_id, paper_id=p, weighted_percentage=_dec(wp), letter=letter,
+                       grade_point=gp, credits=cr, updated_at=now)
+            for s, p, wp, letter, gp, cr in paper_rows
+        ], batch_size=1000)
+        StudentGPA.objects.bulk_create([
+            StudentGPA(student_id=s, batch_id=batch_id, gpa=_dec(g), credits_attempted=_dec(a, "0.1"),
+                       credits_earned=_dec(e, "0.1"), updated_at=now)
+            for s, g, a, e in gpa_rows
+        ], batch_size=1000)
+    return len(gpa_rows)
+
+
+def refresh_grades(keys):
+    """Regrade the students behind (student_id, paper_id, exam_type, batch_id) keys, batch by batch."""
+    by_batch = {}
+    for student_id, _, _, batch_id in keys:
+        by_batch.setdefault(batch_id, set()).add(student_id)
+    schemes = load_schemes(by_batch)
+    for batch_id, students in by_batch.items():
+        students = sorted(students)
+        for start in range(0, len(students), GRADE_CHUNK_SIZE):
+            _grade_batch(batch_id, schemes.get(batch_id), students[start:start + GRADE_CHUNK_SIZE])
+
+
+def regrade_batches(batch_ids=None):
+    """Regrade whole batches (every batch with None). Returns the number of students graded."""
+    if batch_ids is None:
+        batch_ids = list(Batch.objects.values_list("pk", flat=True))
+    schemes = load_schemes(batch_ids)
+    graded = sum(_grade_batch(batch_id, schemes.get(batch_id)) for batch_id in batch_ids)
+    cache.bump(cache.DERIVED_REBUILT)
+    return graded
+
+
+def batches_using(scheme):
+    """Ids of the batches graded with `scheme` (its own batches, plus the unassigned ones for the default)."""
+    using = Q(grading_scheme=scheme)
+    if scheme.is_default:
+        using |= Q(grading_scheme__isnull=True)
+    return list(Batch.objects.filter(using).values_list("pk", flat=True))
@@ -0,0 +1,89 @@
+"""
+Who is making the request: the user, their role and their Student record.
+
+ProfileBackend loads the session user together with its Profile in one joined
+query, so `user.profile` never costs a second one. IdentityMiddleware then
+puts a lazy `request.identity` on every request with the role and the linked
+Student (regno == username, else email == email). The student link is kept in
+the session and looked up again only when the "Student" cache version or the
+user's own "Identity:user:<pk>" version has moved (see student.signals), so
+an unchanged session resolves its identity without touching the database.
+
+The role is always read from the joined Profile row, never from the session,
+so a changed role takes effect on the very next request.
+"""
+from functools import cached_property
+
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import User
+from django.db.models import Q
+from django.utils.functional import SimpleLazyObject
+
+from . import cache
+from .models import Student
+
+SESSION_KEY = "_tms_identity"
+
+
+class ProfileBackend(ModelBackend):
+    """ModelBackend whose session user comes with its Profile joined in."""
+
+    def get_user(self, user_id):
+        user = User._default_manager.select_related("profile").filter(pk=user_id).first()
+        return user if user and self.user_can_authenticate(user) else None
+
+
+class Identity:
+    def __init__(self, user, student_id):
+        self.user = user
+        profile = getattr(user, "profile", None) if user.is_authenticated else None
+        self.role = profile.role if profile else None
+        self.student_id = student_id
+
+    def has_role(self, *roles):
+        return self.role in roles
+
+    @cached_property
+    def student(self):
+        """The linked Student (one query, on first use), or None."""
+        if self.student_id is None:
+            return None
+        return Student.objects.filter(pk=self.student_id).first()
+
+
+def linked_student_id(user):
+    """pk of the Student whose regno is the username, else whose email is the user's email."""
+    match = Q(regno__iexact=user.username)
+    if user.email:
+        match |= Q(email__iexact=user.email)
+    rows = list(Student.objects.filter(match).order_by("pk").values_list("pk", "regno"))
+    for pk, regno in rows:
+        if regno.lower() == user.username.lower():
+            return pk
+    return rows[0][0] if rows else None
+
+
+def resolve_identity(user, session=None):
+    """Identity for `user`, reusing (and refreshing) the student link stored in `session`."""
+    if not user.is_authenticated:
+        return Identity(user, None)
+    versions = list(cache.versions(["Student", f"Identity:user:{user.pk}"]))
+    saved = session.get(SESSION_KEY) if session is not None else None
+    if saved and saved.get("user") == user.pk and saved.get("versions") == versions:
+        return Identity(user, saved["student"])
+    student_id = linked_student_id(user)
+    if session is not None:
+        session[SESSION_KEY] = {"user": user.pk, "student": student_id, "versions": versions}
+    return Identity(user, student_id)
+
+
+class IdentityMiddleware:
+    """Sets `request.identity` (after AuthenticationMiddleware); resolved on first access."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.identity = SimpleLazyObject(
+            lambda: resolve_identity(request.user, getattr(request, "session", None)))
+        return self.get_response(request)
@@ -0,0 +1,375 @@
+"""
+Bulk marks import.
+
+A file (CSV or XLSX) goes through three steps:
+  1. parse     - raw cells -> normalised rows, streamed off the reader
+  2. validate  - regno / paper code / batch name resolved with one query per
+                 chunk of values, marks checked against Paper.max_marks in memory
+  3. upsert    - batched INSERT ... ON CONFLICT on (student, paper, exam_type, batch)
+
+Nothing is written when dry_run is set; the result still reports what would happen.
+"""
+import csv
+import io
+import os
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+
+from django.db import connection, transaction
+from django.db.models.functions import Upper
+
+from .models import Batch, Paper, Student, StudentMark
+from .signals import marks_changed
+
+# header aliases -> canonical column; export_marks_csv headers are accepted too
+COLUMN_ALIASES = {
+    "regno": "regno",
+    "reg_no": "regno",
+    "paper_code": "paper_code",
+    "paper": "paper_code",
+    "exam_type": "exam_type",
+    "exam": "exam_type",
+    "batch": "batch",
+    "batch_name": "batch",
+    "course": "course",
+    "courseid": "course",
+    "marks": "marks",
+}
+REQUIRED_COLUMNS = ("regno", "paper_code", "exam_type", "batch", "marks")
+
+UPSERT_BATCH_SIZE = 1000
+
+
+class ImportFileError(Exception):
+    """The file as a whole cannot be imported (bad format, missing columns)."""
+
+
+@dataclass
+class ImportResult:
+    total: int = 0
+    created: int = 0
+    updated: int = 0
+    dry_run: bool = False
+    errors: list = field(default_factory=list)  # [(line_no, message), ...]
+
+    @property
+    def error_count(self):
+        return len(self.errors)
+
+    @property
+    def written(self):
+        return self.created + self.updated
+
+
+def _normalise_header(cell):
+    key = str(cell or "").strip().lower().replace(" ", "_").replace("-", "_")
+    return COLUMN_ALIASES.get(key)
+
+
+def _column_index(header):
+    index = {}
+    for pos, cell in enumerate(header):
+        col = _normalise_header(cell)
+        if col and col not in index:
+            index[col] = pos
+    missing = [c for c in REQUIRED_COLUMNS if c not in index]
+    if missing:
+        raise ImportFileError(f"Missing column(s): {', '.join(missing)}.")
+    return index
+
+
+def _parse_row(line_no, row, index):
+    """Turn raw cells into (line_no, regno, paper_code, exam_type, batch, course, marks, error)."""
+    def cell(col_pos):
+        if col_pos is None or col_pos >= len(row) or row[col_pos] is None:
+            return ""
+        return str(row[col_pos]).strip()
+
+    regno = cell(index["regno"])
+    paper_code = cell(index["paper_code"])
+    exam_type = cell(index["exam_type"])
+    batch = cell(index["batch"])
+    course = cell(index.get("course"))
+    raw_marks = cell(index["marks"])
+
+    error = None
+    marks = None
+    if not (regno and paper_code and exam_type and batch and raw_marks):
+        error = "Missing value(s)."
+    elif len(exam_type) > 32:
+        error = "Exam type is too long (max 32)."
+    else:
+        try:
+            marks = Decimal(raw_marks)
+            if not marks.is_finite():
+                raise InvalidOperation
+            marks = marks.quantize(Decimal("0.01"))
+        except (InvalidOperation, ValueError):
+            marks, error = None, f"Marks '{raw_marks}' is not a number."
+        else:
+            if marks < 0:
+                error = "Marks cannot be negative."
+    return (line_no, regno, paper_code, exam_type, batch, course, marks, error)
+
+
+def _read_rows(fileobj, filename):
+    """Return (header, iterator of (line_no, cells)) for a CSV or XLSX upload."""
+    ext = os.path.splitext(filename or "")[1].lower()
+    if ext in (".xlsx", ".xlsm"):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise ImportFileError("XLSX import needs the 'openpyxl' package.")
+        wb = load_workbook(fileobj, read_only=True, data_only=True)
+        rows = wb.active.iter_rows(values_only=True)
+    elif ext in (".csv", ".txt", ""):
+        if isinstance(fileobj, io.TextIOBase):
+            text = fileobj
+        else:
+            text = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+        rows = csv.reader(text)
+    else:
+        raise ImportFileError(f"Unsupported file type '{ext}'. Use .csv or .xlsx.")
+
+    header = next(rows, None)
+    if header is None:
+        raise ImportFileError("The file is empty.")
+    return header, ((line_no, row) for line_no, row in enumerate(rows, start=2))
+
+
+def parse_marks_file(fileobj, filename):
+    """Parse a marks file into normalised rows (blank lines skipped)."""
+    header, rows = _read_rows(fileobj, filename)
+    index = _column_index(header)
+    return [_parse_row(line_no, row, index) for line_no, row in rows
+            if any(c not in (None, "") for c in row)]
+
+
+def _chunked(values, share=1):
+    """
+    Split a set of lookup values so each IN (...) stays under the backend's parameter limit;
+    `share` IN lists in one query split the limit between them.
+    """
+    values = list(values)
+    limit = connection.features.max_query_params
+    size = max(limit // share - 1, 1) if limit else max(len(values), 1)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _resolve_batches(rows):
+    """Upper-cased batch name -> candidate batches (names match case-insensitively, like RegNo and code)."""
+    names = {r[4].upper() for r in rows if not r[7]}
+    by_name = {}
+    for chunk in _chunked(names):
+        for b in Batch.objects.select_related("course").annotate(name_upper=Upper("name"))\
+                .filter(name_upper__in=chunk):
+            by_name.setdefault(b.name_upper, []).append(b)
+    return by_name
+
+
+def _pick_batch(candidates, course):
+    if course:
+        c = course.lower()
+        candidates = [b for b in candidates if c in (b.course.courseid.lower(), b.course.name.lower())]
+    if len(candidates) == 1:
+        return candidates[0], None
+    if not candidates:
+        return None, "Unknown batch."
+    return None, "Batch name is ambiguous; add a course column."
+
+
+def import_marks(rows, dry_run=False):
+    """
+    Validate parsed rows against the database and upsert the good ones.
+    Rows with errors are reported and skipped; the rest are written in one transaction.
+    """
+    result = ImportResult(total=len(rows), dry_run=dry_run)
+
+    regnos = {r[1].upper() for r in rows if not r[7]}
+    codes = {r[2].upper() for r in rows if not r[7]}
+    students = {}
+    for chunk in _chunked(regnos):
+        students.update(
+            Student.objects.annotate(regno_upper=Upper("regno")).filter(regno_upper__in=chunk)
+            .values_list("regno_upper", "pk")
+        )
+    papers = {}
+    for chunk in _chunked(codes):
+        papers.update((p.code_upper, p) for p in Paper.objects.annotate(code_upper=Upper("code"))
+                      .filter(code_upper__in=chunk).only("pk", "code", "max_marks"))
+    batches = _resolve_batches(rows)
+
+    seen = {}
+    pending = []
+    for line_no, regno, paper_code, exam_type, batch_name, course, marks, error in rows:
+        if error:
+            result.errors.append((line_no, error))
+            continue
+        student_id = students.get(regno.upper())
+        if student_id is None:
+            result.errors.append((line_no, f"Unknown RegNo '{regno}'."))
+            continue
+        paper = papers.get(paper_code.upper())
+        if paper is None:
+            result.errors.append((line_no, f"Unknown paper code '{paper_code}'."))
+            continue
+        batch, batch_error = _pick_batch(batches.get(batch_name.upper(), []), course)
+        if batch_error:
+            result.errors.append((line_no, f"{batch_error} ('{batch_name}')"))
+            continue
+        if paper.max_marks is not None and marks > paper.max_marks:
+            result.errors.append((line_no, f"Marks cannot exceed the paper max ({paper.max_marks})."))
+            continue
+        key = (student_id, paper.pk, exam_type, batch.pk)
+        if key in seen:
+            result.errors.append((line_no, f"Duplicate of line {seen[key]}."))
+            continue
+        seen[key] = line_no
+        pending.append((key, marks))
+
+    result.errors.sort()
+    existing = existing_mark_keys([key for key, _ in pending])
+    result.updated = sum(1 for key, _ in pending if key in existing)
+    result.created = len(pending) - result.updated
+
+    if not dry_run and pending:
+        upsert_marks(pending)
+    return result
+
+
+def existing_mark_ids(keys):
+    """Map the (student_id, paper_id, exam_type, batch_id) keys already stored to their mark ids."""
+    if not keys:
+        return {}
+    wanted = set(keys)
+    found = {}
+    for papers in _chunked({k[1] for k in wanted}, share=2):
+        for students in _chunked({k[0] for k in wanted}, share=2):
+            qs = StudentMark.objects.filter(student_id__in=students, paper_id__in=papers)\
+                                    .values_list("student_id", "paper_id", "exam_type", "batch_id", "pk")
+            for s, p, e, b, pk in qs.iterator(chunk_size=UPSERT_BATCH_SIZE):
+                if (s, p, e, b) in wanted:
+                    found[(s, p, e, b)] = pk
+    return found
+
+
+def existing_mark_keys(keys):
+    """Return the subset of (student_id, paper_id, exam_type, batch_id) keys already stored."""
+    return set(existing_mark_ids(keys))
+
+
+def upsert_marks(pending):
+    """
+    Write [((student_id, paper_id, exam_type, batch_id), marks), ...] with batched
+    INSERT ... ON CONFLICT DO UPDATE on the StudentMark unique key.
+    """
+    objs = [
+        StudentMark(student_id=s, paper_id=p, exam_type=e, batch_id=b, marks=marks)
+        for (s, p, e, b), marks in pending
+    ]
+    with transaction.atomic():
+        StudentMark.objects.bulk_create(
+            objs,
+            batch_size=UPSERT_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=["student", "paper", "exam_type", "batch"],
+            update_fields=["marks", "updated_at"],
+        )
+        marks_changed.send(sender=StudentMark, keys={key for key, _ in pending})
+    return len(objs)
+
+
+# ---- REST bulk writes (/api/marks/bulk/) ----
+# Items arrive field-validated (see serializers.BulkMark*ItemSerializer) as [(index, data), ...];
+# both functions return {index: status dict} and write every good item in one upsert.
+
+def _ids(model, values):
+    found = set()
+    for chunk in _chunked(values):
+        found.update(model.objects.filter(pk__in=chunk).values_list("pk", flat=True))
+    return found
+
+
+def _max_marks_error(marks, max_marks):
+    if max_marks is not None and marks > max_marks:
+        return {"marks": [f"Marks cannot exceed paper max ({max_marks})."]}
+    return None
+
+
+def _write(pending, statuses, status):
+    if pending:
+        upsert_marks([(key, marks) for _, key, marks in pending])
+    ids = existing_mark_ids([key for _, key, _ in pending])
+    for index, key, _ in pending:
+        statuses[index] = {"index": index, "status": status, "id": ids.get(key)}
+    return statuses
+
+
+def bulk_create_marks(items):
+    """POST: new marks; a key that is already stored (or repeated in the request) is an error."""
+    students = _ids(Student, {d["student_id"] for _, d in items})
+    batches = _ids(Batch, {d["batch_id"] for _, d in items})
+    papers = {}
+    for chunk in _chunked({d["paper_id"] for _, d in items}):
+        papers.update(Paper.objects.filter(pk__in=chunk).values_list("pk", "max_marks"))
+
+    statuses, candidates, seen = {}, [], {}
+    for index, d in items:
+        errors = {}
+        if d["student_id"] not in students:
+            errors["student_id"] = ["Unknown student."]
+        if d["paper_id"] not in papers:
+            errors["paper_id"] = ["Unknown paper."]
+        if d["batch_id"] not in batches:
+            errors["batch_id"] = ["Unknown batch."]
+        key = (d["student_id"], d["paper_id"], d["exam_type"], d["batch_id"])
+        if not errors:
+            errors = _max_marks_error(d["marks"], papers[d["paper_id"]])
+        if not errors and key in seen:
+            errors = {"non_field_errors": [f"Duplicate of item {seen[key]}."]}
+        if errors:
+            statuses[index] = {"index": index, "status": "error", "errors": errors}
+            continue
+        seen[key] = index
+        candidates.append((index, key, d["marks"]))
+
+    existing = existing_mark_keys([key for _, key, _ in candidates])
+    pending = []
+    for index, key, marks in candidates:
+        if key in existing:
+            statuses[index] = {"index": index, "status": "error", "errors": {
+                "non_field_errors": ["A marks entry for this student/paper/exam/batch already exists."]}}
+        else:
+            pending.append((index, key, marks))
+    return _write(pending, statuses, "created")
+
+
+def bulk_update_marks(items):
+    """PATCH: new marks for existing rows, addressed by id."""
+    stored = {}
+    for chunk in _chunked({d["id"] for _, d in items}):
+        for pk, *key, max_marks in StudentMark.objects.filter(pk__in=chunk)\
+                .values_list("pk", *StudentMark.KEY_FIELDS, "paper__max_marks"):
+            stored[pk] = (tuple(key), max_marks)
+
+    statuses, pending, seen = {}, [], {}
+    for index, d in items:
+        if d["id"] not in stored:
+            errors = {"id": ["Not found."]}
+        elif d["id"] in seen:
+            errors = {"non_field_errors": [f"Duplicate of item {seen[d['id']]}."]}
+        else:
+            key, max_marks = stored[d["id"]]
+            errors = _max_marks_error(d["marks"], max_marks)
+        if errors:
+            statuses[index] = {"index": index, "status": "error", "errors": errors}
+            continue
+        seen[d["id"]] = index
+        pending.append((index, key, d["marks"]))
+    return _write(pending, statuses, "updated")
+
+
+def import_marks_file(fileobj, filename, dry_run=False):
+    rows = parse_marks_file(fileobj, filename)
+    return import_marks(rows, dry_run=dry_run)
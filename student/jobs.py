@@ -0,0 +1,224 @@
+"""
+Background export jobs.
+
+An export request creates an ExportJob row and hands its id to an in-process
+thread pool; the worker claims the row (queued -> running with a conditional
+UPDATE, so a job never runs twice), writes the file under TMS_EXPORT_DIR and
+records row progress as it goes, then its build time and rows (cards) per
+second. Nothing but the database is shared, so jobs
+left queued by a restarted process can be picked up with
+`manage.py run_export_jobs`.
+
+Identical requests are coalesced: while a job with the same parameters is
+queued or running, or finished against data that has not changed since
+(same cache versions, see student.conditional), that job is returned instead
+of starting another one, and the requester is added to its `requesters`. A
+partial unique constraint allows one unfinished job per parameter set, so two
+identical requests racing each other still end up on one job.
+
+Besides the exports of student.exports, a job can build the report cards of
+some batches (kind REPORT_CARDS, student.reportcards) into a ZIP.
+"""
+import csv
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+from django.db.models import Q
+from django.urls import reverse
+from django.utils import timezone
+
+from .cache import DERIVED_REBUILT
+from .columnar import FORMATS, filename_for, write_export
+from .conditional import version_validators
+from .exports import build_export, export_depends_on, params_hash
+from .models import ExportJob
+from .reportcards import build_report_cards, card_count
+
+logger = logging.getLogger(__name__)
+
+# rows written between progress updates
+PROGRESS_EVERY = 5000
+
+REPORT_CARDS = "report_cards"
+# a card shows marks, ranks and grades of students, papers, batches and courses
+REPORT_CARD_DEPENDS_ON = ("StudentMark", "Student", "Paper", "Batch", "Course", DERIVED_REBUILT)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def export_dir():
+    path = Path(getattr(settings, "TMS_EXPORT_DIR", Path(settings.BASE_DIR) / "exports"))
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def _executor():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=getattr(settings, "TMS_EXPORT_WORKERS", 2),
+                                       thread_name_prefix="tms-export")
+        return _pool
+
+
+def _run_in_worker(job_id):
+    try:
+        run_export_job(job_id)
+    finally:
+        # worker threads keep their own connections; don't leak them between jobs
+        connections.close_all()
+
+
+def submit(job_id):
+    _executor().submit(_run_in_worker, job_id)
+
+
+def _coalesce(digest, etag):
+    """The queued/running job for `digest`, or the finished one built from the same data; else None."""
+    current = ExportJob.objects.filter(params_hash=digest).filter(
+        Q(status__in=[ExportJob.QUEUED, ExportJob.RUNNING]) | Q(status=ExportJob.DONE, data_etag=etag)
+    ).order_by("-created_at").first()
+    if current and (current.status != ExportJob.DONE or os.path.exists(current.file_path)):
+        return current
+    return None
+
+
+def enqueue_export(kind, params, user=None):
+    """
+    Return (job, created): an existing equivalent job, or a new queued one handed to the pool.
+    `user` is added to the job's requesters either way, so it shows up in their list.
+    """
+    digest = params_hash(kind, params)
+    depends_on = REPORT_CARD_DEPENDS_ON if kind == REPORT_CARDS else export_depends_on(kind)
+    etag = version_validators(depends_on).etag
+    user = user if user and user.is_authenticated else None
+
+    job, created = _coalesce(digest, etag), False
+    while job is None:
+        try:
+            # the exportjob_one_active constraint makes check-then-create safe: when a concurrent
+            # identical request queues first, this one fails here and coalesces with it
+            with transaction.atomic():
+                job = ExportJob.objects.create(kind=kind, params=params, params_hash=digest, data_etag=etag,
+                                               requested_by=user)
+        except IntegrityError:
+            job = _coalesce(digest, etag)
+        else:
+            created = True
+            transaction.on_commit(lambda: submit(job.pk))
+
+    if user is not None:
+        job.requesters.add(user)
+    return job, created
+
+
+def enqueue_report_cards(batch_ids, formats, user=None):
+    """enqueue_export() for the report cards of `batch_ids` (see student.reportcards)."""
+    return enqueue_export(REPORT_CARDS, {"batches": sorted(batch_ids), "formats": sorted(formats)}, user)
+
+
+def _target(job, filename):
+    path = export_dir() / f"{job.pk}_{filename}"
+    return path, path.with_name(path.name + ".part")
+
+
+def run_export_job(job_id):
+    """Generate one job's file (no-op unless the job is still queued)."""
+    claimed = ExportJob.objects.filter(pk=job_id, status=ExportJob.QUEUED)\
+                               .update(status=ExportJob.RUNNING, started_at=timezone.now())
+    if not claimed:
+        return
+    job = ExportJob.objects.get(pk=job_id)
+    jobs = ExportJob.objects.filter(pk=job_id)
+    part = None
+    started = time.perf_counter()
+    try:
+        if job.kind == REPORT_CARDS:
+            batches = job.params["batches"]
+            jobs.update(rows_total=card_count(batches))
+            filename = f"report_cards_{job.created_at:%Y%m%d_%H%M%S}.zip"
+            path, part = _target(job, filename)
+            with open(part, "wb") as fh:
+                stats = build_report_cards(batches, fh, formats=job.params["formats"],
+                                           progress=lambda n: jobs.update(rows_done=n))
+            done, throughput = stats["cards"], {"seconds": stats["seconds"], "rows_per_sec": stats["cards_per_sec"]}
+        else:
+            export = build_export(job.kind, job.params)
+            jobs.update(rows_total=export.queryset.count())
+
+            fmt = job.params.get("format", "csv")
+            filename = export.filename if fmt == "csv" else filename_for(export, fmt)
+            path, part = _target(job, filename)
+            if fmt == "csv":
+                done = 0
+                with open(part, "w", newline="", encoding="utf-8") as fh:
+                    writer = csv.writer(fh)
+                    writer.writerow(export.header)
+                    for row in export.rows:
+                        writer.writerow(row)
+                        done += 1
+                        if done % PROGRESS_EVERY == 0:
+                            jobs.update(rows_done=done)
+            else:
+                with open(part, "wb") as fh:
+                    done = write_export(export, fmt, fh, progress=lambda n: jobs.update(rows_done=n))
+            seconds = time.perf_counter() - started
+            throughput = {"seconds": round(seconds, 2), "rows_per_sec": round(done / seconds, 1) if seconds else 0.0}
+        os.replace(part, path)
+        jobs.update(status=ExportJob.DONE, rows_done=done, rows_total=done, filename=filename,
+                    file_path=str(path), finished_at=timezone.now(), **throughput)
+    except Exception as exc:
+        logger.exception("export job %s failed", job_id)
+        if part is not None and part.exists():
+            part.unlink()
+        jobs.update(status=ExportJob.FAILED, error=str(exc), finished_at=timezone.now())
+
+
+def content_type(job):
+    if job.kind == REPORT_CARDS:
+        return "application/zip"
+    fmt = job.params.get("format", "csv")
+    return FORMATS[fmt][1] if fmt in FORMATS else "text/csv"
+
+
+def job_status(job):
+    data = {
+        "id": job.pk,
+        "kind": job.kind,
+        "params": job.params,
+        "status": job.status,
+        "rows_done": job.rows_done,
+        "rows_total": job.rows_total,
+        "progress": job.progress,
+        "seconds": job.seconds,
+        "rows_per_sec": job.rows_per_sec,
+        "created_at": job.created_at.isoformat(),
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "error": job.error or None,
+        "status_url": reverse("export_job_status", args=[job.pk]),
+        "download_url": None,
+    }
+    if job.status == ExportJob.DONE:
+        data["download_url"] = reverse("export_job_download", args=[job.pk])
+    return data
+
+
+def prune_jobs(days):
+    """Delete finished jobs (and their files) older than `days`. Returns the number removed."""
+    old = ExportJob.objects.filter(status__in=[ExportJob.DONE, ExportJob.FAILED],
+                                   created_at__lt=timezone.now() - timedelta(days=days))
+    count = 0
+    for job in old.iterator():
+        if job.file_path and os.path.exists(job.file_path):
+            os.remove(job.file_path)
+        job.delete()
+        count += 1
+    return count
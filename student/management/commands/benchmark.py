@@ -0,0 +1,41 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+
+from student.benchmarks import run_benchmarks
+
+
+class Command(BaseCommand):
+    help = ("Seed a throwaway test database and measure wall time, SQL queries and peak memory "
+            "for the main pages, exports and API endpoints; prints JSON")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--students", type=int, default=1000)
+        parser.add_argument("--papers", type=int, default=10)
+        parser.add_argument("--batches", type=int, default=10)
+        parser.add_argument("--exams", type=int, default=3, help="Exam types per paper (1-5)")
+        parser.add_argument("--repeat", type=int, default=3, help="Warm runs per case")
+        parser.add_argument("--seed", type=int, default=0, help="Random seed for the marks")
+        parser.add_argument("--only", nargs="*", help="Case names to run (default: all)")
+        parser.add_argument("--output", help="Write the JSON report to this file instead of stdout")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={"default"})
+        try:
+            report = run_benchmarks(students=options["students"], papers=options["papers"],
+                                    batches=options["batches"], exams=min(max(options["exams"], 1), 5),
+                                    repeat=options["repeat"], only=options["only"], seed=options["seed"])
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        data = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as fh:
+                fh.write(data + "\n")
+            self.stdout.write(self.style.SUCCESS(
+                f"{len(report['results'])} cases on {report['meta']['database']} written to {options['output']}."))
+        else:
+            self.stdout.write(data)
@@ -0,0 +1,42 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from django.utils import timezone
+
+from student.jobs import export_dir
+from student.models import Batch
+from student.reportcards import FORMATS, ReportCardError, build_report_cards
+
+
+class Command(BaseCommand):
+    help = "Render one report card per active student of the given batches / courses into a ZIP"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch", type=int, action="append", dest="batches", default=[],
+                            help="Batch id (repeatable)")
+        parser.add_argument("--course", action="append", dest="courses", default=[],
+                            help="Course id, e.g. MCA01: every batch of the course (repeatable)")
+        parser.add_argument("--format", action="append", dest="formats", choices=FORMATS,
+                            help="html and/or pdf (repeatable; default html)")
+        parser.add_argument("--workers", type=int, help="Render processes (default TMS_REPORTCARD_WORKERS / CPUs)")
+        parser.add_argument("--output", help="ZIP path (default: TMS_EXPORT_DIR/report_cards_<time>.zip)")
+
+    def handle(self, *args, **options):
+        if not options["batches"] and not options["courses"]:
+            raise CommandError("Give at least one --batch or --course.")
+        batches = list(Batch.objects.filter(Q(pk__in=options["batches"]) | Q(course__courseid__in=options["courses"]))
+                       .values_list("pk", flat=True))
+        if not batches:
+            raise CommandError("No matching batches.")
+        path = Path(options["output"] or export_dir() / f"report_cards_{timezone.now():%Y%m%d_%H%M%S}.zip")
+        try:
+            with open(path, "wb") as fh:
+                stats = build_report_cards(batches, fh, formats=options["formats"] or ("html",),
+                                           workers=options["workers"])
+        except ReportCardError as exc:
+            path.unlink(missing_ok=True)
+            raise CommandError(str(exc))
+        self.stdout.write(self.style.SUCCESS(
+            f"{stats['cards']} report cards ({stats['files']} files) in {stats['seconds']}s "
+            f"= {stats['cards_per_sec']} cards/sec -> {path}"))
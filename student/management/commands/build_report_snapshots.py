@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from student.snapshots import build_snapshots
+
+
+class Command(BaseCommand):
+    help = "Snapshot batch/paper/exam statistics for every partition whose marks changed since the last run"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true", help="Rebuild every partition, not just the changed ones")
+
+    def handle(self, *args, **options):
+        run = build_snapshots(full=options["full"])
+        kind = "full" if run.full else "incremental"
+        self.stdout.write(self.style.SUCCESS(f"Snapshot run {run.pk} ({kind}): {run.partitions} partitions rebuilt."))
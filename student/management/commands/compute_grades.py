@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from student.grading import regrade_batches
+
+
+class Command(BaseCommand):
+    help = "Recompute every PaperGrade / StudentGPA row (or only those of --batch)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch", type=int, action="append", dest="batches",
+                            help="Batch id to regrade (repeatable); default: every batch")
+
+    def handle(self, *args, **options):
+        count = regrade_batches(options["batches"])
+        self.stdout.write(self.style.SUCCESS(f"Graded {count} students."))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from student.importers import ImportFileError, import_marks_file
+
+
+class Command(BaseCommand):
+    help = "Bulk import student marks from a CSV or XLSX file (upserts on student/paper/exam/batch)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV or XLSX file with regno, paper_code, exam_type, batch, marks columns")
+        parser.add_argument("--dry-run", action="store_true", help="Validate only, do not write anything")
+        parser.add_argument("--max-errors", type=int, default=50, help="Row errors to print (default 50)")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        try:
+            with open(path, "rb") as fh:
+                result = import_marks_file(fh, path, dry_run=options["dry_run"])
+        except FileNotFoundError:
+            raise CommandError(f"File not found: {path}")
+        except ImportFileError as exc:
+            raise CommandError(str(exc))
+
+        for line_no, message in result.errors[:options["max_errors"]]:
+            self.stdout.write(self.style.WARNING(f"line {line_no}: {message}"))
+        if result.error_count > options["max_errors"]:
+            self.stdout.write(self.style.WARNING(f"... {result.error_count - options['max_errors']} more errors"))
+
+        verb = "Would write" if result.dry_run else "Wrote"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {result.written} of {result.total} rows "
+            f"({result.created} new, {result.updated} updated, {result.error_count} errors)."
+        ))
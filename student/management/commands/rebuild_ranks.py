@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from student.ranks import rebuild_all_ranks
+
+
+class Command(BaseCommand):
+    help = "Recompute every MarkRank / BatchRank row from StudentMark"
+
+    def handle(self, *args, **options):
+        count = rebuild_all_ranks()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt ranks for {count} batch/paper/exam partitions."))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from student.summaries import rebuild_all_summaries
+
+
+class Command(BaseCommand):
+    help = "Re-score every StudentMark (percentage / passed), then recompute every StudentSummary / StudentPaperSummary row"
+
+    def handle(self, *args, **options):
+        count = rebuild_all_summaries()
+        self.stdout.write(self.style.SUCCESS(f"Re-scored marks and rebuilt summaries for {count} students."))
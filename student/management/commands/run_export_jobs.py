@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from student.jobs import prune_jobs, run_export_job
+from student.models import ExportJob
+
+
+class Command(BaseCommand):
+    help = "Run queued background exports in this process (e.g. jobs left behind by a restart) and prune old ones"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--prune-days", type=int, default=None,
+                            help="also delete finished jobs and their files older than this many days")
+
+    def handle(self, *args, **options):
+        ids = list(ExportJob.objects.filter(status=ExportJob.QUEUED).order_by("created_at").values_list("pk", flat=True))
+        for pk in ids:
+            run_export_job(pk)
+            job = ExportJob.objects.get(pk=pk)
+            self.stdout.write(f"#{pk} {job.kind}: {job.status} ({job.rows_done} rows)")
+        self.stdout.write(self.style.SUCCESS(f"Ran {len(ids)} queued export job(s)."))
+
+        if options["prune_days"] is not None:
+            count = prune_jobs(options["prune_days"])
+            self.stdout.write(self.style.SUCCESS(f"Pruned {count} old export job(s)."))
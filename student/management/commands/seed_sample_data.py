@@ -1,12 +1,30 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from student.models import Course, Batch, Paper, Student, StudentMark
+from student.sampledata import SampleDataError, generate
 from django.utils import timezone
 import random
+import time
+
+SCALE_OPTIONS = ("courses", "batches", "papers", "students", "exams")
 
 class Command(BaseCommand):
-    help = "Create sample data for TrackMyScore"
+    help = ("Create sample data for TrackMyScore: a small demo set, or with any of "
+            "--courses/--batches/--papers/--students/--exams a synthetic dataset of that size")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--courses", type=int, help="Courses to generate (default 2)")
+        parser.add_argument("--batches", type=int, help="Batches to generate, spread over the courses (default 4)")
+        parser.add_argument("--papers", type=int, help="Papers to generate, dealt round-robin to the courses (default 10)")
+        parser.add_argument("--students", type=int, help="Students to generate (default 1000)")
+        parser.add_argument("--exams", type=int, help="Exam types each student sits per paper, 1-5 (default 3)")
+        parser.add_argument("--seed", type=int, default=0, help="Random seed; the same seed and sizes give the same data")
+        parser.add_argument("--prefix", default="SY",
+                            help="Code / regno prefix of the generated rows (max 4 characters, default SY)")
 
     def handle(self, *args, **options):
+        if any(options[name] is not None for name in SCALE_OPTIONS):
+            return self.generate(options)
+        rng = random.Random(options["seed"])
         # Courses
         c1, _ = Course.objects.get_or_create(courseid="MCA-FT", defaults={"name":"MCA Full Time"})
         c2, _ = Course.objects.get_or_create(courseid="BCA-FT", defaults={"name":"BCA Full Time"})
@@ -32,7 +50,23 @@ class Command(BaseCommand):
                         paper=paper,
                         exam_type=exam,
                         batch=b1,
-                        defaults={"marks": random.randint(40,95), "created_at": timezone.now()}
+                        defaults={"marks": rng.randint(40,95), "created_at": timezone.now()}
                     )
 
         self.stdout.write(self.style.SUCCESS("Sample data created."))
+
+    def generate(self, options):
+        if len(options["prefix"]) > 4:
+            raise CommandError("--prefix can be at most 4 characters.")
+        sizes = {"courses": 2, "batches": 4, "papers": 10, "students": 1000, "exams": 3}
+        sizes.update({name: options[name] for name in SCALE_OPTIONS if options[name] is not None})
+        started = time.monotonic()
+        try:
+            counts = generate(seed=options["seed"], prefix=options["prefix"],
+                              progress=lambda message: self.stdout.write(f"  [{time.monotonic() - started:6.1f}s] {message}"), **sizes)
+        except SampleDataError as exc:
+            raise CommandError(str(exc))
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {counts['students']} students and {counts['marks']} marks in {elapsed:.1f}s "
+            f"({counts['marks'] / max(elapsed, 0.001):.0f} marks/s)."))
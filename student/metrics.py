@@ -0,0 +1,195 @@
+"""
+Per-request metrics: latency, SQL query count and time, response size.
+
+RequestMetricsMiddleware (outermost in MIDDLEWARE) puts a database execute
+wrapper on every connection for the duration of a request, then records one
+observation per histogram, labelled with the resolved view name. Streaming
+responses are recorded when their body has been sent, so queries made while
+streaming count too. /metrics renders everything in the Prometheus text
+format; with TMS_SERVER_TIMING the totals also go out as a Server-Timing
+header.
+
+The cost per query is two perf_counter() calls; per request, one lock and a
+few bisects. Metrics live in process memory, so each worker process reports
+its own series; scrape every worker and sum() them in queries.
+"""
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db import connections
+from django.http import FileResponse
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+BYTES_BUCKETS = (256, 1024, 10240, 102400, 1048576, 10485760, 104857600)
+
+# anything else is recorded as "other", so junk methods can't create new series
+METHODS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"}
+
+_lock = threading.Lock()
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets, labels):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.labels = labels
+        self.series = {}  # label values -> [count per bucket ..., +Inf count, sum]
+
+    def observe(self, label_values, value):
+        row = self.series.get(label_values)
+        if row is None:
+            row = self.series[label_values] = [0] * (len(self.buckets) + 1) + [0]
+        row[bisect_left(self.buckets, value)] += 1
+        row[-1] += value
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} histogram"
+        for label_values, row in sorted(self.series.items()):
+            labels = _labels(self.labels, label_values)
+            running = 0
+            for bound, count in zip(self.buckets + ("+Inf",), row):
+                running += count
+                yield f'{self.name}_bucket{{{labels},le="{bound}"}} {running}'
+            yield f"{self.name}_sum{{{labels}}} {row[-1]}"
+            yield f"{self.name}_count{{{labels}}} {running}"
+
+
+class Counter:
+    def __init__(self, name, help_text, labels):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.series = {}
+
+    def inc(self, label_values):
+        self.series[label_values] = self.series.get(label_values, 0) + 1
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} counter"
+        for label_values, value in sorted(self.series.items()):
+            yield f"{self.name}{{{_labels(self.labels, label_values)}}} {value}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values):
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+REQUESTS = Counter("tms_requests_total", "Requests by view, method and status.", ("view", "method", "status"))
+DURATION = Histogram("tms_request_duration_seconds", "Request latency, including a streamed body.",
+                     SECONDS_BUCKETS, ("view", "method"))
+QUERIES = Histogram("tms_request_queries", "SQL queries per request.", QUERY_BUCKETS, ("view", "method"))
+SQL_TIME = Histogram("tms_request_sql_seconds", "Time spent in SQL per request.", SECONDS_BUCKETS, ("view", "method"))
+SIZE = Histogram("tms_response_bytes", "Response body size.", BYTES_BUCKETS, ("view", "method"))
+METRICS = (REQUESTS, DURATION, QUERIES, SQL_TIME, SIZE)
+
+
+def render_metrics():
+    with _lock:
+        lines = [line for metric in METRICS for line in metric.render()]
+    return "\n".join(lines) + "\n"
+
+
+class _QueryProbe:
+    """Execute wrapper counting queries and SQL time (see Django's connection.execute_wrapper)."""
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.queries += 1
+
+
+class _CountedStream:
+    """Streaming body wrapper: counts bytes, reports once when exhausted or closed."""
+
+    def __init__(self, chunks, done):
+        self.chunks = iter(chunks)
+        self.done = done
+        self.size = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            chunk = next(self.chunks)
+        except StopIteration:
+            self.close()
+            raise
+        self.size += len(chunk)
+        return chunk
+
+    def close(self):
+        # the response calls this from close(), also when the body was never iterated
+        if self.done:
+            done, self.done = self.done, None
+            done(self.size)
+
+
+class RequestMetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.server_timing = getattr(settings, "TMS_SERVER_TIMING", False)
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        probe = _QueryProbe()
+        wrapped = list(connections.all())
+        for conn in wrapped:
+            conn.execute_wrappers.append(probe)
+
+        def unwrap():
+            for conn in wrapped:
+                if probe in conn.execute_wrappers:
+                    conn.execute_wrappers.remove(probe)
+
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            unwrap()
+            raise
+
+        def finish(size):
+            unwrap()
+            match = getattr(request, "resolver_match", None)
+            view = match.view_name if match else "unmatched"
+            method = request.method if request.method in METHODS else "other"
+            labels = (view, method)
+            with _lock:
+                REQUESTS.inc((view, method, response.status_code))
+                DURATION.observe(labels, time.perf_counter() - started)
+                QUERIES.observe(labels, probe.queries)
+                SQL_TIME.observe(labels, probe.seconds)
+                SIZE.observe(labels, size)
+
+        if self.server_timing:
+            # for a streamed body these are the totals up to the first byte
+            response["Server-Timing"] = (
+                f"app;dur={(time.perf_counter() - started) * 1000:.1f}, "
+                f'db;dur={probe.seconds * 1000:.1f};desc="{probe.queries} queries"'
+            )
+
+        if not response.streaming:
+            finish(len(response.content))
+        elif isinstance(response, FileResponse):
+            # keep the file (and wsgi.file_wrapper) untouched; its size is known up front
+            finish(int(response.get("Content-Length") or 0))
+        else:
+            response.streaming_content = _CountedStream(response.streaming_content, finish)
+        return response
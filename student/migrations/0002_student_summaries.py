@@ -0,0 +1,42 @@
+# Generated by Django 4.2.30 on 2026-10-17 20:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('student', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentSummary',
+            fields=[
+                ('student', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='student.student')),
+                ('mark_count', models.IntegerField(default=0)),
+                ('pass_count', models.IntegerField(default=0)),
+                ('avg_marks', models.DecimalField(decimal_places=2, max_digits=6, null=True)),
+                ('best_marks', models.DecimalField(decimal_places=2, max_digits=5, null=True)),
+                ('worst_marks', models.DecimalField(decimal_places=2, max_digits=5, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StudentPaperSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mark_count', models.IntegerField(default=0)),
+                ('pass_count', models.IntegerField(default=0)),
+                ('avg_marks', models.DecimalField(decimal_places=2, max_digits=6, null=True)),
+                ('best_marks', models.DecimalField(decimal_places=2, max_digits=5, null=True)),
+                ('worst_marks', models.DecimalField(decimal_places=2, max_digits=5, null=True)),
+                ('paper', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='student.paper')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='paper_summaries', to='student.student')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['student', '-avg_marks'], name='paper_summary_student_avg')],
+                'unique_together': {('student', 'paper')},
+            },
+        ),
+    ]
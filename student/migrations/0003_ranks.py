@@ -0,0 +1,43 @@
+# Generated by Django 4.2.30 on 2026-10-17 20:19
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('student', '0002_student_summaries'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MarkRank',
+            fields=[
+                ('mark', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rank', serialize=False, to='student.studentmark')),
+                ('exam_type', models.CharField(max_length=32)),
+                ('dense_rank', models.IntegerField()),
+                ('percentile', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('batch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='student.batch')),
+                ('paper', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='student.paper')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['batch', 'paper', 'exam_type', 'dense_rank'], name='mark_rank_partition')],
+            },
+        ),
+        migrations.CreateModel(
+            name='BatchRank',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('avg_marks', models.DecimalField(decimal_places=2, max_digits=6)),
+                ('dense_rank', models.IntegerField()),
+                ('percentile', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('batch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='student.batch')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='batch_ranks', to='student.student')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['batch', 'dense_rank'], name='batch_rank_order')],
+                'unique_together': {('batch', 'student')},
+            },
+        ),
+    ]
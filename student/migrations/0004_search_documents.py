@@ -0,0 +1,75 @@
+# Generated by Django 4.2.30 on 2026-10-17 20:22
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, TextField, Value
+from django.db.models.functions import Coalesce, Concat, Lower
+
+
+def _join(*parts):
+    pieces = []
+    for part in parts:
+        if pieces:
+            pieces.append(Value(" "))
+        pieces.append(Coalesce(part, Value(""), output_field=TextField()))
+    return Lower(Concat(*pieces, output_field=TextField()))
+
+
+def backfill_documents(apps, schema_editor):
+    Batch = apps.get_model('student', 'Batch')
+    Paper = apps.get_model('student', 'Paper')
+    Student = apps.get_model('student', 'Student')
+    StudentMark = apps.get_model('student', 'StudentMark')
+
+    def col(model, ref, field):
+        return Subquery(model.objects.filter(pk=OuterRef(ref)).values(field)[:1])
+
+    Student.objects.update(search_document=_join(
+        F('regno'), F('name'), F('email'),
+        col(Batch, 'batch_id', 'name'), col(Batch, 'batch_id', 'course__name'),
+    ))
+    StudentMark.objects.update(search_document=_join(
+        col(Student, 'student_id', 'regno'), col(Student, 'student_id', 'name'),
+        col(Paper, 'paper_id', 'code'), col(Paper, 'paper_id', 'name'),
+        F('exam_type'),
+        col(Batch, 'batch_id', 'name'), col(Batch, 'batch_id', 'course__name'),
+    ))
+
+
+def create_trigram_indexes(apps, schema_editor):
+    # GIN trigram indexes make LIKE '%term%' indexable; PostgreSQL only
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute('CREATE INDEX IF NOT EXISTS student_search_trgm '
+                          'ON student_student USING gin (search_document gin_trgm_ops)')
+    schema_editor.execute('CREATE INDEX IF NOT EXISTS studentmark_search_trgm '
+                          'ON student_studentmark USING gin (search_document gin_trgm_ops)')
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS student_search_trgm')
+    schema_editor.execute('DROP INDEX IF EXISTS studentmark_search_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('student', '0003_ranks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='student',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='studentmark',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(backfill_documents, migrations.RunPython.noop),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.30 on 2026-10-17 20:23
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('student', '0004_search_documents'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='batch',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['course', 'name'], name='batch_active_course_name'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(django.db.models.functions.text.Upper('regno'), name='student_regno_upper'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(django.db.models.functions.text.Upper('email'), name='student_email_upper'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['batch', 'regno'], name='student_active_batch_regno'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['-created_at', '-id'], name='student_created_id'),
+        ),
+        migrations.AddIndex(
+            model_name='studentmark',
+            index=models.Index(fields=['-created_at', '-id'], name='mark_created_id'),
+        ),
+        migrations.AddIndex(
+            model_name='studentmark',
+            index=models.Index(fields=['student', '-created_at'], name='mark_student_created'),
+        ),
+        migrations.AddIndex(
+            model_name='studentmark',
+            index=models.Index(fields=['batch', 'paper', 'exam_type'], name='mark_batch_paper_exam'),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 4.2.30 on 2026-10-17 20:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('student', '0007_export_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('full', models.BooleanField(default=False)),
+                ('partitions', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ReportDirtyPartition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('batch_id', models.BigIntegerField()),
+                ('paper_id', models.BigIntegerField()),
+                ('exam_type', models.CharField(max_length=32)),
+                ('marked_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'unique_together': {('batch_id', 'paper_id', 'exam_type')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ReportSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('exam_type', models.CharField(max_length=32)),
+                ('taken_at', models.DateTimeField()),
+                ('is_current', models.BooleanField(default=True)),
+                ('paper_max_marks', models.IntegerField()),
+                ('mark_count', models.IntegerField()),
+                ('pass_count', models.IntegerField()),
+                ('pass_rate', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('avg_marks', models.DecimalField(decimal_places=2, max_digits=6)),
+                ('median_marks', models.DecimalField(decimal_places=2, max_digits=6)),
+                ('stddev_marks', models.DecimalField(decimal_places=2, max_digits=6)),
+                ('min_marks', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('max_marks', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('top_students', models.JSONField(default=list)),
+                ('bottom_students', models.JSONField(default=list)),
+                ('batch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='student.batch')),
+                ('paper', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='student.paper')),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='student.reportrun')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('is_current', True)), fields=['batch', 'paper', 'exam_type'], name='snapshot_current'), models.Index(fields=['batch', 'paper', 'exam_type', 'taken_at'], name='snapshot_history')],
+            },
+        ),
+    ]
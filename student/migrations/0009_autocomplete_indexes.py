@@ -0,0 +1,39 @@
+# Generated by Django 4.2.30 on 2026-10-17 21:10
+
+from django.db import migrations
+
+# (index, table, column) for the autocomplete prefix searches (student/autocomplete.py)
+PREFIX_INDEXES = [
+    ('student_regno_prefix', 'student_student', 'regno'),
+    ('student_name_prefix', 'student_student', 'name'),
+    ('paper_code_prefix', 'student_paper', 'code'),
+    ('paper_name_prefix', 'student_paper', 'name'),
+    ('batch_name_prefix', 'student_batch', 'name'),
+]
+
+
+def create_prefix_indexes(apps, schema_editor):
+    # col__istartswith is UPPER(col::text) LIKE UPPER('term%'); text_pattern_ops makes that an
+    # index range scan whatever the database collation. PostgreSQL only.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table, column in PREFIX_INDEXES:
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {table} (UPPER({column}::text) text_pattern_ops)')
+
+
+def drop_prefix_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _, _ in PREFIX_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('student', '0008_report_snapshots'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_prefix_indexes, drop_prefix_indexes),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.2.30 on 2026-10-17 20:58
+
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Case, DecimalField, FloatField, Value, When
+from django.db.models.functions import Cast
+
+
+def backfill_scores(apps, schema_editor):
+    # same values as student.scores.score_values, one UPDATE per paper
+    Paper = apps.get_model('student', 'Paper')
+    StudentMark = apps.get_model('student', 'StudentMark')
+    threshold = Decimal(str(getattr(settings, 'TMS_PASS_THRESHOLD', 35)))
+    for paper_id, max_marks in Paper.objects.values_list('pk', 'max_marks'):
+        if not max_marks or max_marks <= 0:
+            continue  # percentage NULL, passed False: the column defaults
+        StudentMark.objects.filter(paper_id=paper_id).update(
+            percentage=Cast(Cast('marks', FloatField()) * Value(100.0 / max_marks),
+                            DecimalField(max_digits=6, decimal_places=2)),
+            passed=Case(When(marks__gte=Decimal(max_marks) * threshold / 100, then=Value(True)),
+                        default=Value(False)),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('student', '0009_autocomplete_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studentmark',
+            name='passed',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='studentmark',
+            name='percentage',
+            field=models.DecimalField(decimal_places=2, editable=False, max_digits=6, null=True),
+        ),
+        migrations.RunPython(backfill_scores, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='studentmark',
+            index=models.Index(condition=models.Q(('passed', False)), fields=['batch', 'paper', 'exam_type'], name='mark_failed'),
+        ),
+        migrations.AddIndex(
+            model_name='studentmark',
+            index=models.Index(fields=['paper', '-percentage'], name='mark_paper_percentage'),
+        ),
+    ]
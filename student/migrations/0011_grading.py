@@ -0,0 +1,136 @@
+# Generated by Django 4.2.30 on 2026-10-17 21:01
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+# 10-point scale; no exam weights, so every exam of a paper counts equally until weights are set
+DEFAULT_BOUNDARIES = [
+    ('O', '90', '10'), ('A+', '80', '9'), ('A', '70', '8'), ('B+', '60', '7'),
+    ('B', '50', '6'), ('C', '40', '5'), ('P', '35', '4'), ('F', '0', '0'),
+]
+
+
+def create_default_scheme(apps, schema_editor):
+    GradingScheme = apps.get_model('student', 'GradingScheme')
+    GradeBoundary = apps.get_model('student', 'GradeBoundary')
+    scheme = GradingScheme.objects.create(name='Default (10-point)', is_default=True)
+    GradeBoundary.objects.bulk_create([
+        GradeBoundary(scheme=scheme, letter=letter, min_percentage=Decimal(lo), grade_point=Decimal(gp))
+        for letter, lo, gp in DEFAULT_BOUNDARIES
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('student', '0010_mark_scores'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExamWeight',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('exam_type', models.CharField(max_length=32)),
+                ('weight', models.DecimalField(decimal_places=2, max_digits=5)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='GradeBoundary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('letter', models.CharField(max_length=4)),
+                ('min_percentage', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('grade_point', models.DecimalField(decimal_places=2, max_digits=4)),
+            ],
+            options={
+                'ordering': ['scheme', '-min_percentage'],
+            },
+        ),
+        migrations.CreateModel(
+            name='GradingScheme',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=64, unique=True)),
+                ('is_default', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='paper',
+            name='credits',
+            field=models.DecimalField(decimal_places=1, default=Decimal('4.0'), max_digits=4),
+        ),
+        migrations.CreateModel(
+            name='StudentGPA',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('gpa', models.DecimalField(decimal_places=2, max_digits=4)),
+                ('credits_attempted', models.DecimalField(decimal_places=1, max_digits=6)),
+                ('credits_earned', models.DecimalField(decimal_places=1, max_digits=6)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('batch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='student.batch')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='gpas', to='student.student')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PaperGrade',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weighted_percentage', models.DecimalField(decimal_places=2, max_digits=6)),
+                ('letter', models.CharField(max_length=4)),
+                ('grade_point', models.DecimalField(decimal_places=2, max_digits=4)),
+                ('credits', models.DecimalField(decimal_places=1, max_digits=4)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('batch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='student.batch')),
+                ('paper', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='student.paper')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='paper_grades', to='student.student')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='gradingscheme',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_default', True)), fields=('is_default',), name='gradingscheme_one_default'),
+        ),
+        migrations.AddField(
+            model_name='gradeboundary',
+            name='scheme',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='boundaries', to='student.gradingscheme'),
+        ),
+        migrations.AddField(
+            model_name='examweight',
+            name='scheme',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='weights', to='student.gradingscheme'),
+        ),
+        migrations.AddField(
+            model_name='batch',
+            name='grading_scheme',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='batches', to='student.gradingscheme'),
+        ),
+        migrations.AddIndex(
+            model_name='studentgpa',
+            index=models.Index(fields=['-updated_at', '-id'], name='gpa_updated_id'),
+        ),
+        migrations.AddIndex(
+            model_name='studentgpa',
+            index=models.Index(fields=['batch', '-gpa'], name='gpa_batch_order'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='studentgpa',
+            unique_together={('batch', 'student')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='papergrade',
+            unique_together={('batch', 'student', 'paper')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='gradeboundary',
+            unique_together={('scheme', 'min_percentage'), ('scheme', 'letter')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='examweight',
+            unique_together={('scheme', 'exam_type')},
+        ),
+        migrations.RunPython(create_default_scheme, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.30 on 2026-10-17 21:27
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def copy_requesters(apps, schema_editor):
+    ExportJob = apps.get_model('student', 'ExportJob')
+    Requester = ExportJob.requesters.through
+    Requester.objects.bulk_create([
+        Requester(exportjob_id=pk, user_id=user_id)
+        for pk, user_id in ExportJob.objects.filter(requested_by__isnull=False).values_list('pk', 'requested_by_id')
+    ])
+
+
+def fail_duplicate_active_jobs(apps, schema_editor):
+    # older duplicates of an unfinished job would block the constraint; the newest one is kept
+    ExportJob = apps.get_model('student', 'ExportJob')
+    seen = set()
+    for pk, digest in ExportJob.objects.filter(status__in=['queued', 'running'])\
+            .order_by('-created_at', '-pk').values_list('pk', 'params_hash'):
+        if digest in seen:
+            ExportJob.objects.filter(pk=pk).update(status='failed', error='Superseded by an identical export.')
+        seen.add(digest)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('student', '0011_grading'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exportjob',
+            name='requesters',
+            field=models.ManyToManyField(blank=True, related_name='requested_exports', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(copy_requesters, migrations.RunPython.noop),
+        migrations.RunPython(fail_duplicate_active_jobs, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='exportjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['queued', 'running'])), fields=('params_hash',), name='exportjob_one_active'),
+        ),
+    ]
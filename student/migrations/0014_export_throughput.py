@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-17 21:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('student', '0013_profile_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exportjob',
+            name='rows_per_sec',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='exportjob',
+            name='seconds',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
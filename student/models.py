@@ -1,4 +1,8 @@
+from decimal import Decimal
+
 from django.db import models
+from django.db.models import Q
+from django.db.models.functions import Upper
 from django.utils import timezone
 from django.contrib.auth.models import User
 from django.db.models.signals import post_save
@@ -12,6 +16,7 @@ class Profile(models.Model):
     )
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="profile")
     role = models.CharField(max_length=20, choices=ROLE_CHOICES, default="student")
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.user.username} ({self.role})"
@@ -25,6 +30,7 @@ class Course(models.Model):
     name = models.CharField(max_length=64, unique=True)  
     courseid = models.CharField(max_length=12, unique=True)  
     created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self): return f"{self.courseid} - {self.name}"
 
@@ -34,9 +40,17 @@ class Batch(models.Model):
     name = models.CharField(max_length=32)   
     year = models.CharField(max_length=9)
     is_active = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # None: the default GradingScheme (student.grading)
+    grading_scheme = models.ForeignKey('GradingScheme', on_delete=models.SET_NULL, null=True, blank=True,
+                                       related_name='batches')
 
     class Meta:
         unique_together = (("course", "name"),)
+        indexes = [
+            # active batches per course (batch pickers, reports); see README "Query → index map"
+            models.Index(fields=['course', 'name'], condition=Q(is_active=True), name='batch_active_course_name'),
+        ]
 
     def __str__(self): return f"{self.name} - {self.course}"
 
@@ -46,6 +60,8 @@ class Paper(models.Model):
     name = models.CharField(max_length=120)
     paper_type = models.CharField(max_length=30, blank=True)  
     max_marks = models.IntegerField(default=100)
+    credits = models.DecimalField(max_digits=4, decimal_places=1, default=Decimal("4.0"))  # GPA weight
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self): return f"{self.name} ({self.code})"
 
@@ -57,6 +73,20 @@ class Student(models.Model):
     email = models.EmailField(blank=True, null=True)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+    # lower-cased regno/name/email/batch/course, maintained by student.search
+    search_document = models.TextField(blank=True, default='', editable=False)
+
+    class Meta:
+        indexes = [
+            # regno__iexact / email__iexact compile to UPPER(col) = UPPER(%s)
+            models.Index(Upper('regno'), name='student_regno_upper'),
+            models.Index(Upper('email'), name='student_email_upper'),
+            # active students of a batch in regno order (gradebook, report cards)
+            models.Index(fields=['batch', 'regno'], condition=Q(is_active=True), name='student_active_batch_regno'),
+            # API keyset pages
+            models.Index(fields=['-created_at', '-id'], name='student_created_id'),
+        ]
 
     def __str__(self): return f"{self.regno} - {self.name}"
 
@@ -68,8 +98,297 @@ class StudentMark(models.Model):
     batch = models.ForeignKey(Batch, on_delete=models.PROTECT)
     marks = models.DecimalField(max_digits=5, decimal_places=2)  
     created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+    # lower-cased student/paper/exam/batch/course text, maintained by student.search
+    search_document = models.TextField(blank=True, default='', editable=False)
+    # marks as a percentage of paper.max_marks, and whether that reaches TMS_PASS_THRESHOLD;
+    # maintained by student.scores
+    percentage = models.DecimalField(max_digits=6, decimal_places=2, null=True, editable=False)
+    passed = models.BooleanField(default=False, editable=False)
 
     class Meta:
         unique_together = (('student','paper','exam_type','batch'),)
+        indexes = [
+            # every marks list / API page: ORDER BY created_at DESC, id DESC (keyset)
+            models.Index(fields=['-created_at', '-id'], name='mark_created_id'),
+            # dashboard: one student's marks, latest first
+            models.Index(fields=['student', '-created_at'], name='mark_student_created'),
+            # gradebook, ranks, analytics: one (batch, paper, exam_type) partition
+            models.Index(fields=['batch', 'paper', 'exam_type'], name='mark_batch_paper_exam'),
+            # failures of a batch (/ paper / exam); only failed rows are indexed
+            models.Index(fields=['batch', 'paper', 'exam_type'], condition=Q(passed=False), name='mark_failed'),
+            # best / worst of a paper by percentage ("top 10%", ?min_percentage=)
+            models.Index(fields=['paper', '-percentage'], name='mark_paper_percentage'),
+        ]
 
     def __str__(self): return f"{self.student.regno} | {self.paper.name} : {self.marks}"
+
+    KEY_FIELDS = ('student_id', 'paper_id', 'exam_type', 'batch_id')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remember the unique key as loaded, so an edit that moves the mark can refresh the old spot too
+        loaded = dict(zip(field_names, values))
+        if all(f in loaded for f in cls.KEY_FIELDS):
+            instance._loaded_key = tuple(loaded[f] for f in cls.KEY_FIELDS)
+        return instance
+
+    @property
+    def key(self):
+        return tuple(getattr(self, f) for f in self.KEY_FIELDS)
+
+
+class StudentSummary(models.Model):
+    """Denormalised per-student totals, kept in sync by student.summaries."""
+    student = models.OneToOneField(Student, on_delete=models.CASCADE, primary_key=True, related_name='summary')
+    mark_count = models.IntegerField(default=0)
+    pass_count = models.IntegerField(default=0)
+    avg_marks = models.DecimalField(max_digits=6, decimal_places=2, null=True)
+    best_marks = models.DecimalField(max_digits=5, decimal_places=2, null=True)
+    worst_marks = models.DecimalField(max_digits=5, decimal_places=2, null=True)
+
+    @property
+    def pass_percent(self):
+        return (self.pass_count / self.mark_count * 100) if self.mark_count else 0
+
+    def __str__(self): return f"{self.student_id}: avg {self.avg_marks} over {self.mark_count}"
+
+
+class StudentPaperSummary(models.Model):
+    """Same totals per (student, paper); feeds the dashboard subject breakdown."""
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='paper_summaries')
+    paper = models.ForeignKey(Paper, on_delete=models.CASCADE, related_name='+')
+    mark_count = models.IntegerField(default=0)
+    pass_count = models.IntegerField(default=0)
+    avg_marks = models.DecimalField(max_digits=6, decimal_places=2, null=True)
+    best_marks = models.DecimalField(max_digits=5, decimal_places=2, null=True)
+    worst_marks = models.DecimalField(max_digits=5, decimal_places=2, null=True)
+
+    class Meta:
+        unique_together = (('student', 'paper'),)
+        indexes = [models.Index(fields=['student', '-avg_marks'], name='paper_summary_student_avg')]
+
+    def __str__(self): return f"{self.student_id}/{self.paper_id}: avg {self.avg_marks}"
+
+
+class MarkRank(models.Model):
+    """Rank of one mark within its (batch, paper, exam_type) partition; maintained by student.ranks."""
+    mark = models.OneToOneField(StudentMark, on_delete=models.CASCADE, primary_key=True, related_name='rank')
+    batch = models.ForeignKey(Batch, on_delete=models.CASCADE, related_name='+')
+    paper = models.ForeignKey(Paper, on_delete=models.CASCADE, related_name='+')
+    exam_type = models.CharField(max_length=32)
+    dense_rank = models.IntegerField()
+    percentile = models.DecimalField(max_digits=5, decimal_places=2)  # share of the partition at or below this mark
+    # rows are replaced on every recompute, so this is when the rank was last (re)computed
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [models.Index(fields=['batch', 'paper', 'exam_type', 'dense_rank'], name='mark_rank_partition')]
+
+    def __str__(self): return f"mark {self.mark_id}: #{self.dense_rank}"
+
+
+class BatchRank(models.Model):
+    """Overall rank of a student in a batch by average marks; maintained by student.ranks."""
+    batch = models.ForeignKey(Batch, on_delete=models.CASCADE, related_name='+')
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='batch_ranks')
+    avg_marks = models.DecimalField(max_digits=6, decimal_places=2)
+    dense_rank = models.IntegerField()
+    percentile = models.DecimalField(max_digits=5, decimal_places=2)
+
+    class Meta:
+        unique_together = (('batch', 'student'),)
+        indexes = [models.Index(fields=['batch', 'dense_rank'], name='batch_rank_order')]
+
+    def __str__(self): return f"{self.student_id} in {self.batch_id}: #{self.dense_rank}"
+
+
+class ExportJob(models.Model):
+    """An export or report card ZIP built in the background by student.jobs; the file lives under TMS_EXPORT_DIR."""
+    QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+    STATUS_CHOICES = (
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    )
+    kind = models.CharField(max_length=20)         # key of student.exports.EXPORTS, or student.jobs.REPORT_CARDS
+    params = models.JSONField(default=dict, blank=True)
+    params_hash = models.CharField(max_length=64)  # identical requests share one job
+    data_etag = models.CharField(max_length=80, blank=True)  # validators of the data when queued
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    rows_total = models.IntegerField(null=True, blank=True)
+    rows_done = models.IntegerField(default=0)
+    # build time and throughput of a finished job (cards per second for report cards)
+    seconds = models.FloatField(null=True, blank=True)
+    rows_per_sec = models.FloatField(null=True, blank=True)
+    filename = models.CharField(max_length=200, blank=True)
+    file_path = models.CharField(max_length=500, blank=True)
+    error = models.TextField(blank=True)
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='export_jobs')
+    # everyone whose request was answered by this job (coalesced requests included)
+    requesters = models.ManyToManyField(User, blank=True, related_name='requested_exports')
+    created_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # coalescing: an unfinished or still-current job with the same parameters
+            models.Index(fields=['params_hash', 'status'], name='exportjob_hash_status'),
+            models.Index(fields=['requested_by', '-created_at'], name='exportjob_user_created'),
+        ]
+        constraints = [
+            # at most one unfinished job per parameter set: concurrent identical requests coalesce
+            models.UniqueConstraint(fields=['params_hash'], condition=models.Q(status__in=['queued', 'running']),
+                                    name='exportjob_one_active'),
+        ]
+
+    def __str__(self): return f"export #{self.pk} {self.kind} ({self.status})"
+
+    @property
+    def progress(self):
+        if self.status == self.DONE:
+            return 100
+        if not self.rows_total:
+            return 0
+        return min(99, int(self.rows_done * 100 / self.rows_total))
+
+
+# ---- report snapshots (student.snapshots, manage.py build_report_snapshots) ----
+
+class ReportRun(models.Model):
+    """One build_report_snapshots run; marks changed after started_at belong to the next run."""
+    started_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    full = models.BooleanField(default=False)
+    partitions = models.IntegerField(default=0)
+
+    def __str__(self): return f"report run {self.pk} @ {self.started_at:%Y-%m-%d %H:%M}"
+
+
+class ReportSnapshot(models.Model):
+    """Statistics of one (batch, paper, exam_type) partition as of a run; older rows are kept as history."""
+    run = models.ForeignKey(ReportRun, on_delete=models.CASCADE, related_name='snapshots')
+    batch = models.ForeignKey(Batch, on_delete=models.CASCADE, related_name='+')
+    paper = models.ForeignKey(Paper, on_delete=models.CASCADE, related_name='+')
+    exam_type = models.CharField(max_length=32)
+    taken_at = models.DateTimeField()
+    is_current = models.BooleanField(default=True)
+    paper_max_marks = models.IntegerField()
+    mark_count = models.IntegerField()
+    pass_count = models.IntegerField()
+    pass_rate = models.DecimalField(max_digits=5, decimal_places=2)  # percent
+    avg_marks = models.DecimalField(max_digits=6, decimal_places=2)
+    median_marks = models.DecimalField(max_digits=6, decimal_places=2)
+    stddev_marks = models.DecimalField(max_digits=6, decimal_places=2)
+    min_marks = models.DecimalField(max_digits=5, decimal_places=2)
+    max_marks = models.DecimalField(max_digits=5, decimal_places=2)
+    top_students = models.JSONField(default=list)     # [{"regno", "name", "marks"}, ...] best first
+    bottom_students = models.JSONField(default=list)  # worst first
+
+    class Meta:
+        indexes = [
+            # current report: every partition's latest row
+            models.Index(fields=['batch', 'paper', 'exam_type'], condition=Q(is_current=True),
+                         name='snapshot_current'),
+            # trend report: one partition's history
+            models.Index(fields=['batch', 'paper', 'exam_type', 'taken_at'], name='snapshot_history'),
+        ]
+
+    def __str__(self): return f"{self.batch_id}/{self.paper_id}/{self.exam_type} @ {self.taken_at:%Y-%m-%d}"
+
+
+class ReportDirtyPartition(models.Model):
+    """A (batch, paper, exam_type) whose marks changed since the last snapshot run (fed by marks_changed)."""
+    batch_id = models.BigIntegerField()
+    paper_id = models.BigIntegerField()
+    exam_type = models.CharField(max_length=32)
+    marked_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = (('batch_id', 'paper_id', 'exam_type'),)
+
+
+# ---- grading (student.grading, manage.py compute_grades) ----
+
+class GradingScheme(models.Model):
+    """Grade boundaries and exam weights; a batch uses its own scheme or the default one."""
+    name = models.CharField(max_length=64, unique=True)
+    is_default = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['is_default'], condition=Q(is_default=True),
+                                    name='gradingscheme_one_default'),
+        ]
+
+    def __str__(self): return self.name
+
+
+class GradeBoundary(models.Model):
+    """Letter grade (and grade point) for a weighted percentage of min_percentage or more."""
+    scheme = models.ForeignKey(GradingScheme, on_delete=models.CASCADE, related_name='boundaries')
+    letter = models.CharField(max_length=4)
+    min_percentage = models.DecimalField(max_digits=5, decimal_places=2)
+    grade_point = models.DecimalField(max_digits=4, decimal_places=2)
+
+    class Meta:
+        unique_together = (('scheme', 'letter'), ('scheme', 'min_percentage'))
+        ordering = ['scheme', '-min_percentage']
+
+    def __str__(self): return f"{self.letter} >= {self.min_percentage}%"
+
+
+class ExamWeight(models.Model):
+    """Relative weight of an exam type in a paper's weighted percentage (a scheme without weights counts every exam equally)."""
+    scheme = models.ForeignKey(GradingScheme, on_delete=models.CASCADE, related_name='weights')
+    exam_type = models.CharField(max_length=32)
+    weight = models.DecimalField(max_digits=5, decimal_places=2)
+
+    class Meta:
+        unique_together = (('scheme', 'exam_type'),)
+
+    def __str__(self): return f"{self.exam_type}: {self.weight}"
+
+
+class PaperGrade(models.Model):
+    """A student's weighted percentage and letter grade in one paper of a batch; maintained by student.grading."""
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='paper_grades')
+    batch = models.ForeignKey(Batch, on_delete=models.CASCADE, related_name='+')
+    paper = models.ForeignKey(Paper, on_delete=models.CASCADE, related_name='+')
+    weighted_percentage = models.DecimalField(max_digits=6, decimal_places=2)
+    letter = models.CharField(max_length=4)
+    grade_point = models.DecimalField(max_digits=4, decimal_places=2)
+    credits = models.DecimalField(max_digits=4, decimal_places=1)
+    # rows are replaced on every recompute
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = (('batch', 'student', 'paper'),)
+
+    def __str__(self): return f"{self.student_id}/{self.paper_id}: {self.letter}"
+
+
+class StudentGPA(models.Model):
+    """Credit-weighted grade point average of a student over a batch's papers; maintained by student.grading."""
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='gpas')
+    batch = models.ForeignKey(Batch, on_delete=models.CASCADE, related_name='+')
+    gpa = models.DecimalField(max_digits=4, decimal_places=2)
+    credits_attempted = models.DecimalField(max_digits=6, decimal_places=1)
+    credits_earned = models.DecimalField(max_digits=6, decimal_places=1)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = (('batch', 'student'),)
+        indexes = [
+            # API / export pages: ORDER BY updated_at DESC, id DESC
+            models.Index(fields=['-updated_at', '-id'], name='gpa_updated_id'),
+            # batch toppers
+            models.Index(fields=['batch', '-gpa'], name='gpa_batch_order'),
+        ]
+
+    def __str__(self): return f"{self.student_id} in {self.batch_id}: {self.gpa}"
@@ -0,0 +1,127 @@
+"""
+Keyset (cursor) pagination on (created_at, id), newest first.
+
+Each page is fetched with `WHERE (created_at, id) < (last seen) ORDER BY created_at DESC, id DESC LIMIT n+1`,
+so there is no COUNT(*) and no OFFSET: page 5000 costs the same as page 1.
+Used by the marks list pages and by the DRF viewsets (KeysetPagination).
+"""
+import base64
+import json
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+CURSOR_PARAM = "cursor"
+
+
+def encode_cursor(direction, value, pk):
+    raw = json.dumps([direction, value.isoformat(), pk]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    """Return (direction, datetime, pk), or None for a missing/garbled cursor (= first page)."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        direction, value, pk = json.loads(raw)
+        if direction not in ("next", "prev"):
+            return None
+        return direction, datetime.fromisoformat(value), int(pk)
+    except (ValueError, TypeError):
+        return None
+
+
+class KeysetPage:
+    """Quacks enough like django.core.paginator.Page for the list templates."""
+
+    def __init__(self, object_list, has_next, has_previous, field):
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self._field = field
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def _cursor(self, direction, obj):
+        return encode_cursor(direction, getattr(obj, self._field), obj.pk)
+
+    @property
+    def next_cursor(self):
+        return self._cursor("next", self.object_list[-1]) if self.has_next and self.object_list else None
+
+    @property
+    def previous_cursor(self):
+        return self._cursor("prev", self.object_list[0]) if self.has_previous and self.object_list else None
+
+
+def keyset_page(queryset, token, per_page, field="created_at"):
+    """Slice `queryset` into one keyset page ordered by (-field, -id)."""
+    cursor = decode_cursor(token)
+    if cursor is None:
+        rows = list(queryset.order_by(f"-{field}", "-id")[:per_page + 1])
+        return KeysetPage(rows[:per_page], len(rows) > per_page, False, field)
+
+    direction, value, pk = cursor
+    if direction == "next":
+        after = Q(**{f"{field}__lt": value}) | Q(**{field: value, "id__lt": pk})
+        rows = list(queryset.filter(after).order_by(f"-{field}", "-id")[:per_page + 1])
+        return KeysetPage(rows[:per_page], len(rows) > per_page, True, field)
+
+    # walking backwards: read ascending from the cursor, then flip
+    before = Q(**{f"{field}__gt": value}) | Q(**{field: value, "id__gt": pk})
+    rows = list(queryset.filter(before).order_by(field, "id")[:per_page + 1])
+    page_rows = rows[:per_page]
+    page_rows.reverse()
+    return KeysetPage(page_rows, True, len(rows) > per_page, field)
+
+
+class KeysetPagination(BasePagination):
+    """DRF pagination over (created_at, id) with a bounded ?page_size=."""
+    page_size = 50
+    max_page_size = 200
+    page_size_query_param = "page_size"
+    field = "created_at"
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            size = self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page = keyset_page(queryset, request.query_params.get(CURSOR_PARAM),
+                                self.get_page_size(request), field=self.field)
+        return self.page.object_list
+
+    def _link(self, cursor):
+        if cursor is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), CURSOR_PARAM, cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self._link(self.page.next_cursor),
+            "previous": self._link(self.page.previous_cursor),
+            "results": data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
@@ -0,0 +1,109 @@
+"""
+Class ranks computed with window functions.
+
+  MarkRank  - DENSE_RANK / CUME_DIST of each mark inside (batch, paper, exam_type)
+  BatchRank - the same over each student's average marks inside a batch
+
+Only partitions touched by a change are recomputed, after the change commits
+(see student.signals). The Batch rows of a chunk are locked (in pk order)
+while its rank rows are replaced, so two refreshes of one batch queue up
+instead of both inserting the same MarkRank / BatchRank rows.
+"""
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+
+from django.db import connection, transaction
+from django.db.models import Avg, DateTimeField, DecimalField, F, FloatField, Q, Value, Window
+from django.db.models.functions import Cast, CumeDist, DenseRank
+from django.utils import timezone
+
+from . import cache
+from .models import Batch, BatchRank, MarkRank, StudentMark
+
+# partitions / batches recomputed per statement
+RANK_CHUNK_SIZE = 200
+
+
+def _pct(value):
+    return Decimal(str(value * 100)).quantize(Decimal("0.01"))
+
+
+def _avg(value):
+    return Decimal(str(value)).quantize(Decimal("0.01"))
+
+
+def _insert_select(model, fields, queryset):
+    """INSERT INTO model (fields) SELECT ...: the rows never pass through Python."""
+    sql, params = queryset.query.sql_with_params()
+    quote = connection.ops.quote_name
+    columns = ", ".join(quote(model._meta.get_field(name).column) for name in fields)
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {quote(model._meta.db_table)} ({columns}) {sql}", params)
+
+
+def _lock_batches(batch_ids):
+    list(Batch.objects.select_for_update().filter(pk__in=batch_ids).order_by("pk").values_list("pk"))
+
+
+def refresh_mark_ranks(partitions):
+    """Recompute MarkRank rows for the given (batch_id, paper_id, exam_type) partitions."""
+    partitions = sorted(set(partitions))
+    for start in range(0, len(partitions), RANK_CHUNK_SIZE):
+        chunk = partitions[start:start + RANK_CHUNK_SIZE]
+        where = reduce(or_, (Q(batch_id=b, paper_id=p, exam_type=e) for b, p, e in chunk))
+        part = [F("batch_id"), F("paper_id"), F("exam_type")]
+        # ordered as float: identical order, and avoids SQLite wrapping a decimal ORDER BY in CAST()
+        score = Cast("marks", FloatField())
+        # model columns first, then annotations: the SELECT list order _insert_select relies on
+        rows = StudentMark.objects.filter(where).order_by().annotate(
+            rnk=Window(DenseRank(), partition_by=part, order_by=score.desc()),
+            pct=Cast(Window(CumeDist(), partition_by=part, order_by=score.asc()) * Value(100.0),
+                     DecimalField(max_digits=5, decimal_places=2)),
+            stamp=Value(timezone.now(), output_field=DateTimeField()),
+        ).values_list("id", "batch_id", "paper_id", "exam_type", "rnk", "pct", "stamp")
+
+        with transaction.atomic():
+            _lock_batches({b for b, _, _ in chunk})
+            MarkRank.objects.filter(where).delete()
+            _insert_select(MarkRank, ["mark", "batch", "paper", "exam_type", "dense_rank", "percentile", "updated_at"],
+                           rows)
+
+
+def refresh_batch_ranks(batch_ids):
+    """Recompute BatchRank rows (rank by average marks) for the given batches."""
+    batch_ids = sorted({b for b in batch_ids if b is not None})
+    for start in range(0, len(batch_ids), RANK_CHUNK_SIZE):
+        chunk = batch_ids[start:start + RANK_CHUNK_SIZE]
+        rows = StudentMark.objects.filter(batch_id__in=chunk).values("batch_id", "student_id").annotate(
+            avg=Avg(Cast("marks", FloatField())),
+        ).annotate(
+            # windows over the grouped rows; they must come after the aggregate annotation
+            rnk=Window(DenseRank(), partition_by=[F("batch_id")], order_by=F("avg").desc()),
+            pct=Window(CumeDist(), partition_by=[F("batch_id")], order_by=F("avg").asc()),
+        ).order_by()
+
+        with transaction.atomic():
+            _lock_batches(chunk)
+            BatchRank.objects.filter(batch_id__in=chunk).delete()
+            BatchRank.objects.bulk_create(
+                [BatchRank(batch_id=r["batch_id"], student_id=r["student_id"], avg_marks=_avg(r["avg"]),
+                           dense_rank=r["rnk"], percentile=_pct(r["pct"])) for r in rows],
+                batch_size=1000,
+            )
+
+
+def refresh_ranks(keys):
+    """Entry point for marks_changed: keys are (student_id, paper_id, exam_type, batch_id)."""
+    refresh_mark_ranks({(b, p, e) for _, p, e, b in keys})
+    refresh_batch_ranks({b for *_, b in keys})
+
+
+def rebuild_all_ranks():
+    partitions = set(StudentMark.objects.values_list("batch_id", "paper_id", "exam_type").distinct())
+    MarkRank.objects.all().delete()
+    BatchRank.objects.all().delete()
+    refresh_mark_ranks(partitions)
+    refresh_batch_ranks({b for b, _, _ in partitions})
+    cache.bump(cache.DERIVED_REBUILT)
+    return len(partitions)
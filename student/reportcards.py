@@ -0,0 +1,174 @@
+"""
+End-of-term report cards for whole batches (or every batch of a course).
+
+The data is loaded in the web/command process, LOAD_CHUNK students at a time
+with one query per table (students, marks with their papers, batch ranks,
+GPAs, paper grades), and turned into plain dicts. Rendering the cards
+(Django template -> HTML, and HTML -> PDF with WeasyPrint) is CPU work that
+needs no database, so those dicts are fanned out to a process pool in tasks
+of CARDS_PER_TASK cards (student.cardrender); the finished files are written
+into one ZIP as the tasks come back (<course id>/<batch>/<regno>.html|.pdf;
+batch names are only unique within a course). At most two tasks per worker
+are in flight, so memory stays bounded for any batch size.
+
+Workers are started with the "spawn" method (no forked DB connections or
+threads) and set Django up themselves. TMS_REPORTCARD_WORKERS sets the pool
+size (default: one per CPU); with 1 everything renders in-process.
+WeasyPrint (PDF) is an optional dependency. The Reports page runs this as a
+background job (student.jobs); `manage.py build_report_cards` runs it directly.
+"""
+import multiprocessing
+import os
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from decimal import Decimal
+
+from django.conf import settings
+from django.utils import timezone
+
+from .cardrender import FORMATS, ReportCardError, init_worker, render_cards, weasyprint
+from .models import Batch, BatchRank, PaperGrade, Student, StudentGPA, StudentMark
+
+# students loaded per round of queries
+LOAD_CHUNK = 1000
+# cards rendered per pool task
+CARDS_PER_TASK = 100
+
+
+def worker_count():
+    return getattr(settings, "TMS_REPORTCARD_WORKERS", 0) or os.cpu_count() or 1
+
+
+# ---- loading (main process) ----
+
+def _student_chunks(batch):
+    students = list(Student.objects.filter(batch=batch, is_active=True).order_by("regno")
+                    .values_list("pk", "regno", "name"))
+    for start in range(0, len(students), LOAD_CHUNK):
+        yield students[start:start + LOAD_CHUNK]
+
+
+def _load_chunk(batch, students, exam_types):
+    """Card dicts for `students` (pk, regno, name) of `batch`."""
+    ids = [pk for pk, _, _ in students]
+    marks = {}
+    for row in StudentMark.objects.filter(batch=batch, student_id__in=ids).order_by("paper__code").values_list(
+            "student_id", "paper_id", "paper__code", "paper__name", "paper__max_marks",
+            "exam_type", "marks", "percentage", "passed"):
+        marks.setdefault(row[0], []).append(row[1:])
+    ranks = dict(BatchRank.objects.filter(batch=batch, student_id__in=ids).values_list("student_id", "dense_rank"))
+    gpas = {s: (gpa, earned, attempted) for s, gpa, earned, attempted in StudentGPA.objects.filter(
+        batch=batch, student_id__in=ids).values_list("student_id", "gpa", "credits_earned", "credits_attempted")}
+    letters = {(s, p): (letter, gp) for s, p, letter, gp in PaperGrade.objects.filter(
+        batch=batch, student_id__in=ids).values_list("student_id", "paper_id", "letter", "grade_point")}
+
+    header = {"batch": batch.name, "year": batch.year, "course": batch.course.name,
+              "course_id": batch.course.courseid}
+    cards = []
+    for pk, regno, name in students:
+        papers, total, passed = {}, Decimal(0), 0
+        rows = marks.get(pk, [])
+        for paper_id, code, paper_name, max_marks, exam_type, value, percentage, ok in rows:
+            paper = papers.setdefault(paper_id, {
+                "code": code, "name": paper_name, "max_marks": max_marks, "marks": {}, "percentages": [],
+                "passed": True, "grade": letters.get((pk, paper_id), (None, None))[0],
+            })
+            paper["marks"][exam_type] = value
+            if percentage is not None:
+                paper["percentages"].append(percentage)
+            paper["passed"] = paper["passed"] and ok
+            total += value
+            passed += ok
+        for paper in papers.values():
+            paper["cells"] = [paper["marks"].get(e) for e in exam_types]
+            pcts = paper.pop("percentages")
+            paper["percentage"] = round(sum(pcts) / len(pcts), 2) if pcts else None
+            del paper["marks"]
+        gpa = gpas.get(pk)
+        cards.append({
+            **header,
+            "regno": regno,
+            "name": name,
+            "exam_types": exam_types,
+            "papers": list(papers.values()),
+            "tests": len(rows),
+            "average": round(total / len(rows), 2) if rows else None,
+            "pass_percent": round(passed * 100 / len(rows), 1) if rows else None,
+            "result": ("PASS" if passed == len(rows) else "FAIL") if rows else None,
+            "rank": ranks.get(pk),
+            "gpa": gpa[0] if gpa else None,
+            "credits": f"{gpa[1]} / {gpa[2]}" if gpa else None,
+        })
+    return cards
+
+
+def load_cards(batches):
+    """Yield lists of card dicts (at most LOAD_CHUNK each), batch by batch."""
+    for batch in batches:
+        exam_types = sorted(StudentMark.objects.filter(batch=batch).values_list("exam_type", flat=True).distinct())
+        for students in _student_chunks(batch):
+            yield _load_chunk(batch, students, exam_types)
+
+
+# ---- driver ----
+
+def _tasks(batches):
+    for cards in load_cards(batches):
+        for start in range(0, len(cards), CARDS_PER_TASK):
+            yield cards[start:start + CARDS_PER_TASK]
+
+
+def card_count(batches):
+    """Number of cards build_report_cards will write for `batches` (ids)."""
+    return Student.objects.filter(batch_id__in=batches, is_active=True).count()
+
+
+def build_report_cards(batches, fileobj, formats=("html",), workers=None, progress=None):
+    """
+    Write the report cards of `batches` as a ZIP to `fileobj`; `progress(cards_done)`
+    is called as the cards come in. Returns {"cards", "files", "seconds", "cards_per_sec"}.
+    """
+    formats = tuple(f for f in FORMATS if f in formats)
+    if not formats:
+        raise ReportCardError("Choose at least one of: " + ", ".join(FORMATS) + ".")
+    if "pdf" in formats:
+        weasyprint()  # fail before any work is done
+    batches = list(Batch.objects.select_related("course").filter(pk__in=[getattr(b, "pk", b) for b in batches])
+                   .order_by("course__courseid", "name"))
+    workers = workers or worker_count()
+    generated_at = timezone.now()
+    started = time.perf_counter()
+    cards = files = 0
+
+    with zipfile.ZipFile(fileobj, "w", zipfile.ZIP_DEFLATED) as bundle:
+        def write(rendered, count):
+            nonlocal cards, files
+            for name, data in rendered:
+                # PDFs are compressed already
+                bundle.writestr(name, data, zipfile.ZIP_STORED if name.endswith(".pdf") else zipfile.ZIP_DEFLATED)
+                files += 1
+            cards += count
+            if progress:
+                progress(cards)
+
+        if workers == 1:
+            for task in _tasks(batches):
+                write(render_cards(task, formats, generated_at), len(task))
+        else:
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(workers, mp_context=context, initializer=init_worker,
+                                     initargs=(os.environ.get("DJANGO_SETTINGS_MODULE", ""),)) as pool:
+                pending = {}
+                for task in _tasks(batches):
+                    if len(pending) >= 2 * workers:
+                        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            write(future.result(), pending.pop(future))
+                    pending[pool.submit(render_cards, task, formats, generated_at)] = len(task)
+                for future in list(pending):
+                    write(future.result(), pending.pop(future))
+
+    seconds = time.perf_counter() - started
+    return {"cards": cards, "files": files, "seconds": round(seconds, 2),
+            "cards_per_sec": round(cards / seconds, 1) if seconds else 0.0}
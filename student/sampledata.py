@@ -0,0 +1,247 @@
+"""
+Synthetic data at scale for `manage.py seed_sample_data` and the benchmarks.
+
+Everything is drawn from one numpy Generator, so a given seed and set of sizes
+always produces the same rows. Each student has an ability, each paper a
+difficulty and each exam type a shift; a mark is the sum of those plus noise,
+clipped to the paper's range and rounded to half marks. A small share of
+students are absent from each exam (no row), so pass rates, ranks and
+distributions look like a real cohort.
+
+Students sit the papers of their course (papers are dealt round-robin to
+courses). Marks are generated per chunk of students as plain tuples, with
+their stored percentage and pass flag (student.scores), and written with
+COPY on PostgreSQL, or batched INSERTs elsewhere. The derived tables (search
+documents, summaries, ranks, grades) are then refreshed for the new rows only.
+"""
+import io
+from datetime import timedelta
+
+import numpy as np
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import cache
+from .grading import regrade_batches
+from .models import Batch, Course, Paper, Student, StudentMark
+from .ranks import refresh_batch_ranks, refresh_mark_ranks
+from .scores import pass_threshold
+from .search import refresh_mark_documents, refresh_student_documents
+from .snapshots import mark_dirty
+from .summaries import refresh_student_summaries
+
+EXAM_TYPES = ["Internal-I", "Internal-II", "External", "Supplementary", "Practical"]
+# exam type -> (mean shift, noise) as a fraction of max marks
+EXAM_SHAPE = {
+    "Internal-I": (0.03, 0.09),
+    "Internal-II": (0.05, 0.08),
+    "External": (-0.04, 0.11),
+    "Supplementary": (-0.10, 0.12),
+    "Practical": (0.10, 0.06),
+}
+# share of (student, paper, exam) rows with no mark
+ABSENT_RATE = 0.02
+# students whose marks are generated and written per round trip
+STUDENT_CHUNK = 5000
+# rows per INSERT round trip when COPY isn't available
+INSERT_BATCH = 5000
+
+FIRST_NAMES = ["Aarav", "Aditi", "Akash", "Ananya", "Arjun", "Diya", "Farhan", "Gauri", "Ishaan", "Kavya",
+               "Meera", "Nikhil", "Priya", "Rahul", "Riya", "Rohan", "Sana", "Tanvi", "Varun", "Zoya"]
+LAST_NAMES = ["Bose", "Das", "Gupta", "Iyer", "Joshi", "Khan", "Menon", "Nair", "Patel", "Rao",
+              "Reddy", "Shah", "Sharma", "Singh", "Verma"]
+SUBJECTS = ["Programming", "Data Structures", "Databases", "Networks", "Operating Systems", "Mathematics",
+            "Statistics", "Web Technologies", "Software Engineering", "Machine Learning"]
+
+
+class SampleDataError(Exception):
+    """The requested sample data cannot be generated (e.g. the prefix is already in use)."""
+
+
+def _papers_by_course(course_ids, paper_rows):
+    """course id -> [(paper_id, max_marks, index)]; with fewer papers than courses every course shares them."""
+    if len(paper_rows) < len(course_ids):
+        return {c: paper_rows for c in course_ids}
+    return {c: paper_rows[i::len(course_ids)] for i, c in enumerate(course_ids)}
+
+
+def _create_catalogue(rng, prefix, courses, batches, papers):
+    Course.objects.bulk_create([
+        Course(courseid=f"{prefix}C{i:04d}", name=f"{prefix} Course {i}") for i in range(courses)
+    ])
+    course_ids = list(Course.objects.filter(courseid__startswith=f"{prefix}C").order_by("courseid")
+                      .values_list("id", flat=True))
+
+    years = ["2022-2025", "2023-2026", "2024-2027"]
+    Batch.objects.bulk_create([
+        Batch(course_id=course_ids[i % courses], name=f"{prefix} Batch {i:04d}", year=years[i % len(years)])
+        for i in range(batches)
+    ])
+    batch_rows = list(Batch.objects.filter(name__startswith=f"{prefix} Batch").order_by("name")
+                      .values_list("id", "course_id"))
+
+    practical = rng.random(papers) < 0.25
+    Paper.objects.bulk_create([
+        Paper(code=f"{prefix}P{i:04d}", name=f"{SUBJECTS[i % len(SUBJECTS)]} {i // len(SUBJECTS) + 1}",
+              paper_type="Practical" if practical[i] else "Theory", max_marks=50 if practical[i] else 100)
+        for i in range(papers)
+    ])
+    paper_rows = [(pk, max_marks, i) for i, (pk, max_marks) in enumerate(
+        Paper.objects.filter(code__startswith=f"{prefix}P").order_by("code").values_list("id", "max_marks"))]
+    return course_ids, batch_rows, paper_rows
+
+
+def _create_students(rng, prefix, students, batch_rows, start):
+    first = rng.integers(len(FIRST_NAMES), size=students)
+    last = rng.integers(len(LAST_NAMES), size=students)
+    for lo in range(0, students, INSERT_BATCH):
+        Student.objects.bulk_create([
+            Student(regno=f"{prefix}{i:08d}", name=f"{FIRST_NAMES[first[i]]} {LAST_NAMES[last[i]]}",
+                    email=f"{prefix.lower()}{i:08d}@example.com", batch_id=batch_rows[i % len(batch_rows)][0],
+                    created_at=start + timedelta(seconds=i))
+            for i in range(lo, min(lo + INSERT_BATCH, students))
+        ])
+    return list(Student.objects.filter(regno__startswith=prefix).order_by("regno").values_list("id", "batch_id"))
+
+
+def _mark_rows(rng, chunk, ability, course_of_batch, course_papers, difficulty, exam_types, exam_dates):
+    """
+    (student_id, paper_id, exam_type, batch_id, marks, created_at, percentage, passed) tuples
+    for one chunk of students.
+    """
+    rows = []
+    by_course = {}
+    for pos, (student_id, batch_id) in chunk:
+        by_course.setdefault(course_of_batch[batch_id], []).append((pos, student_id, batch_id))
+
+    for course_id, members in by_course.items():
+        papers = course_papers[course_id]
+        if not papers:
+            continue
+        pos = np.array([m[0] for m in members])
+        max_marks = np.array([p[1] for p in papers], dtype=float)
+        cutoff = max_marks * float(pass_threshold()) / 100
+        diff = difficulty[[p[2] for p in papers]]
+        for e, exam_type in enumerate(exam_types):
+            shift, noise = EXAM_SHAPE[exam_type]
+            frac = (0.62 + 0.13 * ability[pos][:, None] - 0.07 * diff[None, :] + shift
+                    + rng.normal(0, noise, (len(members), len(papers))))
+            marks = np.round(np.clip(frac, 0, 1) * max_marks[None, :] * 2) / 2
+            present = rng.random(marks.shape) >= ABSENT_RATE
+            percentage = np.round(marks * 100 / max_marks[None, :], 2)
+            passed = marks >= cutoff[None, :]
+            for i, (p, student_id, batch_id) in enumerate(members):
+                for j, (paper_id, _, _) in enumerate(papers):
+                    if present[i, j]:
+                        rows.append((student_id, paper_id, exam_type, batch_id, marks[i, j],
+                                     exam_dates[e] + timedelta(seconds=p * len(papers) + j),
+                                     percentage[i, j], bool(passed[i, j])))
+    return rows
+
+
+_MARK_FIELDS = ["student", "paper", "exam_type", "batch", "marks", "created_at", "updated_at", "search_document",
+                "percentage", "passed"]
+
+
+def _copy_marks(rows, now):
+    """PostgreSQL: stream the rows through COPY ... FROM STDIN."""
+    quote = connection.ops.quote_name
+    table = quote(StudentMark._meta.db_table)
+    columns = ", ".join(quote(StudentMark._meta.get_field(name).column) for name in _MARK_FIELDS)
+    stamp = now.isoformat()
+    buf = io.StringIO()
+    for student_id, paper_id, exam_type, batch_id, marks, created_at, percentage, passed in rows:
+        buf.write(f"{student_id}\t{paper_id}\t{exam_type}\t{batch_id}\t{marks:.2f}\t{created_at.isoformat()}\t{stamp}\t"
+                  f"\t{percentage:.2f}\t{'t' if passed else 'f'}\n")
+    buf.seek(0)
+    sql = f"COPY {table} ({columns}) FROM STDIN"
+    with connection.cursor() as cursor:
+        raw = cursor.cursor
+        if hasattr(raw, "copy_expert"):  # psycopg2
+            raw.copy_expert(sql, buf)
+        else:  # psycopg 3
+            with raw.copy(sql) as copy:
+                copy.write(buf.getvalue())
+
+
+def _insert_marks(rows, now):
+    """Other backends: multi-row INSERTs of adapted values (no model instances per row)."""
+    quote = connection.ops.quote_name
+    table = quote(StudentMark._meta.db_table)
+    columns = ", ".join(quote(StudentMark._meta.get_field(name).column) for name in _MARK_FIELDS)
+    sql = f"INSERT INTO {table} ({columns}) VALUES ({', '.join(['%s'] * len(_MARK_FIELDS))})"
+    adapt = connection.ops.adapt_datetimefield_value
+    stamp = adapt(now)
+    with connection.cursor() as cursor:
+        for lo in range(0, len(rows), INSERT_BATCH):
+            cursor.executemany(sql, [
+                (s, p, e, b, f"{m:.2f}", adapt(c), stamp, "", f"{pct:.2f}", ok)
+                for s, p, e, b, m, c, pct, ok in rows[lo:lo + INSERT_BATCH]
+            ])
+
+
+def generate(courses=2, batches=4, papers=10, students=1000, exams=3, seed=0, prefix="SY", progress=None):
+    """
+    Insert a synthetic dataset and refresh the derived tables for it.
+    `progress(message)` is called after each phase / chunk. Returns the row counts.
+    """
+    if not 1 <= exams <= len(EXAM_TYPES):
+        raise SampleDataError(f"--exams must be between 1 and {len(EXAM_TYPES)}.")
+    if min(courses, batches, papers, students) < 1:
+        raise SampleDataError("--courses, --batches, --papers and --students must be at least 1.")
+    if Course.objects.filter(courseid__startswith=f"{prefix}C").exists() or \
+            Student.objects.filter(regno__startswith=prefix).exists():
+        raise SampleDataError(f"Sample rows with prefix '{prefix}' already exist; use another --prefix.")
+    report = progress or (lambda message: None)
+
+    rng = np.random.default_rng(seed)
+    now = timezone.now()
+    start = now - timedelta(days=365)
+    exam_types = EXAM_TYPES[:exams]
+    exam_dates = [start + timedelta(days=60 * (e + 1)) for e in range(exams)]
+    write_marks = _copy_marks if connection.vendor == "postgresql" else _insert_marks
+
+    with transaction.atomic():
+        course_ids, batch_rows, paper_rows = _create_catalogue(rng, prefix, courses, batches, papers)
+        student_rows = _create_students(rng, prefix, students, batch_rows, start)
+    report(f"{courses} courses, {batches} batches, {papers} papers, {students} students created")
+
+    course_of_batch = dict(batch_rows)
+    course_papers = _papers_by_course(course_ids, paper_rows)
+    ability = rng.normal(0, 1, students)
+    difficulty = rng.normal(0, 0.5, papers)
+
+    marks = 0
+    indexed = list(enumerate(student_rows))
+    for lo in range(0, students, STUDENT_CHUNK):
+        chunk = indexed[lo:lo + STUDENT_CHUNK]
+        rows = _mark_rows(rng, chunk, ability, course_of_batch, course_papers, difficulty, exam_types, exam_dates)
+        with transaction.atomic():
+            write_marks(rows, now)
+        marks += len(rows)
+        report(f"{marks} marks written ({min(lo + STUDENT_CHUNK, students)}/{students} students)")
+
+    # derived tables, for the new rows only
+    student_ids = [pk for pk, _ in student_rows]
+    new_students = Student.objects.filter(pk__gte=student_ids[0], pk__lte=student_ids[-1], regno__startswith=prefix)
+    refresh_student_documents(new_students)
+    for lo in range(0, students, STUDENT_CHUNK):
+        ids = student_ids[lo:lo + STUDENT_CHUNK]
+        refresh_mark_documents(StudentMark.objects.filter(student_id__gte=ids[0], student_id__lte=ids[-1],
+                                                          search_document=""))
+    report("search documents refreshed")
+    refresh_student_summaries(student_ids)
+    report("summaries refreshed")
+    batch_ids = [pk for pk, _ in batch_rows]
+    partitions = list(StudentMark.objects.filter(batch_id__in=batch_ids)
+                      .values_list("batch_id", "paper_id", "exam_type").distinct())
+    refresh_mark_ranks(partitions)
+    refresh_batch_ranks(batch_ids)
+    mark_dirty(partitions)
+    report("ranks refreshed")
+    regrade_batches(batch_ids)
+    report("grades refreshed")
+
+    cache.bump("Course", "Batch", "Paper", "Student", "StudentMark", cache.DERIVED_REBUILT)
+    return {"courses": courses, "batches": batches, "papers": papers, "students": students,
+            "exams": exams, "marks": marks}
@@ -0,0 +1,86 @@
+"""
+Stored percentage-of-max and pass/fail on every StudentMark.
+
+StudentMark.percentage (marks * 100 / Paper.max_marks, NULL when the paper
+has no positive max) and StudentMark.passed (marks reach TMS_PASS_THRESHOLD
+percent of max) are refreshed on marks_changed, before the summaries and
+snapshots that count passes, and when Paper.max_marks changes (the paper
+sends marks_changed for all of its marks; see student.signals). Updates are
+set-based: one UPDATE per paper, with the paper's max marks and pass cut-off
+as constants, so the rows never pass through Python. Only the marks behind
+the changed keys whose stored score actually differs are written, so
+updated_at moves only on a real change.
+
+After changing TMS_PASS_THRESHOLD, run `manage.py rebuild_summaries` (which
+re-scores every mark first) and `manage.py build_report_snapshots --full`.
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Case, DecimalField, FloatField, Q, Value, When
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from .models import Paper, StudentMark
+
+# students per UPDATE; a paper with more changed students is updated whole
+SCORE_CHUNK_SIZE = 500
+
+
+def pass_threshold():
+    """Pass mark as a percentage of Paper.max_marks (TMS_PASS_THRESHOLD, default 35)."""
+    return Decimal(str(getattr(settings, "TMS_PASS_THRESHOLD", 35)))
+
+
+def pass_cutoff(max_marks):
+    """Lowest passing mark for a paper, or None when the paper has no positive max."""
+    if not max_marks or max_marks <= 0:
+        return None
+    return Decimal(max_marks) * pass_threshold() / 100
+
+
+def score_values(max_marks):
+    """UPDATE values (expressions over `marks`) for every mark of a paper with this max."""
+    cutoff = pass_cutoff(max_marks)
+    if cutoff is None:
+        return {"percentage": None, "passed": False}
+    return {
+        "percentage": Cast(Cast("marks", FloatField()) * Value(100.0 / max_marks),
+                           DecimalField(max_digits=6, decimal_places=2)),
+        "passed": Case(When(marks__gte=cutoff, then=Value(True)), default=Value(False)),
+    }
+
+
+def _changed(queryset, values):
+    """The rows of `queryset` whose stored score differs from `values`, so updated_at moves only on a change."""
+    if values["percentage"] is None:
+        return queryset.exclude(percentage__isnull=True, passed=values["passed"])
+    return queryset.exclude(percentage=values["percentage"], passed=values["passed"])
+
+
+def refresh_mark_scores(keys):
+    """Re-score the marks behind (student_id, paper_id, exam_type, batch_id) keys."""
+    by_paper = {}
+    for student_id, paper_id, exam_type, batch_id in keys:
+        by_paper.setdefault(paper_id, set()).add((student_id, exam_type, batch_id))
+    max_marks = dict(Paper.objects.filter(pk__in=by_paper).values_list("pk", "max_marks"))
+    for paper_id, marks in by_paper.items():
+        values = score_values(max_marks.get(paper_id))
+        # a new score is a change of the row (API payloads, sync clients)
+        stamp = {**values, "updated_at": timezone.now()}
+        if len(marks) > SCORE_CHUNK_SIZE:
+            _changed(StudentMark.objects.filter(paper_id=paper_id), values).update(**stamp)
+            continue
+        where = Q()
+        for student_id, exam_type, batch_id in marks:
+            where |= Q(student_id=student_id, exam_type=exam_type, batch_id=batch_id)
+        _changed(StudentMark.objects.filter(where, paper_id=paper_id), values).update(**stamp)
+
+
+def rescore_all_marks():
+    """Re-score every mark (after a TMS_PASS_THRESHOLD change). Returns the number of papers."""
+    papers = list(Paper.objects.values_list("pk", "max_marks"))
+    for paper_id, max_marks in papers:
+        values = score_values(max_marks)
+        _changed(StudentMark.objects.filter(paper_id=paper_id), values).update(updated_at=timezone.now(), **values)
+    return len(papers)
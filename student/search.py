@@ -0,0 +1,112 @@
+"""
+Search over a maintained `search_document` column.
+
+StudentMark and Student each carry a lower-cased text document made from the
+fields people search by (regno, names, paper code, batch, course ...). Searching
+is then a substring match on one column of one table instead of seven OR'ed
+icontains across a four-table join. On PostgreSQL migration 0004 adds a
+pg_trgm GIN index on the column, so `LIKE '%term%'` is an index scan; other
+databases run the same query without the index.
+
+The backend is chosen with settings.TMS_SEARCH_BACKEND (dotted path); it only
+needs a `filter(queryset, query)` method.
+"""
+from django.conf import settings
+from django.db.models import F, OuterRef, Q, Subquery, TextField, Value
+from django.db.models.functions import Coalesce, Concat, Lower
+from django.utils.module_loading import import_string
+
+from .models import Batch, Paper, Student, StudentMark
+
+DEFAULT_BACKEND = "student.search.DocumentSearch"
+
+
+class DocumentSearch:
+    """Every whitespace-separated term must appear somewhere in the document."""
+
+    def terms(self, query):
+        return [t for t in (query or "").lower().split() if t]
+
+    def filter(self, queryset, query):
+        for term in self.terms(query):
+            queryset = queryset.filter(search_document__contains=term)
+        return queryset
+
+
+class IcontainsSearch:
+    """The original multi-column icontains search; no document needed (slow on big tables)."""
+    FIELDS = {
+        StudentMark: ["student__regno", "student__name", "paper__code", "paper__name",
+                      "exam_type", "batch__name", "batch__course__name"],
+        Student: ["regno", "name", "email", "batch__name", "batch__course__name"],
+    }
+
+    def filter(self, queryset, query):
+        query = (query or "").strip()
+        if not query:
+            return queryset
+        cond = Q()
+        for f in self.FIELDS[queryset.model]:
+            cond |= Q(**{f"{f}__icontains": query})
+        return queryset.filter(cond)
+
+
+_backend = None
+
+
+def search_backend():
+    global _backend
+    if _backend is None:
+        _backend = import_string(getattr(settings, "TMS_SEARCH_BACKEND", DEFAULT_BACKEND))()
+    return _backend
+
+
+def search(queryset, query):
+    """Filter a StudentMark or Student queryset by a free-text query."""
+    return search_backend().filter(queryset, query)
+
+
+# ---- document maintenance ----
+
+def _join(*parts):
+    pieces = []
+    for part in parts:
+        if pieces:
+            pieces.append(Value(" "))
+        pieces.append(Coalesce(part, Value(""), output_field=TextField()))
+    return Lower(Concat(*pieces, output_field=TextField()))
+
+
+def _col(model, ref, field):
+    return Subquery(model.objects.filter(pk=OuterRef(ref)).values(field)[:1])
+
+
+def mark_document():
+    return _join(
+        _col(Student, "student_id", "regno"),
+        _col(Student, "student_id", "name"),
+        _col(Paper, "paper_id", "code"),
+        _col(Paper, "paper_id", "name"),
+        F("exam_type"),
+        _col(Batch, "batch_id", "name"),
+        _col(Batch, "batch_id", "course__name"),
+    )
+
+
+def student_document():
+    return _join(
+        F("regno"),
+        F("name"),
+        F("email"),
+        _col(Batch, "batch_id", "name"),
+        _col(Batch, "batch_id", "course__name"),
+    )
+
+
+def refresh_mark_documents(queryset):
+    """Rebuild search_document for the given StudentMark rows with one UPDATE."""
+    return queryset.update(search_document=mark_document())
+
+
+def refresh_student_documents(queryset):
+    return queryset.update(search_document=student_document())
@@ -1,5 +1,9 @@
+from datetime import datetime
+from decimal import Decimal
+
+from django.core.exceptions import ObjectDoesNotExist
 from rest_framework import serializers
-from .models import Student, StudentMark, Paper, Batch, Course
+from .models import Student, StudentMark, Paper, Batch, Course, PaperGrade, StudentGPA
 
 class CourseSerializer(serializers.ModelSerializer):
     class Meta:
@@ -17,7 +21,7 @@ class BatchSerializer(serializers.ModelSerializer):
 class PaperSerializer(serializers.ModelSerializer):
     class Meta:
         model = Paper
-        fields = ["id", "code", "name", "paper_type", "max_marks"]
+        fields = ["id", "code", "name", "paper_type", "max_marks", "credits"]
 
 class StudentSerializer(serializers.ModelSerializer):
     batch = BatchSerializer(read_only=True)
@@ -38,11 +42,18 @@ class StudentMarkSerializer(serializers.ModelSerializer):
     batch = BatchSerializer(read_only=True)
     batch_id = serializers.PrimaryKeyRelatedField(write_only=True, source="batch", queryset=Batch.objects.all())
 
+    # maintained by student.ranks; None until the partition has been ranked
+    rank = serializers.IntegerField(source="rank.dense_rank", read_only=True, default=None)
+    percentile = serializers.DecimalField(source="rank.percentile", max_digits=5, decimal_places=2,
+                                          read_only=True, default=None)
+
     class Meta:
         model = StudentMark
         fields = ["id", "student", "student_id", "paper", "paper_id",
-                  "exam_type", "batch", "batch_id", "marks", "created_at"]
-        read_only_fields = ["created_at"]
+                  "exam_type", "batch", "batch_id", "marks", "percentage", "passed", "rank", "percentile",
+                  "created_at"]
+        # percentage / passed are maintained by student.scores
+        read_only_fields = ["created_at", "percentage", "passed"]
 
     def validate_marks(self, value):
         # ensure not negative
@@ -80,3 +91,136 @@ class StudentMarkSerializer(serializers.ModelSerializer):
             if qs.exists():
                 raise serializers.ValidationError("A marks entry for this student/paper/exam/batch already exists.")
         return attrs
+
+
+# ---- grades (read-only, maintained by student.grading) ----
+
+class PaperGradeSerializer(serializers.ModelSerializer):
+    paper_code = serializers.CharField(source="paper.code")
+    paper_name = serializers.CharField(source="paper.name")
+
+    class Meta:
+        model = PaperGrade
+        fields = ["paper_id", "paper_code", "paper_name", "credits", "weighted_percentage", "letter", "grade_point"]
+
+
+class StudentGPASerializer(serializers.ModelSerializer):
+    regno = serializers.CharField(source="student.regno")
+    student_name = serializers.CharField(source="student.name")
+    batch_name = serializers.CharField(source="batch.name")
+    papers = serializers.SerializerMethodField()
+
+    class Meta:
+        model = StudentGPA
+        fields = ["id", "student_id", "regno", "student_name", "batch_id", "batch_name",
+                  "gpa", "credits_attempted", "credits_earned", "papers", "updated_at"]
+
+    def get_papers(self, obj):
+        # student.paper_grades is prefetched (with paper) by the viewset
+        grades = [g for g in obj.student.paper_grades.all() if g.batch_id == obj.batch_id]
+        return PaperGradeSerializer(grades, many=True).data
+
+
+# ---- bulk writes (/api/marks/bulk/): field checks only, lookups happen in importers ----
+
+class BulkMarkCreateItemSerializer(serializers.Serializer):
+    student_id = serializers.IntegerField()
+    paper_id = serializers.IntegerField()
+    exam_type = serializers.CharField(max_length=32)
+    batch_id = serializers.IntegerField()
+    marks = serializers.DecimalField(max_digits=5, decimal_places=2, min_value=0)
+
+
+class BulkMarkUpdateItemSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    marks = serializers.DecimalField(max_digits=5, decimal_places=2, min_value=0)
+
+
+# ---- flat read representation (?fields= / ?expand=) ----
+
+class FlatSerializer(serializers.BaseSerializer):
+    """
+    Read-only rows with no nested serializers: every output field is one attribute
+    lookup (dotted path) on an already select_related() object.
+
+    fields - names from `flat_fields` to emit (default: all of them)
+    expand - names from `expandable` to embed using the regular nested serializer
+    """
+    flat_fields = {}
+    expandable = {}
+
+    _datetime = serializers.DateTimeField()
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        unknown = {
+            "fields": [f for f in fields or [] if f not in self.flat_fields],
+            "expand": [e for e in expand or [] if e not in self.expandable],
+        }
+        unknown = {k: [f"Unknown field '{n}'." for n in v] for k, v in unknown.items() if v}
+        if unknown:
+            raise serializers.ValidationError(unknown)
+        self.getters = [(name, self.flat_fields[name].split(".")) for name in fields or self.flat_fields]
+        self.expand = list(expand or [])
+
+    def _lookup(self, obj, path):
+        for attr in path:
+            try:
+                obj = getattr(obj, attr)
+            except ObjectDoesNotExist:
+                return None
+            if obj is None:
+                return None
+        if isinstance(obj, Decimal):
+            return str(obj)
+        if isinstance(obj, datetime):
+            return self._datetime.to_representation(obj)
+        return obj
+
+    def to_representation(self, instance):
+        row = {name: self._lookup(instance, path) for name, path in self.getters}
+        for name in self.expand:
+            related = getattr(instance, name)
+            row[name] = self.expandable[name](related, context=self.context).data if related else None
+        return row
+
+
+class StudentFlatSerializer(FlatSerializer):
+    flat_fields = {
+        "id": "id",
+        "regno": "regno",
+        "name": "name",
+        "email": "email",
+        "is_active": "is_active",
+        "batch_id": "batch_id",
+        "batch_name": "batch.name",
+        "batch_year": "batch.year",
+        "course_id": "batch.course_id",
+        "course_name": "batch.course.name",
+        "created_at": "created_at",
+    }
+    expandable = {"batch": BatchSerializer}
+
+
+class StudentMarkFlatSerializer(FlatSerializer):
+    flat_fields = {
+        "id": "id",
+        "student_id": "student_id",
+        "regno": "student.regno",
+        "student_name": "student.name",
+        "paper_id": "paper_id",
+        "paper_code": "paper.code",
+        "paper_name": "paper.name",
+        "max_marks": "paper.max_marks",
+        "exam_type": "exam_type",
+        "batch_id": "batch_id",
+        "batch_name": "batch.name",
+        "course_name": "batch.course.name",
+        "marks": "marks",
+        "percentage": "percentage",
+        "passed": "passed",
+        "rank": "rank.dense_rank",
+        "percentile": "rank.percentile",
+        "created_at": "created_at",
+    }
+    expandable = {"student": StudentSerializer, "paper": PaperSerializer, "batch": BatchSerializer}
@@ -0,0 +1,197 @@
+"""
+Change hooks for marks.
+
+Everything derived from StudentMark (summaries, ranks, search documents, ...) listens
+to `marks_changed` instead of post_save/post_delete, so the bulk paths
+(import, gradebook, API bulk writes) can announce a whole batch of changes
+with a single send.
+
+    marks_changed.send(sender=StudentMark, keys={(student_id, paper_id, exam_type, batch_id), ...})
+
+Refreshes that replace whole sets of derived rows run after the writer's
+transaction commits (transaction.on_commit, robust), so they never hold the
+writer's locks and a failed refresh never fails the mark save; the cache
+versions are bumped after them.
+"""
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import Signal, receiver
+
+from . import cache
+from .grading import refresh_grades, regrade_batches
+from .models import Batch, Course, Paper, Profile, Student, StudentMark
+from .ranks import refresh_ranks
+from .scores import refresh_mark_scores
+from .search import refresh_mark_documents, refresh_student_documents
+from .snapshots import mark_dirty
+from .summaries import refresh_student_summaries
+
+marks_changed = Signal()
+
+
+@receiver(pre_save, sender=StudentMark)
+def _mark_moving(sender, instance, raw=False, **kwargs):
+    # a mark that now points at another student/paper/batch needs a fresh search document
+    loaded = getattr(instance, "_loaded_key", None)
+    if loaded and loaded != instance.key:
+        instance.search_document = ""
+
+
+@receiver(post_save, sender=StudentMark)
+def _mark_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    keys = {instance.key}
+    loaded = getattr(instance, "_loaded_key", None)
+    if loaded:
+        keys.add(loaded)
+    instance._loaded_key = instance.key
+    marks_changed.send(sender=StudentMark, keys=keys)
+
+
+@receiver(post_delete, sender=StudentMark)
+def _mark_deleted(sender, instance, **kwargs):
+    marks_changed.send(sender=StudentMark, keys={instance.key})
+
+
+@receiver(pre_save, sender=Paper)
+def _remember_max_marks(sender, instance, raw=False, **kwargs):
+    if raw or not instance.pk:
+        return
+    old = Paper.objects.filter(pk=instance.pk).values_list("max_marks", "credits").first()
+    if old:
+        instance._old_max_marks, instance._old_credits = old
+
+
+@receiver(post_save, sender=Paper)
+def _paper_saved(sender, instance, created, raw=False, **kwargs):
+    # a new max_marks changes which marks pass, for every student who sat the paper
+    if raw or created or getattr(instance, "_old_max_marks", instance.max_marks) == instance.max_marks:
+        return
+    keys = set(StudentMark.objects.filter(paper=instance).values_list(*StudentMark.KEY_FIELDS))
+    if keys:
+        marks_changed.send(sender=StudentMark, keys=keys)
+
+
+@receiver(post_save, sender=Paper)
+def _paper_credits_changed(sender, instance, created, raw=False, **kwargs):
+    # credits weigh the paper in every GPA of the batches that sat it
+    if raw or created or getattr(instance, "_old_credits", instance.credits) == instance.credits:
+        return
+    regrade_batches(list(StudentMark.objects.filter(paper=instance).values_list("batch_id", flat=True).distinct()))
+
+
+@receiver(pre_save, sender=Batch)
+def _remember_scheme(sender, instance, raw=False, **kwargs):
+    if raw or not instance.pk:
+        return
+    instance._old_scheme_id = Batch.objects.filter(pk=instance.pk).values_list("grading_scheme_id", flat=True).first()
+
+
+@receiver(post_save, sender=Batch)
+def _batch_scheme_changed(sender, instance, created, raw=False, **kwargs):
+    if raw or created or getattr(instance, "_old_scheme_id", instance.grading_scheme_id) == instance.grading_scheme_id:
+        return
+    regrade_batches([instance.pk])
+
+
+# connected first: the grades, summaries and snapshots below read StudentMark.percentage / passed
+@receiver(marks_changed)
+def _refresh_scores(sender, keys, **kwargs):
+    refresh_mark_scores(keys)
+
+
+@receiver(marks_changed)
+def _refresh_grades(sender, keys, **kwargs):
+    transaction.on_commit(lambda: refresh_grades(keys), robust=True)
+
+
+@receiver(marks_changed)
+def _refresh_summaries(sender, keys, **kwargs):
+    # after commit: outside the writer's transaction, and a failure here never undoes the mark itself
+    transaction.on_commit(lambda: refresh_student_summaries({k[0] for k in keys}), robust=True)
+
+
+@receiver(marks_changed)
+def _refresh_ranks(sender, keys, **kwargs):
+    # whole partitions and batches are re-ranked: after commit, like the summaries
+    transaction.on_commit(lambda: refresh_ranks(keys), robust=True)
+
+
+@receiver(marks_changed)
+def _refresh_mark_documents(sender, keys, **kwargs):
+    # documents only depend on the unique key, so only rows without one need work
+    refresh_mark_documents(StudentMark.objects.filter(student_id__in={k[0] for k in keys}, search_document=""))
+
+
+@receiver(marks_changed)
+def _mark_snapshots_dirty(sender, keys, **kwargs):
+    # picked up by the next build_report_snapshots run
+    mark_dirty({(k[3], k[1], k[2]) for k in keys})
+
+
+@receiver(post_save, sender=Student)
+def _student_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    refresh_student_documents(Student.objects.filter(pk=instance.pk))
+    refresh_mark_documents(StudentMark.objects.filter(student=instance))
+
+
+@receiver(post_save, sender=Paper)
+def _paper_renamed(sender, instance, created, raw=False, **kwargs):
+    if raw or created:
+        return
+    refresh_mark_documents(StudentMark.objects.filter(paper=instance))
+
+
+@receiver(post_save, sender=Batch)
+def _batch_renamed(sender, instance, created, raw=False, **kwargs):
+    if raw or created:
+        return
+    refresh_student_documents(Student.objects.filter(batch=instance))
+    refresh_mark_documents(StudentMark.objects.filter(batch=instance))
+
+
+@receiver(post_save, sender=Course)
+def _course_renamed(sender, instance, created, raw=False, **kwargs):
+    if raw or created:
+        return
+    refresh_student_documents(Student.objects.filter(batch__course=instance))
+    refresh_mark_documents(StudentMark.objects.filter(batch__course=instance))
+
+
+# ---- cache versions (student.cache) ----
+# bumped on commit so a reader can't re-cache pre-commit data under the new version
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+@receiver(post_save, sender=Batch)
+@receiver(post_delete, sender=Batch)
+@receiver(post_save, sender=Paper)
+@receiver(post_delete, sender=Paper)
+@receiver(post_save, sender=Student)
+@receiver(post_delete, sender=Student)
+def _bump_model_version(sender, **kwargs):
+    transaction.on_commit(lambda: cache.bump(sender.__name__))
+
+
+@receiver(marks_changed)
+def _bump_mark_versions(sender, keys, **kwargs):
+    # StudentMark saves/deletes arrive here too (see _mark_saved / _mark_deleted)
+    names = {"StudentMark"}
+    names.update(f"StudentMark:student:{k[0]}" for k in keys)
+    names.update(f"StudentMark:batch:{k[3]}" for k in keys)
+    transaction.on_commit(lambda: cache.bump(*names))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def _bump_identity_version(sender, instance, **kwargs):
+    # the session's student link is re-resolved after any change to the user or their profile
+    # (a new username/email can point at another Student; see student/identity.py)
+    user_id = instance.pk if sender is User else instance.user_id
+    transaction.on_commit(lambda: cache.bump(f"Identity:user:{user_id}"))
@@ -0,0 +1,119 @@
+"""
+Report snapshots: per (batch, paper, exam_type) statistics, precomputed.
+
+marks_changed records every touched partition in ReportDirtyPartition; a run
+(`manage.py build_report_snapshots`, nightly) recomputes just those partitions
+from StudentMark, writes one new ReportSnapshot each and flips the previous
+one to history (is_current=False). Current and trend reports then read
+snapshot rows only and never touch raw marks.
+"""
+import statistics
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Paper, ReportDirtyPartition, ReportRun, ReportSnapshot, StudentMark
+
+# partitions recomputed per query
+SNAPSHOT_CHUNK_SIZE = 200
+# students listed as top / bottom performers
+PERFORMERS = 3
+
+
+def mark_dirty(partitions):
+    """
+    Remember (batch_id, paper_id, exam_type) partitions for the next run. A partition
+    that is already dirty gets a new marked_at, so a run that read the old row keeps it for the next one.
+    """
+    now = timezone.now()
+    ReportDirtyPartition.objects.bulk_create(
+        [ReportDirtyPartition(batch_id=b, paper_id=p, exam_type=e, marked_at=now) for b, p, e in partitions],
+        update_conflicts=True, unique_fields=["batch_id", "paper_id", "exam_type"], update_fields=["marked_at"],
+    )
+
+
+def _two(value):
+    return Decimal(str(value)).quantize(Decimal("0.01"))
+
+
+def _performer(row):
+    marks, regno, name, _ = row
+    return {"regno": regno, "name": name, "marks": str(marks)}
+
+
+def _stats(rows, max_marks):
+    """rows: [(marks, regno, name, passed), ...] sorted best first."""
+    values = [float(row[0]) for row in rows]
+    passed = sum(1 for row in rows if row[3])
+    return {
+        "paper_max_marks": max_marks,
+        "mark_count": len(rows),
+        "pass_count": passed,
+        "pass_rate": _two(passed * 100 / len(rows)),
+        "avg_marks": _two(statistics.fmean(values)),
+        "median_marks": _two(statistics.median(values)),
+        "stddev_marks": _two(statistics.pstdev(values)),
+        "min_marks": rows[-1][0],
+        "max_marks": rows[0][0],
+        "top_students": [_performer(r) for r in rows[:PERFORMERS]],
+        "bottom_students": [_performer(r) for r in reversed(rows[-PERFORMERS:])],
+    }
+
+
+def _build_chunk(run, chunk):
+    where = Q()
+    for b, p, e in chunk:
+        where |= Q(batch_id=b, paper_id=p, exam_type=e)
+    grouped = {}
+    rows = StudentMark.objects.filter(where).order_by("-marks", "student__regno").values_list(
+        "batch_id", "paper_id", "exam_type", "marks", "student__regno", "student__name", "passed")
+    for b, p, e, marks, regno, name, passed in rows:
+        grouped.setdefault((b, p, e), []).append((marks, regno, name, passed))
+    max_marks = dict(Paper.objects.filter(pk__in={p for _, p, _ in chunk}).values_list("pk", "max_marks"))
+
+    with transaction.atomic():
+        # partitions that lost all their marks simply have no current snapshot any more
+        ReportSnapshot.objects.filter(where, is_current=True).update(is_current=False)
+        ReportSnapshot.objects.bulk_create([
+            ReportSnapshot(run=run, batch_id=b, paper_id=p, exam_type=e, taken_at=run.started_at,
+                           **_stats(marks, max_marks.get(p)))
+            for (b, p, e), marks in grouped.items()
+        ])
+    return len(grouped)
+
+
+def build_snapshots(full=False):
+    """
+    Snapshot every partition touched since the last run (all partitions with full=True,
+    or on the first run). Returns the ReportRun.
+    """
+    full = full or not ReportRun.objects.filter(finished_at__isnull=False).exists()
+    run = ReportRun.objects.create(full=full)
+
+    # read before the marks, and later deleted only as read (same pk and marked_at): a partition
+    # marked again meanwhile, or marked by a writer that committed after this read, stays behind
+    dirty = list(ReportDirtyPartition.objects.values_list("pk", "marked_at", "batch_id", "paper_id", "exam_type"))
+    if full:
+        partitions = set(StudentMark.objects.values_list("batch_id", "paper_id", "exam_type").distinct())
+        partitions |= set(ReportSnapshot.objects.filter(is_current=True)
+                          .values_list("batch_id", "paper_id", "exam_type"))
+    else:
+        partitions = {(b, p, e) for _, _, b, p, e in dirty}
+
+    partitions = sorted(partitions)
+    built = 0
+    for start in range(0, len(partitions), SNAPSHOT_CHUNK_SIZE):
+        built += _build_chunk(run, partitions[start:start + SNAPSHOT_CHUNK_SIZE])
+
+    for start in range(0, len(dirty), SNAPSHOT_CHUNK_SIZE):
+        read = Q()
+        for pk, marked_at, *_ in dirty[start:start + SNAPSHOT_CHUNK_SIZE]:
+            read |= Q(pk=pk, marked_at=marked_at)
+        ReportDirtyPartition.objects.filter(read).delete()
+
+    run.partitions = built
+    run.finished_at = timezone.now()
+    run.save(update_fields=["partitions", "finished_at"])
+    return run
@@ -0,0 +1,71 @@
+// Lazy <select> pickers (student/autocomplete.py): the page renders only the chosen option;
+// a search box above each select[data-autocomplete] fetches matching options page by page.
+(function () {
+  'use strict';
+
+  function setup(select) {
+    var url = select.getAttribute('data-autocomplete');
+    var search = document.createElement('input');
+    search.type = 'search';
+    search.className = 'form-control form-control-sm mb-1';
+    search.placeholder = 'Type to search…';
+    search.autocomplete = 'off';
+    select.parentNode.insertBefore(search, select);
+
+    var next = null, seq = 0, timer = null, loaded = false, previous = select.value;
+
+    function clear(keepValue) {
+      Array.prototype.slice.call(select.options).forEach(function (opt) {
+        if (opt.value !== '' && opt.value === keepValue) return;
+        if (opt.value === '' && !opt.hasAttribute('data-more')) return;  // the empty label
+        opt.remove();
+      });
+    }
+
+    function load(append) {
+      var params = new URLSearchParams({ q: search.value });
+      if (append && next) params.set('cursor', next);
+      var mine = ++seq;
+      fetch(url + '?' + params.toString(), { credentials: 'same-origin', headers: { 'Accept': 'application/json' } })
+        .then(function (r) { return r.ok ? r.json() : Promise.reject(r.status); })
+        .then(function (data) {
+          if (mine !== seq) return;  // a newer search is on its way
+          loaded = true;
+          var more = select.querySelector('option[data-more]');
+          if (more) more.remove();
+          if (!append) clear(select.value);
+          data.results.forEach(function (item) {
+            var value = String(item.id);
+            if (select.querySelector('option[value="' + value + '"]')) return;
+            select.add(new Option(item.text, value));
+          });
+          next = data.next;
+          if (next) {
+            var opt = new Option('More…', '');
+            opt.setAttribute('data-more', '');
+            select.add(opt);
+          }
+        })
+        .catch(function (err) { console.warn('autocomplete', url, err); });
+    }
+
+    search.addEventListener('input', function () {
+      clearTimeout(timer);
+      timer = setTimeout(function () { load(false); }, 200);
+    });
+    select.addEventListener('focus', function () { if (!loaded) load(false); });
+    select.addEventListener('change', function () {
+      var opt = select.options[select.selectedIndex];
+      if (opt && opt.hasAttribute('data-more')) {
+        select.value = previous;
+        load(true);
+        return;
+      }
+      previous = select.value;
+    });
+  }
+
+  document.addEventListener('DOMContentLoaded', function () {
+    document.querySelectorAll('select[data-autocomplete]').forEach(setup);
+  });
+})();
@@ -0,0 +1,79 @@
+"""
+Per-student performance summaries (StudentSummary / StudentPaperSummary).
+
+Only the students whose marks changed are recomputed: their marks are
+aggregated with one GROUP BY per table and the summary rows replaced.
+Called after commit for marks_changed (see student.signals) and from the
+rebuild_summaries command. The Student rows are locked (in pk order) while
+their summaries are replaced, so two refreshes of one student queue up
+instead of both inserting its rows.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Avg, Count, Max, Min, Q
+
+from . import cache
+from .models import Student, StudentMark, StudentPaperSummary, StudentSummary
+from .scores import rescore_all_marks
+
+# students refreshed per round trip (keeps IN (...) lists small on every backend)
+SUMMARY_CHUNK_SIZE = 500
+
+
+def _stats():
+    return {
+        "avg": Avg("marks"),
+        "total": Count("id"),
+        "passed": Count("id", filter=Q(passed=True)),  # stored by student.scores
+        "best": Max("marks"),
+        "worst": Min("marks"),
+    }
+
+
+def _round(value):
+    return None if value is None else Decimal(str(value)).quantize(Decimal("0.01"))
+
+
+def _fields(row):
+    return {
+        "mark_count": row["total"],
+        "pass_count": row["passed"],
+        "avg_marks": _round(row["avg"]),
+        "best_marks": _round(row["best"]),
+        "worst_marks": _round(row["worst"]),
+    }
+
+
+def refresh_student_summaries(student_ids):
+    """Recompute summary rows for the given students (students without marks lose their rows)."""
+    student_ids = sorted({sid for sid in student_ids if sid is not None})
+    for start in range(0, len(student_ids), SUMMARY_CHUNK_SIZE):
+        chunk = student_ids[start:start + SUMMARY_CHUNK_SIZE]
+        marks = StudentMark.objects.filter(student_id__in=chunk)
+        per_student = marks.values("student_id").annotate(**_stats()).order_by()
+        per_paper = marks.values("student_id", "paper_id").annotate(**_stats()).order_by()
+
+        with transaction.atomic():
+            list(Student.objects.select_for_update().filter(pk__in=chunk).order_by("pk").values_list("pk"))
+            StudentSummary.objects.filter(student_id__in=chunk).delete()
+            StudentPaperSummary.objects.filter(student_id__in=chunk).delete()
+            StudentSummary.objects.bulk_create(
+                [StudentSummary(student_id=row["student_id"], **_fields(row)) for row in per_student]
+            )
+            StudentPaperSummary.objects.bulk_create(
+                [StudentPaperSummary(student_id=row["student_id"], paper_id=row["paper_id"], **_fields(row))
+                 for row in per_paper],
+                batch_size=1000,
+            )
+
+
+def rebuild_all_summaries():
+    """Re-score every mark, then drop and recompute every summary row. Returns the number of students processed."""
+    rescore_all_marks()
+    StudentSummary.objects.all().delete()
+    StudentPaperSummary.objects.all().delete()
+    ids = list(Student.objects.filter(marks__isnull=False).distinct().values_list("id", flat=True))
+    refresh_student_summaries(ids)
+    cache.bump(cache.DERIVED_REBUILT)
+    return len(ids)
@@ -1,3 +1,1201 @@
-from django.test import TestCase
+import csv
+import io
+import re
+import tempfile
+import time
+import zipfile
+from collections import Counter
+from datetime import timedelta
+from decimal import Decimal
+from importlib.util import find_spec
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import cache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.http import parse_http_date
+
+from . import api_urls, snapshots, urls
+from .api_views import StudentMarkViewSet
+from .autocomplete import lookup
+from .benchmarks import run_benchmarks
+from .cache import bump, cached, versions
+from .columnar import write_export
+from .grading import regrade_batches
+from .identity import SESSION_KEY
+from .exports import build_export
+from .importers import ImportFileError, import_marks_file
+from .jobs import enqueue_export, run_export_job
+from .models import (Batch, BatchRank, Course, ExamWeight, ExportJob, GradingScheme, MarkRank, Paper, PaperGrade,
+                     Profile, ReportDirtyPartition, ReportSnapshot, Student, StudentGPA, StudentMark,
+                     StudentPaperSummary, StudentSummary)
+from .pagination import decode_cursor, keyset_page
+from .reportcards import ReportCardError, build_report_cards
+from .sampledata import generate
+from .scores import rescore_all_marks
+from .search import IcontainsSearch, search
+from .serializers import StudentMarkFlatSerializer
+from .snapshots import build_snapshots
+
+
+class BenchmarkSuiteTests(TestCase):
+    def test_every_case_runs_and_reports(self):
+        report = run_benchmarks(students=6, papers=2, batches=2, exams=2, repeat=1)
+        self.assertEqual(report["meta"]["dataset"]["marks"], StudentMark.objects.count())
+        self.assertTrue(report["results"])
+        for result in report["results"]:
+            self.assertEqual(result["status"], 200, result["name"])
+            self.assertGreater(result["bytes"], 0, result["name"])
+            self.assertGreater(result["queries"], 0, result["name"])
+            self.assertGreaterEqual(result["peak_kib"], 0, result["name"])
+
+    def test_only_limits_the_cases(self):
+        report = run_benchmarks(students=2, papers=1, batches=1, exams=1, repeat=1, only=["api_marks"])
+        self.assertEqual([r["name"] for r in report["results"]], ["api_marks"])
+
+
+def _school():
+    """One course, batch, paper (max 100) and student G001, built by hand."""
+    course = Course.objects.create(name="MCA", courseid="MCA01")
+    batch = Batch.objects.create(course=course, name="2024-A", year="2024-2025")
+    student = Student.objects.create(batch=batch, regno="G001", name="Grace")
+    paper = Paper.objects.create(code="P-1", name="Core", max_marks=100)
+    return course, batch, student, paper
+
+
+def _staff_client(username="staff"):
+    user = User.objects.create_user(username, password="x")
+    Profile.objects.filter(user=user).update(role="staff")
+    client = Client()
+    client.login(username=username, password="x")
+    return client
+
+
+def _csv_rows(response):
+    """Rows of a streamed CSV response."""
+    body = b"".join(response.streaming_content).decode()
+    return list(csv.reader(io.StringIO(body)))
+
+
+class CsvExportTests(TestCase):
+    def setUp(self):
+        generate(seed=1, **SMALL)
+        self.client = _staff_client()
+
+    def test_every_export_streams_all_rows(self):
+        for name, model in (("export_courses_csv", Course), ("export_batches_csv", Batch),
+                            ("export_papers_csv", Paper), ("export_students_csv", Student),
+                            ("export_marks_csv", StudentMark)):
+            response = self.client.get(reverse(name))
+            self.assertTrue(response.streaming, name)
+            self.assertIn("attachment", response["Content-Disposition"], name)
+            self.assertEqual(len(_csv_rows(response)) - 1, model.objects.count(), name)
+
+    def test_marks_for_one_regno(self):
+        student = Student.objects.order_by("regno").first()
+        rows = _csv_rows(self.client.get(reverse("export_marks_csv"), {"regno": student.regno.lower()}))
+        self.assertEqual(rows[0][:2], ["RegNo", "Student Name"])
+        self.assertEqual({row[0] for row in rows[1:]}, {student.regno})
+        self.assertEqual(len(rows) - 1, student.marks.count())
+
+    def test_requires_login(self):
+        response = Client().get(reverse("export_marks_csv"))
+        self.assertEqual(response.status_code, 302)
+
+
+class ImportTests(TestCase):
+    def setUp(self):
+        _, self.batch, self.student, self.paper = _school()
+
+    def _import(self, text, dry_run=False):
+        return import_marks_file(io.StringIO(text), "marks.csv", dry_run=dry_run)
+
+    def test_rows_are_upserted_and_bad_rows_reported(self):
+        result = self._import(
+            "regno,paper_code,exam_type,batch,marks\n"
+            "g001,p-1,External,2024-A,55\n"
+            "G001,P-1,Internal,2024-A,NaN\n"
+            "G001,P-1,Internal,2024-A,-1\n"
+            "G001,P-1,Internal,2024-A,101\n"
+            "G999,P-1,Internal,2024-A,10\n"
+            "G001,P-1,External,2024-A,60\n")
+        self.assertEqual((result.total, result.created, result.updated), (6, 1, 0))
+        self.assertEqual([line for line, _ in result.errors], [3, 4, 5, 6, 7])
+        self.assertIn("not a number", dict(result.errors)[3])
+        self.assertEqual(StudentMark.objects.get().marks, Decimal("55.00"))
+
+        result = self._import("regno,paper_code,exam_type,batch,marks\nG001,P-1,External,2024-A,70\n")
+        self.assertEqual((result.created, result.updated), (0, 1))
+        self.assertEqual(StudentMark.objects.get().marks, Decimal("70.00"))
+
+    def test_batch_names_ignore_case(self):
+        result = self._import("regno,paper_code,exam_type,batch,marks\ng001,p-1,External,2024-a,55\n"
+                              "G001,P-1,Internal,2024-B,40\n")
+        self.assertEqual(result.created, 1)
+        self.assertEqual(result.errors, [(3, "Unknown batch. ('2024-B')")])
+        self.assertEqual(StudentMark.objects.get().batch, self.batch)
+
+    def test_dry_run_writes_nothing(self):
+        result = self._import("regno,paper_code,exam_type,batch,marks\nG001,P-1,External,2024-A,55\n", dry_run=True)
+        self.assertEqual(result.created, 1)
+        self.assertFalse(StudentMark.objects.exists())
+
+    def test_missing_columns(self):
+        with self.assertRaises(ImportFileError):
+            self._import("regno,marks\nG001,5\n")
+
+    def test_upload_with_nan_is_a_row_error(self):
+        upload = SimpleUploadedFile("marks.csv", b"regno,paper_code,exam_type,batch,marks\nG001,P-1,External,2024-A,nan\n")
+        response = _staff_client().post(reverse("importstudentmarks"), {"file": upload})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "is not a number")
+
+
+class GradebookTests(TestCase):
+    def setUp(self):
+        _, self.batch, self.student, self.paper = _school()
+        self.other = Student.objects.create(batch=self.batch, regno="G002", name="Hal")
+        self.client = _staff_client()
+        self.url = reverse("gradebook") + f"?batch={self.batch.pk}&paper={self.paper.pk}&exam_type=External"
+
+    def test_grid_saves_every_cell(self):
+        response = self.client.post(self.url, {f"marks_{self.student.pk}": "40", f"marks_{self.other.pk}": "72.5"})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(dict(StudentMark.objects.values_list("student__regno", "marks")),
+                         {"G001": Decimal("40.00"), "G002": Decimal("72.50")})
+
+    def test_bad_cells_save_nothing(self):
+        for bad in ("NaN", "Infinity", "abc", "-1", "101"):
+            response = self.client.post(self.url, {f"marks_{self.student.pk}": bad, f"marks_{self.other.pk}": "50"})
+            self.assertEqual(response.status_code, 200, bad)
+            self.assertContains(response, "need fixing")
+        self.assertFalse(StudentMark.objects.exists())
+
+
+class SummaryTests(TestCase):
+    def setUp(self):
+        _, self.batch, self.student, self.paper = _school()
+
+    def _mark(self, exam_type, marks):
+        with self.captureOnCommitCallbacks(execute=True):
+            return StudentMark.objects.create(student=self.student, paper=self.paper, batch=self.batch,
+                                              exam_type=exam_type, marks=marks)
+
+    def test_refreshed_on_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            StudentMark.objects.create(student=self.student, paper=self.paper, batch=self.batch,
+                                       exam_type="External", marks=80)
+        self.assertFalse(StudentSummary.objects.exists())  # nothing until the commit
+        for callback in callbacks:
+            callback()
+        self.assertEqual(StudentSummary.objects.get().mark_count, 1)
+
+    def test_totals_follow_marks(self):
+        self._mark("External", 80)
+        low = self._mark("Internal", 20)
+        summary = StudentSummary.objects.get(student=self.student)
+        self.assertEqual((summary.mark_count, summary.pass_count, summary.avg_marks, summary.worst_marks),
+                         (2, 1, Decimal("50.00"), Decimal("20.00")))
+        self.assertEqual(StudentPaperSummary.objects.get(student=self.student).mark_count, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            low.delete()
+        self.assertEqual(StudentSummary.objects.get(student=self.student).pass_percent, 100)
+        with self.captureOnCommitCallbacks(execute=True):
+            StudentMark.objects.all().delete()
+        self.assertFalse(StudentSummary.objects.exists())
+        self.assertFalse(StudentPaperSummary.objects.exists())
+
+
+class DistributionTests(TestCase):
+    def setUp(self):
+        _, self.batch, student, self.paper = _school()
+        for i, marks in enumerate([10, 40, 60, 90]):
+            other = Student.objects.create(batch=self.batch, regno=f"D{i}", name=f"D{i}")
+            StudentMark.objects.create(student=other, paper=self.paper, batch=self.batch, exam_type="External",
+                                       marks=marks)
+        StudentMark.objects.create(student=student, paper=self.paper, batch=self.batch, exam_type="Internal", marks=5)
+        self.client = _staff_client()
+        self.url = reverse("api-distribution")
+
+    def test_statistics_and_histogram(self):
+        data = self.client.get(self.url, {"batch": self.batch.pk, "paper": self.paper.pk,
+                                          "exam_type": "External", "bins": 4}).json()
+        self.assertEqual((data["count"], data["mean"], data["median"], data["min"], data["max"]),
+                         (4, 50.0, 50.0, 10.0, 90.0))
+        self.assertEqual(data["pass_rate"], 75.0)  # 35% of 100
+        self.assertEqual([b["count"] for b in data["histogram"]], [1, 1, 1, 1])
+        self.assertEqual(self.client.get(self.url, {"batch": self.batch.pk, "paper": self.paper.pk}).json()["count"], 5)
+
+    def test_bad_parameters(self):
+        self.assertEqual(self.client.get(self.url, {"batch": "x", "paper": self.paper.pk}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {"batch": self.batch.pk, "paper": self.paper.pk,
+                                                    "bins": 0}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {"batch": 999, "paper": self.paper.pk}).status_code, 404)
+        self.assertEqual(Client().get(self.url, {"batch": self.batch.pk, "paper": self.paper.pk}).status_code, 403)
+
+
+class PaginationTests(TestCase):
+    def setUp(self):
+        _, self.batch, _, self.paper = _school()
+        for i in range(7):
+            self._mark(i)
+        # a tie on created_at: the id breaks it
+        first = StudentMark.objects.order_by("id").first().created_at
+        StudentMark.objects.filter(id__in=StudentMark.objects.order_by("id").values("id")[:3]).update(created_at=first)
+        self.expected = list(StudentMark.objects.order_by("-created_at", "-id").values_list("id", flat=True))
+
+    def _mark(self, i):
+        student = Student.objects.create(batch=self.batch, regno=f"K{i}", name=f"K{i}")
+        StudentMark.objects.create(student=student, paper=self.paper, batch=self.batch, exam_type="External", marks=50)
+
+    def test_walks_forward_and_back(self):
+        qs = StudentMark.objects.all()
+        seen, pages, token = [], [], None
+        while True:
+            page = keyset_page(qs, token, 3)
+            pages.append(page)
+            seen += [m.id for m in page]
+            if not page.has_next:
+                break
+            token = page.next_cursor
+        self.assertEqual(seen, self.expected)
+        self.assertEqual([len(p) for p in pages], [3, 3, 1])
+        self.assertFalse(pages[0].has_previous)
+        self.assertIsNone(pages[-1].next_cursor)
+
+        back = keyset_page(qs, pages[-1].previous_cursor, 3)
+        self.assertEqual([m.id for m in back], self.expected[3:6])
+        self.assertTrue(back.has_next and back.has_previous)
+        first = keyset_page(qs, back.previous_cursor, 3)
+        self.assertEqual([m.id for m in first], self.expected[:3])
+        self.assertFalse(first.has_previous)
+
+    def test_garbled_cursor_is_the_first_page(self):
+        for token in ("", "not-base64!", "WyJzaWRld2F5cyIsICIyMDI0LTAxLTAxIiwgMV0", "bnVsbA"):
+            self.assertIsNone(decode_cursor(token), token)
+        page = keyset_page(StudentMark.objects.all(), "garbage", 3)
+        self.assertEqual([m.id for m in page], self.expected[:3])
+
+    def test_api_page_size_and_links(self):
+        client = _staff_client()
+        url = reverse("api-marks-list")
+        data = client.get(url, {"page_size": 4}).json()
+        self.assertEqual([m["id"] for m in data["results"]], self.expected[:4])
+        self.assertIsNone(data["previous"])
+        rest = client.get(data["next"]).json()
+        self.assertEqual([m["id"] for m in rest["results"]], self.expected[4:])
+        self.assertIsNone(rest["next"])
+        self.assertEqual(len(client.get(url, {"page_size": 0}).json()["results"]), 1)
+        self.assertEqual(len(client.get(url, {"page_size": "x"}).json()["results"]), 7)
+
+    def test_list_page_links(self):
+        client = _staff_client()
+        for i in range(7, 14):
+            self._mark(i)
+        page = client.get(reverse("updatestudentmarks")).context["page_obj"]
+        self.assertEqual(len(page), 12)
+        self.assertContains(client.get(reverse("updatestudentmarks")), f"cursor={page.next_cursor}")
+        older = client.get(reverse("updatestudentmarks"), {"cursor": page.next_cursor}).context["page_obj"]
+        self.assertEqual((len(older), older.has_next, older.has_previous), (2, False, True))
+
+
+class RankTests(TestCase):
+    def setUp(self):
+        _, self.batch, grace, self.paper = _school()
+        ada = Student.objects.create(batch=self.batch, regno="G002", name="Ada")
+        alan = Student.objects.create(batch=self.batch, regno="G003", name="Alan")
+        self.students = [grace, ada, alan]
+
+    def _marks(self, *values):
+        with self.captureOnCommitCallbacks(execute=True):
+            for student, value in zip(self.students, values):
+                StudentMark.objects.create(student=student, paper=self.paper, batch=self.batch,
+                                           exam_type="External", marks=value)
+
+    def test_ranked_on_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            StudentMark.objects.create(student=self.students[0], paper=self.paper, batch=self.batch,
+                                       exam_type="External", marks=70)
+        self.assertFalse(MarkRank.objects.exists())  # nothing until the commit
+        for callback in callbacks:
+            callback()
+        self.assertEqual(MarkRank.objects.get().dense_rank, 1)
+
+    def test_dense_ranks_and_percentiles(self):
+        self._marks(90, 70, 90)
+        ranks = {r.mark.student.regno: (r.dense_rank, r.percentile)
+                 for r in MarkRank.objects.select_related("mark__student")}
+        self.assertEqual(ranks, {"G001": (1, Decimal("100.00")), "G002": (2, Decimal("33.33")),
+                                 "G003": (1, Decimal("100.00"))})
+        self.assertEqual(dict(BatchRank.objects.values_list("student__regno", "dense_rank")),
+                         {"G001": 1, "G002": 2, "G003": 1})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            mark = StudentMark.objects.get(student=self.students[1])
+            mark.marks = 95
+            mark.save()
+        self.assertEqual(dict(BatchRank.objects.values_list("student__regno", "dense_rank")),
+                         {"G001": 2, "G002": 1, "G003": 2})
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        _, self.batch, self.student, self.paper = _school()
+        self.mark = StudentMark.objects.create(student=self.student, paper=self.paper, batch=self.batch,
+                                               exam_type="External", marks=70)
+
+    def _found(self, query, queryset=None):
+        return list(search(StudentMark.objects.all() if queryset is None else queryset, query))
+
+    def test_every_term_matches_anywhere(self):
+        self.mark.refresh_from_db()
+        self.assertEqual(self.mark.search_document, "g001 grace p-1 core external 2024-a mca")
+        self.assertEqual(self._found("GRACE  core"), [self.mark])
+        self.assertEqual(self._found("mca g001"), [self.mark])
+        self.assertEqual(self._found("grace internal"), [])
+        self.assertEqual(self._found("   "), [self.mark])
+        self.assertEqual(list(search(Student.objects.all(), "2024-a grace")), [self.student])
+        self.assertEqual(list(IcontainsSearch().filter(StudentMark.objects.all(), "Core")), [self.mark])
+
+    def test_renames_refresh_documents(self):
+        self.paper.name = "Algorithms"
+        self.paper.save()
+        self.assertEqual(self._found("algorithms"), [self.mark])
+        self.batch.course.name = "MSc"
+        self.batch.course.save()
+        self.assertEqual(self._found("msc"), [self.mark])
+        self.assertEqual(list(search(Student.objects.all(), "msc")), [self.student])
+        self.student.name = "Hopper"
+        self.student.save()
+        self.assertEqual(self._found("hopper"), [self.mark])
+        self.assertEqual(self._found("grace"), [])
+
+    def test_moved_mark_is_reindexed(self):
+        other = Student.objects.create(batch=self.batch, regno="G002", name="Ada")
+        self.mark.student = other
+        self.mark.save()
+        self.assertEqual(self._found("ada"), [self.mark])
+        self.assertEqual(self._found("grace"), [])
+
+    def test_api_search(self):
+        Student.objects.create(batch=self.batch, regno="G002", name="Ada")
+        client = _staff_client()
+        data = client.get(reverse("api-students-list"), {"search": "ada"}).json()
+        self.assertEqual([s["regno"] for s in data["results"]], ["G002"])
+        data = client.get(reverse("api-marks-list"), {"search": "grace p-1"}).json()
+        self.assertEqual([m["id"] for m in data["results"]], [self.mark.pk])
+
+
+class IndexTests(TestCase):
+    def test_hot_queries_use_their_index(self):
+        # EXPLAIN names the index on both SQLite and PostgreSQL; the planner may still
+        # pick a scan on an empty table, so only SQLite (deterministic on any size) is asserted
+        if connection.vendor != "sqlite":
+            self.skipTest("plan check runs on SQLite")
+        for queryset, index in (
+            (StudentMark.objects.order_by("-created_at", "-id")[:50], "mark_created_id"),
+            (StudentMark.objects.filter(student_id=1).order_by("-created_at")[:5], "mark_student_created"),
+            (StudentMark.objects.filter(batch_id=1, paper_id=1, exam_type="External"), "mark_batch_paper_exam"),
+            (Student.objects.order_by("-created_at", "-id")[:50], "student_created_id"),
+            (Student.objects.filter(batch_id=1, is_active=True).order_by("regno"), "student_active_batch_regno"),
+            (Batch.objects.filter(course_id=1, is_active=True).order_by("name"), "batch_active_course_name"),
+            (MarkRank.objects.filter(batch_id=1, paper_id=1, exam_type="External").order_by("dense_rank"),
+             "mark_rank_partition"),
+            (BatchRank.objects.filter(batch_id=1).order_by("dense_rank"), "batch_rank_order"),
+        ):
+            self.assertIn(index, queryset.explain(), index)
+
+    def test_models_and_migrations_agree(self):
+        names = {i.name for model in (Batch, Student, StudentMark) for i in model._meta.indexes}
+        self.assertTrue({"student_regno_upper", "student_email_upper", "mark_created_id"} <= names)
+        out = io.StringIO()
+        call_command("makemigrations", "student", check=True, dry_run=True, stdout=out)
+        self.assertIn("No changes detected", out.getvalue())
+
+
+class CacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_bump_rebuilds(self):
+        calls = []
+
+        def build():
+            calls.append(1)
+            return len(calls)
+
+        self.assertEqual(cached("t", ["Course"], ("a",), build), 1)
+        self.assertEqual(cached("t", ["Course"], ("a",), build), 1)
+        self.assertEqual(cached("t", ["Course"], ("b",), build), 2)  # other parts, other entry
+        bump("Paper")
+        self.assertEqual(cached("t", ["Course"], ("a",), build), 1)
+        bump("Course")
+        self.assertEqual(cached("t", ["Course"], ("a",), build), 3)
+
+    def test_versions_survive_eviction(self):
+        before = versions(["Course"])
+        cache.delete("tms:v:Course")
+        time.sleep(0.002)
+        self.assertGreater(versions(["Course"]), before)  # never back to an old number
+
+    def test_pages_follow_commits(self):
+        client = _staff_client()
+        Course.objects.create(name="MCA", courseid="MCA01")
+        self.assertContains(client.get(reverse("displaycourse")), "MCA01")
+        with self.captureOnCommitCallbacks(execute=True):
+            Course.objects.create(name="MBA", courseid="MBA01")
+        self.assertContains(client.get(reverse("displaycourse")), "MBA01")
+
+    def test_file_cache_is_shared(self):
+        with tempfile.TemporaryDirectory() as location, \
+                override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                                                      "LOCATION": location}}):
+            before = versions(["Course"])
+            other = FileBasedCache(location, {})  # what another worker process opens
+            self.assertEqual(other.get("tms:v:Course"), before[0])
+            bump("Course")
+            self.assertEqual(other.get("tms:v:Course"), before[0] + 1)
+
+
+class FlatFieldsTests(TestCase):
+    def setUp(self):
+        _, self.batch, self.student, self.paper = _school()
+        self.mark = StudentMark.objects.create(student=self.student, paper=self.paper, batch=self.batch,
+                                               exam_type="External", marks=70)
+        self.client = _staff_client()
+        self.url = reverse("api-marks-list")
+
+    def test_fields_pick_columns(self):
+        row = self.client.get(self.url, {"fields": "regno, paper_code,marks,rank"}).json()["results"][0]
+        self.assertEqual(row, {"regno": "G001", "paper_code": "P-1", "marks": "70.00", "rank": None})
+        row = self.client.get(reverse("api-students-detail", args=[self.student.pk]),
+                              {"fields": "regno,course_name"}).json()
+        self.assertEqual(row, {"regno": "G001", "course_name": "MCA"})
+
+    def test_expand_embeds_nested(self):
+        row = self.client.get(self.url, {"fields": "id", "expand": "student"}).json()["results"][0]
+        self.assertEqual(row["id"], self.mark.pk)
+        self.assertEqual(row["student"]["regno"], "G001")
+        self.assertEqual(len(self.client.get(self.url, {"fields": ""}).json()["results"][0]),
+                         len(StudentMarkFlatSerializer.flat_fields))
+
+    def test_without_parameters_stays_nested(self):
+        row = self.client.get(self.url).json()["results"][0]
+        self.assertIsInstance(row["student"], dict)
+
+    def test_unknown_names_are_400(self):
+        response = self.client.get(self.url, {"fields": "regno,password", "expand": "grades"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"fields": ["Unknown field 'password'."],
+                                           "expand": ["Unknown field 'grades'."]})
+
+
+class BulkMarksTests(TestCase):
+    def setUp(self):
+        _, self.batch, self.student, self.paper = _school()
+        self.url = reverse("api-marks-bulk")
+        self.client = _staff_client()
+
+    def _item(self, **overrides):
+        return {"student_id": self.student.pk, "paper_id": self.paper.pk, "exam_type": "External",
+                "batch_id": self.batch.pk, "marks": "70", **overrides}
+
+    def test_admin_or_staff_only(self):
+        User.objects.create_user("G001", password="x")  # a student account (default role)
+        student = Client()
+        student.login(username="G001", password="x")
+        for client in (student, Client()):
+            response = client.post(self.url, [self._item()], content_type="application/json")
+            self.assertEqual(response.status_code, 403)
+        self.assertFalse(StudentMark.objects.exists())
+
+    def test_per_item_statuses(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            data = self.client.post(self.url, [
+                self._item(),
+                self._item(),                          # repeats item 0
+                self._item(exam_type="Internal", marks="150"),
+                self._item(paper_id=999, exam_type="Internal"),
+                {"marks": "10"},
+            ], content_type="application/json").json()
+        self.assertEqual((data["created"], data["failed"]), (1, 4))
+        self.assertEqual([r["status"] for r in data["results"]], ["created"] + ["error"] * 4)
+        self.assertEqual(data["results"][1]["errors"], {"non_field_errors": ["Duplicate of item 0."]})
+        self.assertIn("marks", data["results"][2]["errors"])
+        self.assertEqual(data["results"][3]["errors"], {"paper_id": ["Unknown paper."]})
+        self.assertIn("student_id", data["results"][4]["errors"])
+
+        mark = StudentMark.objects.get()
+        self.assertEqual(mark.percentage, Decimal("70.00"))
+        again = self.client.post(self.url, [self._item()], content_type="application/json").json()
+        self.assertEqual(again["failed"], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            data = self.client.patch(self.url, [{"id": mark.pk, "marks": "20"}, {"id": 999, "marks": "1"}],
+                                     content_type="application/json").json()
+        self.assertEqual((data["updated"], data["failed"]), (1, 1))
+        mark.refresh_from_db()
+        self.assertEqual((mark.marks, mark.passed), (Decimal("20.00"), False))
+
+    def test_bad_payloads(self):
+        self.assertEqual(self.client.post(self.url, self._item(), content_type="application/json").status_code, 400)
+        with mock.patch.object(StudentMarkViewSet, "bulk_max_items", 2):
+            response = self.client.post(self.url, [self._item()] * 3, content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        _, self.batch, self.student, self.paper = _school()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.mark = StudentMark.objects.create(student=self.student, paper=self.paper, batch=self.batch,
+                                                   exam_type="External", marks=70)
+        self.client = _staff_client()
+
+    def _revalidate(self, url, etag, **params):
+        return self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+
+    def test_unchanged_list_is_304_without_queries(self):
+        url = reverse("api-marks-list")
+        etag = self.client.get(url)["ETag"]
+        self.client.get(url)  # session / identity warmed up
+        with self.assertNumQueries(2):  # session + user, nothing for the marks
+            response = self._revalidate(url, etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        self.assertEqual(self._revalidate(url, etag, fields="id").status_code, 200)  # another URL
+
+    def test_changes_move_the_etag(self):
+        url = reverse("api-marks-detail", args=[self.mark.pk])
+        etag = self.client.get(url)["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.mark.marks = 20
+            self.mark.save()
+        response = self._revalidate(url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["marks"], "20.00")
+
+        etag = response["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.paper.name = "Renamed"
+            self.paper.save()
+        self.assertEqual(self._revalidate(url, etag).status_code, 200)
+
+    def test_if_modified_since(self):
+        url = reverse("api-marks-detail", args=[self.mark.pk])
+        last_modified = self.client.get(url)["Last-Modified"]
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["Last-Modified"], last_modified)
+
+        time.sleep(1.1)  # HTTP dates count whole seconds
+        with self.captureOnCommitCallbacks(execute=True):
+            self.mark.marks = 20
+            self.mark.save()
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(parse_http_date(response["Last-Modified"]), parse_http_date(last_modified))
+
+    def test_rescore_moves_updated_at_and_etag(self):
+        url = reverse("api-marks-list")
+        etag = self.client.get(url)["ETag"]
+        before = StudentMark.objects.get().updated_at
+        with override_settings(TMS_PASS_THRESHOLD=80):
+            call_command("rebuild_summaries", stdout=io.StringIO())
+        mark = StudentMark.objects.get()
+        self.assertFalse(mark.passed)
+        self.assertGreater(mark.updated_at, before)
+        self.assertEqual(self._revalidate(url, etag).status_code, 200)
+
+    def test_exports(self):
+        url = reverse("export_marks_csv")
+        response = self.client.get(url)
+        _csv_rows(response)
+        self.assertEqual(self._revalidate(url, response["ETag"]).status_code, 304)
+        other = _staff_client("other")
+        self.assertEqual(other.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            StudentMark.objects.create(student=self.student, paper=self.paper, batch=self.batch,
+                                       exam_type="Internal", marks=30)
+        response = self._revalidate(url, response["ETag"])
+        self.assertEqual(len(_csv_rows(response)), 3)
+
+
+def _temp_export_dir(test):
+    """Point TMS_EXPORT_DIR at a directory removed after `test`."""
+    files = tempfile.TemporaryDirectory()
+    test.addCleanup(files.cleanup)
+    export_dir = test.settings(TMS_EXPORT_DIR=files.name)
+    export_dir.enable()
+    test.addCleanup(export_dir.disable)
+
+
+class ExportJobTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        _temp_export_dir(self)
+        _school()
+        self.client = _staff_client()
+        self.url = reverse("export_courses_csv")
+
+    def _queue(self, client, **params):
+        """Queue an export and run it at once (no worker threads); returns the 202 (or error) response."""
+        with mock.patch("student.jobs.submit", run_export_job), self.captureOnCommitCallbacks(execute=True):
+            return client.get(self.url, {"background": "1", **params}, HTTP_ACCEPT="application/json")
+
+    def _urls(self, response):
+        pk = response.json()["id"]
+        return reverse("export_job_status", args=[pk]), reverse("export_job_download", args=[pk])
+
+    def test_identical_requests_share_one_job(self):
+        first = self._queue(self.client)
+        other = _staff_client("other")
+        second = self._queue(other)
+        self.assertEqual(second.status_code, 202)
+        self.assertEqual(second.json()["id"], first.json()["id"])
+        self.assertEqual(ExportJob.objects.count(), 1)
+        _, download_url = self._urls(first)
+        for client in (self.client, other):
+            self.assertEqual([j.pk for j in client.get(reverse("reports_home")).context["jobs"]],
+                             [first.json()["id"]])
+            body = b"".join(client.get(download_url).streaming_content).decode()
+            self.assertEqual(body.splitlines()[1].split(",")[1], "MCA01")
+        self.assertNotEqual(self._queue(self.client, query="mca").json()["id"], first.json()["id"])
+
+    def test_one_active_job_per_parameters(self):
+        job, created = enqueue_export("courses", {})
+        self.assertTrue(created)
+        with mock.patch("student.jobs._coalesce", side_effect=[None, job]):
+            again, created = enqueue_export("courses", {})  # lost the race: the insert is refused
+        self.assertEqual((again.pk, created), (job.pk, False))
+
+    def test_only_requesters_and_admins_see_a_job(self):
+        status_url, download_url = self._urls(self._queue(self.client))
+        stranger = _staff_client("stranger")
+        self.assertEqual(stranger.get(status_url).status_code, 404)
+        self.assertEqual(stranger.get(download_url).status_code, 404)
+        self.assertEqual(stranger.get(reverse("reports_home")).context["jobs"].count(), 0)
+
+        admin_user = User.objects.create_user("boss", password="x")
+        Profile.objects.filter(user=admin_user).update(role="admin")
+        boss = Client()
+        boss.login(username="boss", password="x")
+        self.assertEqual(boss.get(status_url).json()["status"], "done")
+
+        User.objects.create_user("G001", password="x")
+        student = Client()
+        student.login(username="G001", password="x")
+        self.assertEqual(student.get(status_url).status_code, 403)
+        self.assertEqual(student.get(download_url).status_code, 403)
+        self.assertEqual(self._queue(student).status_code, 403)
+        self.assertEqual(student.get(self.url).status_code, 200)  # streaming stays open
+
+
+@skipUnless(find_spec("openpyxl"), "openpyxl is an optional dependency")
+class XlsxExportTests(TestCase):
+    def setUp(self):
+        _, batch, _, paper = _school()
+        student = Student.objects.create(batch=batch, regno="MCA/2024/01", name="Slash")
+        StudentMark.objects.create(student=student, paper=paper, batch=batch, exam_type="External", marks=70)
+        self.client = _staff_client()
+
+    def test_regno_with_slashes(self):
+        from openpyxl import load_workbook
+
+        response = self.client.get(reverse("export_marks_csv"), {"regno": "MCA/2024/01", "format": "xlsx"})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('filename="marks_MCA202401.xlsx"', response["Content-Disposition"])
+        sheet = load_workbook(io.BytesIO(b"".join(response.streaming_content))).active
+        self.assertEqual(sheet.title, "marks_MCA202401")
+        self.assertEqual([c.value for c in sheet[2]][:2], ["MCA/2024/01", "Slash"])
+
+    def test_sheet_title_drops_invalid_characters(self):
+        from openpyxl import load_workbook
+
+        export = build_export("marks", {})
+        export.filename = "a/b\\c?d*e[f]g:h_and_a_very_long_tail_for_the_title.csv"
+        out = io.BytesIO()
+        write_export(export, "xlsx", out)
+        title = load_workbook(io.BytesIO(out.getvalue())).active.title
+        self.assertEqual(title, "a_b_c_d_e_f_g_h_and_a_very_long")
+
+
+class SnapshotTests(TestCase):
+    def setUp(self):
+        _, self.batch, self.student, self.paper = _school()
+        self._mark(self.student, 70)
+        build_snapshots()  # the first run is a full one
+
+    def _mark(self, student, marks, exam_type="External"):
+        with self.captureOnCommitCallbacks(execute=True):
+            StudentMark.objects.create(student=student, paper=self.paper, batch=self.batch, exam_type=exam_type,
+                                       marks=marks)
+
+    def _current(self):
+        return ReportSnapshot.objects.get(is_current=True)
+
+    def test_incremental_run_rebuilds_dirty_partitions(self):
+        self.assertEqual(self._current().mark_count, 1)
+        self.assertFalse(ReportDirtyPartition.objects.exists())
+        self._mark(Student.objects.create(batch=self.batch, regno="G002", name="Ada"), 30)
+        run = build_snapshots()
+        self.assertEqual((run.full, run.partitions), (False, 1))
+        current = self._current()
+        self.assertEqual((current.mark_count, current.pass_count, current.avg_marks), (2, 1, Decimal("50.00")))
+        self.assertEqual(ReportSnapshot.objects.filter(is_current=False).count(), 1)
+        self.assertFalse(ReportDirtyPartition.objects.exists())
+
+    def test_mark_made_during_a_run_is_kept(self):
+        ada = Student.objects.create(batch=self.batch, regno="G002", name="Ada")
+        alan = Student.objects.create(batch=self.batch, regno="G003", name="Alan")
+        self._mark(ada, 30)
+        build_chunk = snapshots._build_chunk
+
+        def racing(run, chunk):
+            built = build_chunk(run, chunk)
+            time.sleep(0.002)
+            self._mark(alan, 90)  # after the partition was read
+            return built
+
+        with mock.patch.object(snapshots, "_build_chunk", racing):
+            build_snapshots()
+        self.assertEqual(self._current().mark_count, 2)
+        self.assertTrue(ReportDirtyPartition.objects.exists())  # left for the next run
+        build_snapshots()
+        self.assertEqual(self._current().mark_count, 3)
+        self.assertFalse(ReportDirtyPartition.objects.exists())
+
+
+    def test_writer_committing_after_the_read_is_kept(self):
+        ada = Student.objects.create(batch=self.batch, regno="G002", name="Ada")
+        self._mark(ada, 30)
+        read_at = ReportDirtyPartition.objects.get().marked_at
+        build_chunk = snapshots._build_chunk
+
+        def racing(run, chunk):
+            built = build_chunk(run, chunk)
+            # writers that stamped marked_at before the run started but committed after it read
+            self._mark(ada, 40, "Internal")
+            self._mark(Student.objects.create(batch=self.batch, regno="G003", name="Alan"), 90)
+            ReportDirtyPartition.objects.update(marked_at=read_at + timedelta(microseconds=1))
+            return built
+
+        with mock.patch.object(snapshots, "_build_chunk", racing):
+            build_snapshots()
+        self.assertEqual(set(ReportDirtyPartition.objects.values_list("exam_type", flat=True)),
+                         {"External", "Internal"})
+        build_snapshots()
+        self.assertFalse(ReportDirtyPartition.objects.exists())
+        self.assertEqual(ReportSnapshot.objects.filter(is_current=True).count(), 2)
+
+class AutocompleteTests(TestCase):
+    def test_prefix_match_and_keyset_pages(self):
+        generate(seed=1, **LARGE)
+        seen, cursor = [], None
+        while True:
+            page = lookup("students", "sy", cursor, page_size=7)
+            seen += [row["id"] for row in page["results"]]
+            cursor = page["next"]
+            if not cursor:
+                break
+        self.assertEqual(seen, list(Student.objects.order_by("regno").values_list("pk", flat=True)))
+        self.assertEqual(lookup("students", "nobody")["results"], [])
+
+
+class MarkScoreTests(TestCase):
+    def setUp(self):
+        generate(seed=1, **SMALL)
+
+    def test_generated_marks_match_a_rescore(self):
+        stored = set(StudentMark.objects.values_list("pk", "percentage", "passed"))
+        StudentMark.objects.update(percentage=None, passed=False)
+        rescore_all_marks()
+        self.assertEqual(set(StudentMark.objects.values_list("pk", "percentage", "passed")), stored)
+
+    @override_settings(TMS_PASS_THRESHOLD=50)
+    def test_max_marks_change_rescores_the_paper(self):
+        mark = StudentMark.objects.select_related("paper").first()
+        mark.marks = mark.paper.max_marks / 2
+        mark.save()
+        mark.refresh_from_db()
+        self.assertEqual((mark.percentage, mark.passed), (Decimal("50.00"), True))
+        mark.paper.max_marks *= 2
+        mark.paper.save()
+        mark.refresh_from_db()
+        self.assertEqual((mark.percentage, mark.passed), (Decimal("25.00"), False))
+
+
+    def test_only_changed_marks_move_updated_at(self):
+        mark = StudentMark.objects.order_by("pk").first()
+        siblings = StudentMark.objects.filter(student=mark.student).exclude(pk=mark.pk)
+        self.assertTrue(siblings.exists())  # other exams / papers of the same student
+        before = dict(StudentMark.objects.exclude(pk=mark.pk).values_list("pk", "updated_at"))
+        with self.captureOnCommitCallbacks(execute=True):
+            mark.marks = mark.marks / 2
+            mark.save()
+        self.assertEqual(dict(StudentMark.objects.exclude(pk=mark.pk).values_list("pk", "updated_at")), before)
+
+        before = dict(StudentMark.objects.values_list("pk", "updated_at"))
+        rescore_all_marks()  # nothing to change
+        self.assertEqual(dict(StudentMark.objects.values_list("pk", "updated_at")), before)
+
+class GradingTests(TestCase):
+    def setUp(self):
+        course = Course.objects.create(name="MCA", courseid="MCA01")
+        self.batch = Batch.objects.create(course=course, name="2024-A", year="2024-2025")
+        self.student = Student.objects.create(batch=self.batch, regno="G001", name="Grace")
+        self.core = Paper.objects.create(code="P-1", name="Core", max_marks=100, credits=4)
+        self.lab = Paper.objects.create(code="P-2", name="Lab", max_marks=50, credits=2)
+
+    def _mark(self, paper, exam_type, marks):
+        with self.captureOnCommitCallbacks(execute=True):
+            StudentMark.objects.create(student=self.student, paper=paper, batch=self.batch,
+                                       exam_type=exam_type, marks=marks)
+
+    def test_regraded_on_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            StudentMark.objects.create(student=self.student, paper=self.core, batch=self.batch,
+                                       exam_type="External", marks=95)
+        self.assertFalse(StudentGPA.objects.exists())  # nothing until the commit
+        for callback in callbacks:
+            callback()
+        self.assertEqual(PaperGrade.objects.get().letter, "O")
+
+    def test_weighted_grades_and_gpa(self):
+        self._mark(self.core, "Internal", 60)
+        self._mark(self.core, "External", 90)
+        self._mark(self.lab, "External", 15)
+        grades = dict(PaperGrade.objects.filter(student=self.student).values_list("paper__code", "letter"))
+        self.assertEqual(grades, {"P-1": "A", "P-2": "F"})  # (60 + 90) / 2 = 75; 15 / 50 = 30%
+        gpa = StudentGPA.objects.get(student=self.student)
+        self.assertEqual((gpa.gpa, gpa.credits_attempted, gpa.credits_earned),
+                         (Decimal("5.33"), Decimal("6.0"), Decimal("4.0")))
+
+        scheme = GradingScheme.objects.get(is_default=True)
+        ExamWeight.objects.create(scheme=scheme, exam_type="Internal", weight=1)
+        ExamWeight.objects.create(scheme=scheme, exam_type="External", weight=3)
+        regrade_batches([self.batch.pk])
+        core = PaperGrade.objects.get(student=self.student, paper=self.core)
+        self.assertEqual((core.weighted_percentage, core.letter), (Decimal("82.50"), "A+"))
+
+    def test_credit_change_regrades(self):
+        self._mark(self.core, "External", 95)
+        self._mark(self.lab, "External", 20)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lab.credits = 0
+            self.lab.save()
+        self.assertEqual(StudentGPA.objects.get(student=self.student).gpa, Decimal("10.00"))
+
+
+class ReportCardTests(TestCase):
+    def setUp(self):
+        generate(seed=1, **SMALL)
+
+    def _bundle(self, workers):
+        buf = io.BytesIO()
+        stats = build_report_cards(Batch.objects.all(), buf, workers=workers)
+        with zipfile.ZipFile(buf) as bundle:
+            return stats, {name: bundle.read(name) for name in bundle.namelist()}
+
+    def test_one_card_per_active_student(self):
+        stats, files = self._bundle(workers=1)
+        self.assertEqual(stats["cards"], Student.objects.filter(is_active=True).count())
+        self.assertEqual(len(files), stats["cards"])
+        student = Student.objects.order_by("regno").first()
+        [card] = [data for name, data in files.items() if name.endswith(f"/{student.regno}.html")]
+        self.assertIn(student.name.encode(), card)
+
+    def test_process_pool_matches_in_process(self):
+        _, serial = self._bundle(workers=1)
+        _, pooled = self._bundle(workers=2)
+        self.assertEqual(pooled, serial)
+
+    def test_same_batch_name_in_two_courses(self):
+        for courseid in ("MCA01", "MBA01"):
+            course = Course.objects.create(name=courseid, courseid=courseid)
+            batch = Batch.objects.create(course=course, name="2024-A", year="2024-2025")
+            Student.objects.create(batch=batch, regno=f"{courseid}-1", name="Twin")
+        stats, files = self._bundle(workers=1)
+        self.assertEqual(len(files), stats["cards"])
+        self.assertTrue({"MCA01/2024-A/MCA01-1.html", "MBA01/2024-A/MBA01-1.html"} <= set(files))
+
+
+@override_settings(TMS_REPORTCARD_WORKERS=1)
+class ReportCardJobTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        _temp_export_dir(self)
+        _, self.batch, _, _ = _school()
+        self.client = _staff_client()
+        self.url = reverse("report_cards")
+
+    def _post(self, client, **headers):
+        with mock.patch("student.jobs.submit", run_export_job), self.captureOnCommitCallbacks(execute=True):
+            return client.post(self.url, {"batch": self.batch.pk, "formats": ["html"]}, **headers)
+
+    def test_queued_then_downloaded(self):
+        response = self._post(self.client)
+        self.assertRedirects(response, reverse("reports_home"))
+        job = ExportJob.objects.get()
+        self.assertEqual((job.kind, job.status, job.rows_done, job.rows_total), ("report_cards", "done", 1, 1))
+        status = self.client.get(reverse("export_job_status", args=[job.pk])).json()
+        self.assertGreater(status["rows_per_sec"], 0)  # cards per second
+        self.assertIsNotNone(status["seconds"])
+        self.assertContains(self.client.get(reverse("reports_home")), f"{job.rows_per_sec} cards/s")
+        download = self.client.get(reverse("export_job_download", args=[job.pk]))
+        self.assertEqual(download["Content-Type"], "application/zip")
+        with zipfile.ZipFile(io.BytesIO(b"".join(download.streaming_content))) as bundle:
+            self.assertEqual(bundle.namelist(), ["MCA01/2024-A/G001.html"])
+
+        again = self._post(self.client, HTTP_ACCEPT="application/json")
+        self.assertEqual(again.status_code, 202)
+        self.assertEqual(again.json()["id"], job.pk)  # nothing changed: the same ZIP
+
+    def test_bad_requests(self):
+        response = self.client.post(self.url, {"formats": ["html"]})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Choose either a batch or a course.")
+        with mock.patch("student.views.weasyprint", side_effect=ReportCardError("no weasyprint")):
+            response = self.client.post(self.url, {"batch": self.batch.pk, "formats": ["pdf"]})
+        self.assertContains(response, "no weasyprint")
+        User.objects.create_user("G001", password="x")
+        student = Client()
+        student.login(username="G001", password="x")
+        self.assertEqual(self._post(student).status_code, 403)
+        self.assertFalse(ExportJob.objects.exists())
+
+
+class IdentityTests(TestCase):
+    def setUp(self):
+        generate(seed=1, **SMALL)
+        self.student = Student.objects.order_by("regno").first()
+        User.objects.create_user(self.student.regno, password="x")
+        self.client.login(username=self.student.regno, password="x")
+
+    def test_student_link_is_kept_in_the_session(self):
+        self.client.get(reverse("student_dashboard"))
+        self.assertEqual(self.client.session[SESSION_KEY]["student"], self.student.pk)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse("displaystudentmarks"))
+        self.assertFalse([q for q in queries if 'FROM "student_student"' in q["sql"]])
+        self.assertFalse([q for q in queries if 'FROM "student_profile"' in q["sql"]])
+
+    def test_student_change_relinks(self):
+        self.client.get(reverse("student_dashboard"))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.student.regno += "X"
+            self.student.save()
+        self.client.get(reverse("student_dashboard"))
+        self.assertIsNone(self.client.session[SESSION_KEY]["student"])
+
+
+
+def _sample(text, name, **labels):
+    """Value of one Prometheus sample in `text` (0 when the series does not exist yet)."""
+    wanted = "%s{%s} " % (name, ",".join(f'{k}="{v}"' for k, v in labels.items()))
+    for line in text.splitlines():
+        if line.startswith(wanted):
+            return float(line[len(wanted):])
+    return 0
+
+
+class MetricsTests(TestCase):
+    VIEW = {"view": "api-marks-list", "method": "GET"}
+
+    def setUp(self):
+        _, self.batch, self.student, self.paper = _school()
+        StudentMark.objects.create(student=self.student, paper=self.paper, batch=self.batch, exam_type="External",
+                                   marks=70)
+        self.client = _staff_client()
+
+    def _scrape(self):
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        return response.content.decode()
+
+    def test_request_is_recorded(self):
+        before = self._scrape()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("api-marks-list"))
+        query_count = len(queries)  # before the next request resets the query log
+        after = self._scrape()
+
+        def delta(name, **labels):
+            return _sample(after, name, **{**self.VIEW, **labels}) - _sample(before, name, **{**self.VIEW, **labels})
+
+        self.assertEqual(delta("tms_requests_total", status=200), 1)
+        for name in ("tms_request_duration_seconds", "tms_request_queries", "tms_request_sql_seconds",
+                     "tms_response_bytes"):
+            self.assertEqual(delta(f"{name}_count"), 1, name)
+            self.assertEqual(delta(f"{name}_bucket", le="+Inf"), 1, name)
+        self.assertEqual(delta("tms_request_queries_sum"), query_count)
+        self.assertGreater(delta("tms_request_sql_seconds_sum"), 0)
+        self.assertGreater(delta("tms_request_duration_seconds_sum"), delta("tms_request_sql_seconds_sum"))
+        self.assertEqual(delta("tms_response_bytes_sum"), len(response.content))
+        # buckets are cumulative: nothing at or below 0 queries, the request in every bucket from its own up
+        self.assertEqual(delta("tms_request_queries_bucket", le=0), 0)
+        self.assertEqual(delta("tms_request_queries_bucket", le=1000), 1)
+
+    def test_text_format(self):
+        self.client.get(reverse("api-marks-list"))
+        text = self._scrape()
+        self.assertIn("# TYPE tms_requests_total counter", text)
+        self.assertIn("# TYPE tms_request_duration_seconds histogram", text)
+        labels = 'view="api-marks-list",method="GET"'
+        buckets = [float(line.rsplit(" ", 1)[1]) for line in text.splitlines()
+                   if line.startswith(f"tms_response_bytes_bucket{{{labels},")]
+        self.assertEqual(len(buckets), 8)  # BYTES_BUCKETS and +Inf
+        self.assertEqual(buckets, sorted(buckets))
+        self.assertEqual(buckets[-1], _sample(text, "tms_response_bytes_count", **self.VIEW))
+        self.assertTrue(text.endswith("\n"))
+
+    def test_access(self):
+        url = reverse("metrics")
+        self.assertEqual(Client().get(url).status_code, 403)
+        User.objects.create_user("G001", password="x")
+        student = Client()
+        student.login(username="G001", password="x")
+        self.assertEqual(student.get(url).status_code, 403)
+        self.assertEqual(self.client.get(url).status_code, 200)
+        with override_settings(TMS_METRICS_TOKEN="s3cret"):
+            self.assertEqual(Client().get(url, HTTP_AUTHORIZATION="Bearer s3cret").status_code, 200)
+            self.assertEqual(Client().get(url, HTTP_AUTHORIZATION="Bearer wrong").status_code, 403)
+            self.assertEqual(student.get(url, HTTP_AUTHORIZATION="Bearer wrong").status_code, 403)
+        # no token configured: a bearer header alone is not enough
+        self.assertEqual(Client().get(url, HTTP_AUTHORIZATION="Bearer ").status_code, 403)
+
+    def test_server_timing(self):
+        url = reverse("api-marks-list")
+        self.assertNotIn("Server-Timing", self.client.get(url))
+        with override_settings(TMS_SERVER_TIMING=True):
+            client = _staff_client("timed")  # the middleware reads the setting when the handler is built
+            response = client.get(url)
+        self.assertRegex(response["Server-Timing"], r'^app;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ queries"$')
+
+# ---- query budgets ----
+
+# URL kwarg -> the model whose first row fills it; "pk" depends on the route
+KWARG_MODELS = {"course_id": Course, "batch_id": Batch, "paper_id": Paper, "student_id": Student, "mark_id": StudentMark}
+PK_MODELS = {
+    "delete1": Course, "delete2": Batch, "delete3": Paper, "delete4": Student, "delete5": StudentMark,
+    "export_job_status": ExportJob, "export_job_download": ExportJob,
+    "api-students-detail": Student, "api-marks-detail": StudentMark,
+    "api-grades-detail": StudentGPA,
+}
+SMALL = {"courses": 1, "batches": 2, "papers": 2, "students": 6, "exams": 2}
+LARGE = {"courses": 1, "batches": 3, "papers": 5, "students": 30, "exams": 3}
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+def _shape(sql):
+    """SQL with literals blanked, so one statement repeated per row counts as one shape."""
+    return _LITERALS.sub("?", sql)
+
+
+def _routes():
+    """(name, kwarg names) for every pattern in student/urls.py and student/api_urls.py."""
+    for pattern in urls.urlpatterns + api_urls.urlpatterns:
+        route = pattern.pattern
+        names = set(getattr(route, "converters", {})) | set(getattr(getattr(route, "regex", None), "groupindex", {}))
+        yield pattern.name, sorted(names)
+
+
+def _admin_changelists():
+    for model in admin.site._registry:
+        if model._meta.app_label == "student":
+            yield f"admin:student_{model._meta.model_name}_changelist"
+
+
+class QueryBudgetTests(TestCase):
+    """
+    Every route is requested (cold cache, body read) against a small and a larger dataset;
+    the query count must not grow with the number of rows.
+    """
+
+    def _url(self, name, kwarg_names):
+        kwargs = {}
+        for kwarg in kwarg_names:
+            if kwarg == "format":
+                kwargs[kwarg] = "json"
+            elif kwarg == "source":
+                kwargs[kwarg] = "students"
+            else:
+                model = PK_MODELS.get(name) if kwarg == "pk" else KWARG_MODELS.get(kwarg)
+                self.assertIsNotNone(model, f"no test object for {name} <{kwarg}>: add it to KWARG_MODELS/PK_MODELS")
+                kwargs[kwarg] = model.objects.order_by("pk").values_list("pk", flat=True).first()
+        url = reverse(name, kwargs=kwargs)
+        if name in ("cohort_trend", "cohort_trend_csv", "api-distribution"):
+            mark = StudentMark.objects.order_by("pk").first()
+            url += f"?batch={mark.batch_id}&paper={mark.paper_id}&exam_type={mark.exam_type}"
+        return url
+
+    def _clients(self):
+        admin_user = User.objects.create_superuser("qb_admin", password="x")
+        Profile.objects.filter(user=admin_user).update(role="admin")
+        student = Student.objects.order_by("regno").first()
+        User.objects.create_user(student.regno, password="x")  # dashboard resolves regno == username
+        clients = {}
+        for role, username in (("admin", "qb_admin"), ("student", student.regno)):
+            clients[role] = Client()
+            clients[role].login(username=username, password="x")
+        return clients
+
+    def _measure(self, sizes):
+        """{(role, url name): (url, [sql, ...])} for one dataset, rolled back afterwards."""
+        seen = {}
+        with transaction.atomic():
+            generate(seed=1, **sizes)
+            build_snapshots(full=True)
+            ExportJob.objects.create(kind="courses", params={}, params_hash="qb")
+            clients = self._clients()
+            targets = [(name, self._url(name, kwargs)) for name, kwargs in _routes()]
+            admin_targets = [(name, reverse(name)) for name in _admin_changelists()]
+            # logging out ends the session the other requests run in
+            targets.sort(key=lambda target: target[0] == "logout")
+            for role, client in clients.items():
+                for name, url in (admin_targets if role == "admin" else []) + targets:
+                    cache.clear()
+                    with CaptureQueriesContext(connection) as queries:
+                        response = client.get(url)
+                        if response.streaming:
+                            b"".join(response.streaming_content)
+                        response.close()
+                    self.assertLess(response.status_code, 500, f"{role} {url}")
+                    if name != "logout":
+                        self.assertFalse(response.get("Location", "").startswith(reverse("login")),
+                                         f"{role} {url} was sent to the login page")
+                    seen[(role, name, url.split("?")[0].endswith(".json"))] = (url, [q["sql"] for q in queries])
+            transaction.set_rollback(True)
+        return seen
+
+    def test_query_count_does_not_grow_with_rows(self):
+        small = self._measure(SMALL)
+        large = self._measure(LARGE)
+        failures = []
+        for key, (url, sqls) in sorted(large.items()):
+            _, small_sqls = small[key]
+            if len(sqls) <= len(small_sqls):
+                continue
+            grown = Counter(map(_shape, sqls)) - Counter(map(_shape, small_sqls))
+            examples = {}
+            for sql in sqls:
+                if _shape(sql) in grown:
+                    examples.setdefault(_shape(sql), sql)
+            failures.append(
+                f"{key[0]} GET {url}: {len(small_sqls)} queries with {SMALL['students']} students, "
+                f"{len(sqls)} with {LARGE['students']}; repeated per row:\n    "
+                + "\n    ".join(f"+{grown[shape]}x {sql}" for shape, sql in examples.items())
+            )
+        if failures:
+            self.fail("query count grows with the data:\n" + "\n".join(failures))
@@ -44,6 +44,9 @@ urlpatterns = [
 
     # StudentMark (transactions)
     path('insertstudentmarks/', views.insertstudentmarks, name='insertstudentmarks'),
+    path('autocomplete/<str:source>/', views.autocomplete, name='autocomplete'),
+    path('importstudentmarks/', views.importstudentmarks, name='importstudentmarks'),
+    path('gradebook/', views.gradebook, name='gradebook'),
     path('delete5/<int:pk>/', views.delete5, name='delete5'),
     path('deletestudentmarks/', views.deletestudentmarks, name='deletestudentmarks'),
     path('update5/<int:mark_id>/', views.update5, name='update5'),
@@ -57,4 +60,12 @@ urlpatterns = [
     path('export/papers/',  views.export_papers_csv,  name='export_papers_csv'),
     path('export/students/',views.export_students_csv, name='export_students_csv'),
     path('reports/export/marks/', views.export_marks_csv, name='export_marks_csv'),
+    path('reports/export/grades/', views.export_grades_csv, name='export_grades_csv'),
+    path('reports/exports/<int:pk>/', views.export_job_status, name='export_job_status'),
+    path('reports/exports/<int:pk>/download/', views.export_job_download, name='export_job_download'),
+    path('reports/cards/', views.report_cards, name='report_cards'),
+    path('reports/cohorts/', views.cohort_stats, name='cohort_stats'),
+    path('reports/cohorts/export/', views.cohort_stats_csv, name='cohort_stats_csv'),
+    path('reports/cohorts/trend/', views.cohort_trend, name='cohort_trend'),
+    path('reports/cohorts/trend/export/', views.cohort_trend_csv, name='cohort_trend_csv'),
 ]
@@ -1,17 +1,56 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import HttpResponse
+from django.http import (FileResponse, Http404, HttpResponse, HttpResponseBadRequest, JsonResponse,
+                         StreamingHttpResponse)
 from django.contrib.auth import authenticate, login, logout
-from django.contrib.auth.decorators import login_required, user_passes_test
+from django.contrib.auth.decorators import login_required
+from django.contrib.auth.views import redirect_to_login
 from django.contrib import messages
 from django.views.decorators.http import require_POST
-from django.db.models import  Avg, Count, Q
+from django.db.models import  Avg, Count, F, Q
+from decimal import Decimal, InvalidOperation
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 import csv
+import os
+import tempfile
 from functools import wraps
 from django.http import HttpResponseForbidden
+from django.conf import settings
+from django.utils.crypto import constant_time_compare
 
 from .models import *
 from .forms import *
+from .autocomplete import SOURCES, lookup
+from .cache import DERIVED_REBUILT, cached
+from .cardrender import ReportCardError, weasyprint
+from .conditional import not_modified, stamp, version_validators
+from .columnar import FORMATS, ExportFormatError, available_formats, filename_for, write_export
+from .exports import build_export, export_depends_on, export_params
+from .importers import ImportFileError, import_marks_file, upsert_marks
+from .jobs import content_type, enqueue_export, enqueue_report_cards, job_status
+from .metrics import render_metrics
+from .pagination import keyset_page
+from .search import search
+
+
+def _cached_page(name, depends_on, queryset, request, per_page):
+    """Paginator page for a display view, served from the versioned cache (student/cache.py)."""
+    page = request.GET.get('page', 1)
+
+    def build():
+        paginator = Paginator(queryset, per_page)
+        try:
+            page_obj = paginator.page(page)
+        except PageNotAnInteger:
+            page_obj = paginator.page(1)
+        except EmptyPage:
+            page_obj = paginator.page(paginator.num_pages)
+        # keep the page rows and the counts, not the whole queryset, in the cached copy
+        page_obj.object_list = list(page_obj.object_list)
+        paginator.num_pages  # memoised count, computed before the queryset is dropped
+        paginator.object_list = []
+        return page_obj
+
+    return cached(name, depends_on, (str(page), per_page), build)
 
 
 # --- auth + master ---
@@ -21,21 +60,15 @@ def master(request):
 
 def role_required(roles):
     """
-    Decorator to require user's profile.role to be one of roles.
+    Decorator to require the request's role (request.identity, see student/identity.py) to be one of roles.
     Usage: @login_required @role_required(['admin'])
     """
-    def _check(user):
-        prof = getattr(user, "profile", None)
-        return bool(prof and prof.role in roles)
-
     def decorator(view_func):
-        decorated = user_passes_test(_check)(view_func)
         @wraps(view_func)
         def _wrapped(request, *args, **kwargs):
             if not request.user.is_authenticated:
-                return decorated(request, *args, **kwargs)  # will redirect to login
-            prof = getattr(request.user, "profile", None)
-            if not (prof and prof.role in roles):
+                return redirect_to_login(request.get_full_path())
+            if not request.identity.has_role(*roles):
                 return HttpResponseForbidden("Forbidden")
             return view_func(request, *args, **kwargs)
         return _wrapped
@@ -77,11 +110,7 @@ def admin_create_user(request):
 def user_signup(request):
     if request.method == "POST":
         # decide whether role should be shown for this request
-        show_role = False
-        if request.user.is_authenticated:
-            prof = getattr(request.user, "profile", None)
-            if prof and prof.role == "admin":
-                show_role = True
+        show_role = request.identity.has_role("admin")
 
         form = SignupForm(request.POST, show_role=show_role)
         if form.is_valid():
@@ -101,9 +130,7 @@ def user_signup(request):
             messages.success(request, "User created. Please login.")
             return redirect('login')
     else:
-        show_role = False
-        if request.user.is_authenticated and getattr(request.user, "profile", None) and request.user.profile.role == "admin":
-            show_role = True
+        show_role = request.identity.has_role("admin")
         form = SignupForm(show_role=show_role)
 
     return render(request, "signup.html", {"form": form, "show_role": show_role})
@@ -146,9 +173,6 @@ def student_dashboard(request):
     NOTE: If you want to forbid students from viewing others, revert the small block
     that allows requested_regno for student role.
     """
-    user = request.user
-    profile = getattr(user, "profile", None)
-
     requested_regno = request.GET.get("regno", "").strip()
     student = None
 
@@ -160,8 +184,8 @@ def student_dashboard(request):
             return s
         return Student.objects.filter(regno__icontains=r).first()
 
-    # If the logged-in user has a Student record, fetch it
-    logged_user_student = find_student(user.username) if user.username else None
+    # The logged-in user's own Student record (regno == username, else email), see student/identity.py
+    logged_user_student = request.identity.student
 
     # --- RULES ---
     # By default show own student record (if linked)
@@ -193,41 +217,40 @@ def student_dashboard(request):
             "avg_mark": 0,
             "total_tests": 0,
             "pass_percent": 0,
+            "batch_rank": None,
             "subject_stats": [],
+            "gpa": None,
+            "paper_grades": [],
         })
 
-    # Compute marks and stats for `student`
-    marks_qs = StudentMark.objects.filter(student=student).select_related("paper", "batch")
-    last_marks = marks_qs.order_by("-created_at")[:5]
-    agg = marks_qs.aggregate(avg=Avg("marks"), total=Count("id"))
-    avg_mark = agg.get("avg") or 0
-    total_tests = agg.get("total") or 0
-
-    # pass % using paper.max_marks (40% rule)
-    passed = 0
-    total = 0
-    for m in marks_qs:
-        total += 1
-        try:
-            if m.paper and m.paper.max_marks and float(m.marks) >= 0.35 * float(m.paper.max_marks):
-                passed += 1
-        except Exception:
-            pass
-    pass_percent = (passed / total * 100) if total else 0
-
-    subject_stats = marks_qs.values("paper__name").annotate(
-        avg=Avg("marks"),
-        taken=Count("id")
-    ).order_by("-avg")[:6]
+    # Stats come from the precomputed summary rows (see student/summaries.py);
+    # ranks move with any mark in the batch, so the batch version is part of the key
+    def build():
+        summary = StudentSummary.objects.filter(student=student).first()
+        return {
+            "last_marks": list(StudentMark.objects.filter(student=student)
+                               .select_related("paper", "rank").order_by("-created_at")[:5]),
+            "avg_mark": summary.avg_marks if summary else 0,
+            "total_tests": summary.mark_count if summary else 0,
+            "pass_percent": round(summary.pass_percent, 1) if summary else 0,
+            "batch_rank": BatchRank.objects.filter(student=student, batch_id=student.batch_id).first(),
+            "subject_stats": list(student.paper_summaries.order_by("-avg_marks").values(
+                "paper__name", avg=F("avg_marks"), taken=F("mark_count")
+            )[:6]),
+            "gpa": StudentGPA.objects.filter(student=student, batch_id=student.batch_id).first(),
+            "paper_grades": list(PaperGrade.objects.filter(student=student, batch_id=student.batch_id)
+                                 .select_related("paper").order_by("paper__code")),
+        }
+
+    stats = cached("dashboard", [
+        "Student", "Paper", DERIVED_REBUILT,
+        f"StudentMark:student:{student.pk}", f"StudentMark:batch:{student.batch_id}",
+    ], (student.pk,), build)
 
     return render(request, "student_dashboard.html", {
         "student": student,
         "requested_regno": requested_regno,
-        "last_marks": last_marks,
-        "avg_mark": round(avg_mark, 2),
-        "total_tests": total_tests,
-        "pass_percent": round(pass_percent, 1),
-        "subject_stats": subject_stats,
+        **stats,
     })
 
 # ----- Course CRUD -----
@@ -324,18 +347,9 @@ def updatecourse(request):
 @login_required
 def displaycourse(request):
     course_list = Course.objects.all().order_by('courseid')  # queryset
-    per_page = 10  
-
-    paginator = Paginator(course_list, per_page)
-    page = request.GET.get('page', 1)
-
-    try:
-        page_obj = paginator.page(page)
-    except PageNotAnInteger:
-        page_obj = paginator.page(1)
-    except EmptyPage:
-        page_obj = paginator.page(paginator.num_pages)
+    per_page = 10
 
+    page_obj = _cached_page("displaycourse", ["Course"], course_list, request, per_page)
     return render(request, "course/displaycourse.html", {"page_obj": page_obj})
 
 
@@ -441,16 +455,7 @@ def displaybatch(request):
     batch_list = Batch.objects.select_related('course').all().order_by('course__courseid', 'name')
     per_page = 10
 
-    paginator = Paginator(batch_list, per_page)
-    page = request.GET.get('page', 1)
-
-    try:
-        page_obj = paginator.page(page)
-    except PageNotAnInteger:
-        page_obj = paginator.page(1)
-    except EmptyPage:
-        page_obj = paginator.page(paginator.num_pages)
-
+    page_obj = _cached_page("displaybatch", ["Batch", "Course"], batch_list, request, per_page)
     return render(request, "batch/displaybatch.html", {"page_obj": page_obj})
 
 
@@ -554,15 +559,7 @@ def displaypaper(request):
     paper_list = Paper.objects.all().order_by('code', 'name')
     per_page = 10
 
-    paginator = Paginator(paper_list, per_page)
-    page = request.GET.get('page', 1)
-    try:
-        page_obj = paginator.page(page)
-    except PageNotAnInteger:
-        page_obj = paginator.page(1)
-    except EmptyPage:
-        page_obj = paginator.page(paginator.num_pages)
-
+    page_obj = _cached_page("displaypaper", ["Paper"], paper_list, request, per_page)
     return render(request, "paper/displaypaper.html", {"page_obj": page_obj})
 
 
@@ -599,12 +596,7 @@ def deletestudent(request):
 
     qs = Student.objects.select_related('batch__course').all().order_by('regno')
     if q:
-        qs = qs.filter(
-            Q(regno__icontains=q) |
-            Q(name__icontains=q) |
-            Q(batch__name__icontains=q) |
-            Q(batch__course__name__icontains=q)
-        )
+        qs = search(qs, q)
 
     paginator = Paginator(qs, per_page)
     page = request.GET.get('page', 1)
@@ -643,12 +635,7 @@ def updatestudent(request):
 
     qs = Student.objects.select_related('batch__course').all().order_by('regno')
     if q:
-        qs = qs.filter(
-            Q(regno__icontains=q) |
-            Q(name__icontains=q) |
-            Q(batch__name__icontains=q) |
-            Q(batch__course__name__icontains=q)
-        )
+        qs = search(qs, q)
 
     paginator = Paginator(qs, per_page)
     page = request.GET.get('page', 1)
@@ -668,15 +655,7 @@ def displaystudent(request):
     student_list = Student.objects.select_related('batch__course').all().order_by('regno')
     per_page = 10
 
-    paginator = Paginator(student_list, per_page)
-    page = request.GET.get('page', 1)
-    try:
-        page_obj = paginator.page(page)
-    except PageNotAnInteger:
-        page_obj = paginator.page(1)
-    except EmptyPage:
-        page_obj = paginator.page(paginator.num_pages)
-
+    page_obj = _cached_page("displaystudent", ["Student", "Batch", "Course"], student_list, request, per_page)
     return render(request, "student/displaystudent.html", {"page_obj": page_obj})
 
 
@@ -696,6 +675,108 @@ def insertstudentmarks(request):
     return render(request, "studentmarks/insertstudentmarks.html", {"form": form})
 
 
+# ---------- Autocomplete for the student / paper / batch pickers (student/autocomplete.py) ----------
+@login_required
+@role_required(['admin','staff'])
+def autocomplete(request, source):
+    if source not in SOURCES:
+        raise Http404("Unknown autocomplete source.")
+    return JsonResponse(lookup(source, request.GET.get('q', ''), request.GET.get('cursor')))
+
+
+# ---------- Bulk import ----------
+@login_required
+@role_required(['admin','staff'])
+def importstudentmarks(request):
+    result = None
+    if request.method == "POST":
+        form = MarksImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            upload = form.cleaned_data['file']
+            try:
+                result = import_marks_file(upload, upload.name, dry_run=form.cleaned_data['dry_run'])
+            except ImportFileError as exc:
+                form.add_error('file', str(exc))
+            else:
+                if result.dry_run:
+                    messages.info(request, f"Dry run: {result.written} of {result.total} rows are valid.")
+                else:
+                    messages.success(request, f"Imported {result.written} of {result.total} rows.")
+    else:
+        form = MarksImportForm()
+    return render(request, "studentmarks/importstudentmarks.html", {"form": form, "result": result})
+
+
+# ---------- Gradebook (whole batch x paper x exam in one submit) ----------
+@login_required
+@role_required(['admin','staff'])
+def gradebook(request):
+    """
+    Grid of every active student in a batch with their marks for one paper/exam.
+    The sheet is picked with GET params (batch, paper, exam_type); POSTing the grid
+    validates all cells in memory and writes them with one bulk upsert.
+    Blank cells are left untouched.
+    """
+    form = GradebookForm(request.GET or None)
+    if not form.is_valid():
+        return render(request, "studentmarks/gradebook.html", {"form": form, "rows": None})
+
+    batch = form.cleaned_data['batch']
+    paper = form.cleaned_data['paper']
+    exam_type = form.cleaned_data['exam_type']
+
+    students = list(Student.objects.filter(batch=batch, is_active=True).order_by('regno').only('id', 'regno', 'name'))
+    existing = dict(StudentMark.objects.filter(batch=batch, paper=paper, exam_type=exam_type)
+                                       .values_list('student_id', 'marks'))
+
+    errors = {}
+    entered = {}
+    if request.method == "POST":
+        pending = []
+        for s in students:
+            raw = request.POST.get(f"marks_{s.id}", "").strip()
+            if not raw:
+                continue
+            entered[s.id] = raw
+            try:
+                value = Decimal(raw)
+                if not value.is_finite():  # "NaN" / "Infinity" parse, but compare with an exception
+                    raise InvalidOperation
+                value = value.quantize(Decimal("0.01"))
+            except InvalidOperation:
+                errors[s.id] = "Not a number."
+                continue
+            if value < 0:
+                errors[s.id] = "Cannot be negative."
+            elif paper.max_marks is not None and value > paper.max_marks:
+                errors[s.id] = f"Max is {paper.max_marks}."
+            elif existing.get(s.id) != value:
+                pending.append(((s.id, paper.id, exam_type, batch.id), value))
+
+        if errors:
+            messages.error(request, f"{len(errors)} entr{'y' if len(errors) == 1 else 'ies'} need fixing; nothing was saved.")
+        else:
+            upsert_marks(pending)
+            messages.success(request, f"Saved {len(pending)} mark{'' if len(pending) == 1 else 's'} for {batch.name} / {paper.code} / {exam_type}.")
+            return redirect(request.get_full_path())
+
+    rows = [
+        {
+            "student": s,
+            "value": entered.get(s.id, existing.get(s.id, "")),
+            "error": errors.get(s.id),
+        }
+        for s in students
+    ]
+    return render(request, "studentmarks/gradebook.html", {
+        "form": form,
+        "rows": rows,
+        "batch": batch,
+        "paper": paper,
+        "exam_type": exam_type,
+    })
+
+
 # ---------- Delete ----------
 @require_POST
 @login_required
@@ -714,24 +795,9 @@ def deletestudentmarks(request):
 
     qs = StudentMark.objects.select_related('student__batch__course', 'paper', 'batch').all().order_by('-created_at')
     if q:
-        qs = qs.filter(
-            Q(student__regno__icontains=q) |
-            Q(student__name__icontains=q) |
-            Q(paper__code__icontains=q) |
-            Q(paper__name__icontains=q) |
-            Q(exam_type__icontains=q) |
-            Q(batch__name__icontains=q) |
-            Q(batch__course__name__icontains=q)
-        )
+        qs = search(qs, q)
 
-    paginator = Paginator(qs, per_page)
-    page = request.GET.get('page', 1)
-    try:
-        page_obj = paginator.page(page)
-    except PageNotAnInteger:
-        page_obj = paginator.page(1)
-    except EmptyPage:
-        page_obj = paginator.page(paginator.num_pages)
+    page_obj = keyset_page(qs, request.GET.get('cursor'), per_page)
 
     return render(request, "studentmarks/deletestudentmarks.html", {"page_obj": page_obj, "query": q})
 
@@ -759,24 +825,9 @@ def updatestudentmarks(request):
 
     qs = StudentMark.objects.select_related('student__batch__course', 'paper', 'batch').all().order_by('-created_at')
     if q:
-        qs = qs.filter(
-            Q(student__regno__icontains=q) |
-            Q(student__name__icontains=q) |
-            Q(paper__code__icontains=q) |
-            Q(paper__name__icontains=q) |
-            Q(exam_type__icontains=q) |
-            Q(batch__name__icontains=q) |
-            Q(batch__course__name__icontains=q)
-        )
+        qs = search(qs, q)
 
-    paginator = Paginator(qs, per_page)
-    page = request.GET.get('page', 1)
-    try:
-        page_obj = paginator.page(page)
-    except PageNotAnInteger:
-        page_obj = paginator.page(1)
-    except EmptyPage:
-        page_obj = paginator.page(paginator.num_pages)
+    page_obj = keyset_page(qs, request.GET.get('cursor'), per_page)
 
     operation = request.GET.get('operation')
     return render(request, "studentmarks/updatestudentmarks.html", {"page_obj": page_obj, "query": q, "operation": operation})
@@ -787,155 +838,242 @@ def updatestudentmarks(request):
 def displaystudentmarks(request):
     """
     If logged-in user is a student, show only their marks.
-    We resolve the Student object by trying, in order:
+    The Student comes from request.identity (student/identity.py), which tries, in order:
       1) Student.regno == request.user.username
       2) Student.email == request.user.email (if user.email present)
     If none found, show empty list + hint message.
 
     Admin/staff see all marks (paginated).
     """
-    user = request.user
     per_page = 20
+    q = request.GET.get('query', '').strip()
 
     # If user is a student role -> filter
-    profile = getattr(user, "profile", None)
-    if profile and profile.role == "student":
-        # try to find Student object
-        student_qs = None
-        try:
-            student_qs = Student.objects.filter(regno__iexact=user.username)
-            if not student_qs.exists() and user.email:
-                student_qs = Student.objects.filter(email__iexact=user.email)
-        except Exception:
-            student_qs = Student.objects.none()
-
-        if student_qs.exists():
-            student_obj = student_qs.first()
+    identity = request.identity
+    if identity.has_role("student"):
+        if identity.student_id is not None:
             mark_list = StudentMark.objects.select_related('student__batch__course', 'paper', 'batch')\
-                                          .filter(student=student_obj).order_by('-created_at')
+                                          .filter(student_id=identity.student_id).order_by('-created_at')
+            scope, marks_version = identity.student_id, f"StudentMark:student:{identity.student_id}"
         else:
             # No matching Student found for this user -> empty queryset and message
             messages.info(request, "No student record found for your account. Contact admin to link your profile.")
             mark_list = StudentMark.objects.none()
+            scope, marks_version = None, "StudentMark"
     else:
         # admin / staff: show all (optionally support a query filter)
-        q = request.GET.get('query', '').strip()
         qs = StudentMark.objects.select_related('student__batch__course', 'paper', 'batch').all().order_by('-created_at')
         if q:
-            qs = qs.filter(
-                Q(student__regno__icontains=q) |
-                Q(student__name__icontains=q) |
-                Q(paper__code__icontains=q) |
-                Q(paper__name__icontains=q) |
-                Q(exam_type__icontains=q) |
-                Q(batch__name__icontains=q) |
-                Q(batch__course__name__icontains=q)
-            )
+            qs = search(qs, q)
         mark_list = qs
+        scope, marks_version = "all", "StudentMark"
 
-    # Pagination
-    paginator = Paginator(mark_list, per_page)
-    page = request.GET.get('page', 1)
-    try:
-        page_obj = paginator.page(page)
-    except PageNotAnInteger:
-        page_obj = paginator.page(1)
-    except EmptyPage:
-        page_obj = paginator.page(paginator.num_pages)
+    # Keyset pagination on (created_at, id): no COUNT(*), no OFFSET
+    cursor = request.GET.get('cursor')
+    page_obj = cached("displaystudentmarks",
+                      [marks_version, "Student", "Paper", "Batch", "Course"],
+                      (scope, q, cursor, per_page),
+                      lambda: keyset_page(mark_list, cursor, per_page))
 
-    return render(request, "studentmarks/displaystudentmarks.html", {"page_obj": page_obj})
+    return render(request, "studentmarks/displaystudentmarks.html", {"page_obj": page_obj, "query": q})
 
 
 # ------------- REPORTS -------------------
 @login_required
 def reports_home(request):
-    return render(request, "reports_home.html", {})
-
-# helper: create filename with timestamp
-def _csv_filename(prefix):
-    ts = timezone.now().strftime("%Y%m%d_%H%M%S")
-    return f"{prefix}_{ts}.csv"
+    jobs = ExportJob.objects.filter(requesters=request.user).order_by('-created_at')[:10]
+    return render(request, "reports_home.html", {"jobs": jobs})
 
-# ---------------- Courses ----------------
+# ---------------- Report cards (student/reportcards.py) ----------------
 @login_required
-def export_courses_csv(request):
-    # Optional: filter by query param 'query'
-    q = request.GET.get('query','').strip()
-    qs = Course.objects.all().order_by('courseid')
-    if q:
-        qs = qs.filter(Q(name__icontains=q) | Q(courseid__icontains=q))
+@role_required(['admin','staff'])
+def report_cards(request):
+    """
+    Pick a batch or course; POST queues a background job (student.jobs) that renders every
+    card into one ZIP. JSON clients get the job status (202), browsers go to Reports.
+    """
+    form = ReportCardForm(request.POST or None)
+    if request.method == "POST" and form.is_valid():
+        formats = form.cleaned_data['formats']
+        try:
+            if "pdf" in formats:
+                weasyprint()  # fail here, not in the job
+        except ReportCardError as exc:
+            form.add_error(None, str(exc))
+        else:
+            job, created = enqueue_report_cards(form.batch_ids(), formats, request.user)
+            if 'application/json' in request.headers.get('Accept', ''):
+                return JsonResponse(job_status(job), status=202)
+            if created:
+                messages.success(request, f"Report cards queued as #{job.pk}; they will appear below when ready.")
+            else:
+                messages.info(request, f"The same report cards are already available as #{job.pk}.")
+            return redirect('reports_home')
+    return render(request, "reportcards/report_cards.html", {"form": form})
+
+# ---------------- Cohort statistics (ReportSnapshot, see student/snapshots.py) ----------------
+SNAPSHOT_HEADER = ["Batch", "Paper Code", "Exam Type", "Max Marks", "Marks", "Passed", "Pass Rate %",
+                   "Average", "Median", "Std Dev", "Min", "Max", "Snapshot At"]
+SNAPSHOT_FIELDS = ("batch__name", "paper__code", "exam_type", "paper_max_marks", "mark_count", "pass_count",
+                   "pass_rate", "avg_marks", "median_marks", "stddev_marks", "min_marks", "max_marks", "taken_at")
+
+def _snapshot_filters(request):
+    """batch / paper / exam_type from the query string (ids for batch and paper)."""
+    filters = {}
+    for name in ("batch", "paper"):
+        value = request.GET.get(name, "").strip()
+        if value.isdigit():
+            filters[f"{name}_id"] = int(value)
+    exam_type = request.GET.get("exam_type", "").strip()
+    if exam_type:
+        filters["exam_type"] = exam_type
+    return filters
+
+def _snapshot_rows(qs):
+    return (
+        row[:-1] + (row[-1].strftime("%Y-%m-%d %H:%M"),)
+        for row in qs.values_list(*SNAPSHOT_FIELDS).iterator()
+    )
 
-    filename = _csv_filename("courses")
-    response = HttpResponse(content_type="text/csv")
-    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+@login_required
+@role_required(['admin','staff'])
+def cohort_stats(request):
+    """Current statistics per batch/paper/exam, as of the last snapshot run."""
+    filters = _snapshot_filters(request)
+    qs = ReportSnapshot.objects.filter(is_current=True, **filters).select_related('batch', 'paper')\
+                               .order_by('batch__name', 'paper__code', 'exam_type')
+    page_obj = Paginator(qs, 50).get_page(request.GET.get('page'))
+    return render(request, "cohort_stats.html", {
+        "page_obj": page_obj,
+        "filters": filters,
+        "batches": Batch.objects.order_by('name').values_list('id', 'name'),
+        "papers": Paper.objects.order_by('code').values_list('id', 'code'),
+        "exam_types": ReportSnapshot.objects.filter(is_current=True).order_by('exam_type')
+                                            .values_list('exam_type', flat=True).distinct(),
+        "last_run": ReportRun.objects.filter(finished_at__isnull=False).order_by('-started_at').first(),
+    })
 
-    writer = csv.writer(response)
-    writer.writerow(['id','courseid','name','created_at'])
-    for c in qs:
-        writer.writerow([c.id, c.courseid, c.name, c.created_at.isoformat()])
+@login_required
+@role_required(['admin','staff'])
+def cohort_stats_csv(request):
+    qs = ReportSnapshot.objects.filter(is_current=True, **_snapshot_filters(request))\
+                               .order_by('batch__name', 'paper__code', 'exam_type')
+    return _stream_csv("cohort_stats.csv", SNAPSHOT_HEADER, _snapshot_rows(qs))
 
-    return response
+def _trend_queryset(request):
+    filters = _snapshot_filters(request)
+    if len(filters) != 3:
+        return None
+    return ReportSnapshot.objects.filter(**filters).order_by('taken_at')
 
-# ---------------- Batches ----------------
 @login_required
-def export_batches_csv(request):
-    q = request.GET.get('query','').strip()
-    qs = Batch.objects.select_related('course').all().order_by('course__courseid','name')
-    if q:
-        qs = qs.filter(Q(name__icontains=q) | Q(year__icontains=q) |
-                       Q(course__courseid__icontains=q) | Q(course__name__icontains=q))
+@role_required(['admin','staff'])
+def cohort_trend(request):
+    """Snapshot history of one batch/paper/exam, oldest first."""
+    qs = _trend_queryset(request)
+    if qs is None:
+        return HttpResponseBadRequest("batch, paper and exam_type are required.")
+    return render(request, "cohort_trend.html", {
+        "snapshots": qs,
+        "batch": get_object_or_404(Batch, pk=request.GET["batch"]),
+        "paper": get_object_or_404(Paper, pk=request.GET["paper"]),
+        "exam_type": request.GET["exam_type"].strip(),
+    })
 
-    filename = _csv_filename("batches")
-    response = HttpResponse(content_type="text/csv")
-    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+@login_required
+@role_required(['admin','staff'])
+def cohort_trend_csv(request):
+    qs = _trend_queryset(request)
+    if qs is None:
+        return HttpResponseBadRequest("batch, paper and exam_type are required.")
+    return _stream_csv("cohort_trend.csv", SNAPSHOT_HEADER, _snapshot_rows(qs))
+
+class _Echo:
+    """Pseudo-buffer for csv.writer: write() returns the line instead of storing it."""
+    def write(self, value):
+        return value
+
+def _stream_csv(filename, header, rows):
+    """
+    Stream `rows` (an iterable of tuples) as a CSV attachment.
+    Nothing is buffered beyond the current line, so memory stays flat
+    and the first bytes go out as soon as the first chunk is read.
+    """
+    writer = csv.writer(_Echo())
 
-    writer = csv.writer(response)
-    writer.writerow(['id','courseid','course_name','batch_name','year','is_active'])
-    for b in qs:
-        writer.writerow([b.id, b.course.courseid if b.course else '', b.course.name if b.course else '',
-                         b.name, b.year or '', b.is_active])
+    def _lines():
+        yield writer.writerow(header)
+        for row in rows:
+            yield writer.writerow(row)
 
+    response = StreamingHttpResponse(_lines(), content_type="text/csv")
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
     return response
 
-# ---------------- Papers ----------------
-@login_required
-def export_papers_csv(request):
-    q = request.GET.get('query','').strip()
-    qs = Paper.objects.all().order_by('code')
-    if q:
-        qs = qs.filter(Q(name__icontains=q) | Q(code__icontains=q) | Q(paper_type__icontains=q))
+def _conditional_export(request, kind, build):
+    """Answer 304 when the client already holds this export (see student/conditional.py)."""
+    validators = version_validators(export_depends_on(kind), variant=(request.get_full_path(), request.user.pk))
+    return not_modified(request, validators) or stamp(build(), validators)
 
-    filename = _csv_filename("papers")
-    response = HttpResponse(content_type="text/csv")
-    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+def _export(request, kind):
+    """
+    Stream export `kind` (see student/exports.py), or with ?background=1 queue it as an
+    ExportJob: JSON clients get the job status (202), browsers go back to Reports.
+    """
+    fmt = request.GET.get('format', '').strip().lower() or 'csv'
+    if fmt not in available_formats(kind):
+        return HttpResponseBadRequest(f"Format '{fmt}' is not available for this export.")
+    params = export_params(kind, request.GET)
+    if request.GET.get('background'):
+        # job status and downloads are admin/staff pages; students stream their exports
+        if not request.identity.has_role('admin', 'staff'):
+            return HttpResponseForbidden("Forbidden")
+        job, created = enqueue_export(kind, params, request.user)
+        if 'application/json' in request.headers.get('Accept', ''):
+            return JsonResponse(job_status(job), status=202)
+        if created:
+            messages.success(request, f"Export #{job.pk} queued; it will appear below when ready.")
+        else:
+            messages.info(request, f"An identical export is already available as #{job.pk}.")
+        return redirect('reports_home')
 
-    writer = csv.writer(response)
-    writer.writerow(['id','code','name','paper_type','max_marks'])
-    for p in qs:
-        writer.writerow([p.id, p.code, p.name, p.paper_type, p.max_marks])
+    export = build_export(kind, params)
+    if fmt == 'csv':
+        return _conditional_export(request, kind,
+                                   lambda: _stream_csv(export.filename, export.header, export.rows))
 
-    return response
+    def build():
+        # columnar files need their footer written before the first byte can go out: spool to disk
+        tmp = tempfile.TemporaryFile()
+        try:
+            write_export(export, fmt, tmp)
+        except ExportFormatError as exc:
+            tmp.close()
+            return HttpResponseBadRequest(str(exc))
+        tmp.seek(0)
+        return FileResponse(tmp, as_attachment=True, filename=filename_for(export, fmt),
+                            content_type=FORMATS[fmt][1])
+    return _conditional_export(request, kind, build)
 
-# ---------------- Students ----------------
+# ---------------- Courses ----------------
 @login_required
-def export_students_csv(request):
-    q = request.GET.get('query','').strip()
-    qs = Student.objects.select_related('batch__course').all().order_by('regno')
-    if q:
-        qs = qs.filter(Q(regno__icontains=q) | Q(name__icontains=q) |
-                       Q(batch__name__icontains=q) | Q(batch__course__name__icontains=q))
+def export_courses_csv(request):
+    return _export(request, "courses")
 
-    filename = _csv_filename("students")
-    response = HttpResponse(content_type="text/csv")
-    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+# ---------------- Batches ----------------
+@login_required
+def export_batches_csv(request):
+    return _export(request, "batches")
 
-    writer = csv.writer(response)
-    writer.writerow(['id','regno','name','email','batch_name','course_name','is_active','created_at'])
-    for s in qs:
-        writer.writerow([s.id, s.regno, s.name, s.email or '', s.batch.name if s.batch else '',
-                         s.batch.course.name if s.batch and s.batch.course else '', s.is_active, s.created_at.isoformat()])
+# ---------------- Papers ----------------
+@login_required
+def export_papers_csv(request):
+    return _export(request, "papers")
 
-    return response
+# ---------------- Students ----------------
+@login_required
+def export_students_csv(request):
+    return _export(request, "students")
 
 # ---------------- Student Marks ----------------
 @login_required
@@ -945,80 +1083,45 @@ def export_marks_csv(request):
     Accepts:
       - regno=REG123   -> export marks for that student regno
       - query=...      -> a general text filter (regno/name/paper/batch etc)
-    Admin/staff can export arbitrary sets. Students can use this too (see privacy note).
+    Admin/staff can export arbitrary sets. Students can use this too (see the privacy note in exports.marks).
     """
+    return _export(request, "marks")
 
-    user = request.user
-    q_regno = request.GET.get('regno', '').strip()
-    q = request.GET.get('query', '').strip()
+# ---------------- Grades (student/grading.py) ----------------
+@login_required
+def export_grades_csv(request):
+    """Paper grades with GPA; ?regno= for one student, ?batch=<id> for one batch."""
+    return _export(request, "grades")
 
-    # build base queryset
-    qs = StudentMark.objects.select_related('student__batch__course', 'paper', 'batch').all().order_by('-created_at')
 
-    # Prefer regno param
-    if q_regno:
-        qs = qs.filter(student__regno__iexact=q_regno)
-    elif q:
-        qs = qs.filter(
-            Q(student__regno__icontains=q) |
-            Q(student__name__icontains=q) |
-            Q(paper__code__icontains=q) |
-            Q(paper__name__icontains=q) |
-            Q(exam_type__icontains=q) |
-            Q(batch__name__icontains=q) |
-            Q(batch__course__name__icontains=q)
-        )
+# ---------------- Background export jobs ----------------
+def _requested_job(request, pk, **filters):
+    """ExportJob `pk` if the user is one of its requesters (admins see every job), else 404."""
+    jobs = ExportJob.objects.filter(pk=pk, **filters)
+    if not request.identity.has_role('admin'):
+        jobs = jobs.filter(requesters=request.user)
+    return get_object_or_404(jobs)
 
-    # -----------------------------
-    # SECURITY / PRIVACY: optional restriction for students
-    # If you want to ensure students can only download:
-    #   - their own marks, or
-    #   - marks from their own batch,
-    # uncomment and adjust the block below.
-    #
-    # profile = getattr(user, "profile", None)
-    # if profile and profile.role == "student":
-    #     # OPTION A: only allow the student's own regno
-    #     qs = qs.filter(student__regno__iexact=user.username)
-    #
-    #     # OPTION B (alternative): allow students to download marks only for students in the *same batch*
-    #     # student_obj = Student.objects.filter(regno__iexact=user.username).first()
-    #     # if student_obj:
-    #     #     qs = qs.filter(batch=student_obj.batch)
-    #     # else:
-    #     #     qs = StudentMark.objects.none()
-    # -----------------------------
-
-    # Build CSV response
-    filename = "student_marks"
-    if q_regno:
-        filename = f"marks_{q_regno}"
-    elif q:
-        filename = f"marks_filtered"
-    filename = f"{filename}.csv"
-
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-
-    writer = csv.writer(response)
-    # header
-    writer.writerow([
-        "RegNo", "Student Name", "Course", "Batch", "Paper Code", "Paper Name",
-        "Exam Type", "Marks", "Max Marks", "Created At"
-    ])
-
-    for m in qs:
-        writer.writerow([
-            m.student.regno,
-            m.student.name,
-            (m.student.batch.course.name if m.student.batch and m.student.batch.course else ""),
-            (m.batch.name if m.batch else ""),
-            (m.paper.code if m.paper and getattr(m.paper, 'code', None) else ""),
-            (m.paper.name if m.paper else ""),
-            m.exam_type,
-            str(m.marks),
-            (str(m.paper.max_marks) if m.paper and getattr(m.paper, 'max_marks', None) else ""),
-            m.created_at.strftime("%Y-%m-%d %H:%M"),
-        ])
-
-    return response
\ No newline at end of file
+@login_required
+@role_required(['admin','staff'])
+def export_job_status(request, pk):
+    return JsonResponse(job_status(_requested_job(request, pk)))
+
+@login_required
+@role_required(['admin','staff'])
+def export_job_download(request, pk):
+    job = _requested_job(request, pk, status=ExportJob.DONE)
+    if not os.path.exists(job.file_path):
+        raise Http404("Export file has been removed.")
+    return FileResponse(open(job.file_path, "rb"), as_attachment=True, filename=job.filename,
+                        content_type=content_type(job))
+
+
+# ---------------- Metrics (student/metrics.py) ----------------
+def metrics(request):
+    """Prometheus scrape endpoint: "Authorization: Bearer <TMS_METRICS_TOKEN>", or an admin/staff session."""
+    token = getattr(settings, "TMS_METRICS_TOKEN", "")
+    scraper = token and constant_time_compare(request.headers.get("Authorization", ""), f"Bearer {token}")
+    if not (scraper or request.identity.has_role("admin", "staff")):
+        return HttpResponseForbidden("Forbidden")
+    return HttpResponse(render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8")
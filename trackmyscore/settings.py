@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+import sys
 from dotenv import load_dotenv
 
 
@@ -46,11 +47,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # outermost, so its latency covers every other middleware (student/metrics.py)
+    'student.metrics.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # request.identity: role + linked Student, cached in the session (student/identity.py)
+    'student.identity.IdentityMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -89,6 +94,18 @@ DATABASES = {
     }
 }
 
+# TMS_DB_ENGINE=sqlite: local runs (tests, manage.py benchmark) without a PostgreSQL server
+if os.environ.get("TMS_DB_ENGINE") == "sqlite":
+    DATABASES["default"] = {"ENGINE": "django.db.backends.sqlite3", "NAME": BASE_DIR / "db.sqlite3"}
+
+
+# The session user is loaded with its Profile joined in (student/identity.py).
+# ModelBackend stays listed so sessions logged in before the switch stay valid.
+AUTHENTICATION_BACKENDS = [
+    'student.identity.ProfileBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -140,4 +157,53 @@ REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
         "rest_framework.authentication.SessionAuthentication",
     ],
-}
\ No newline at end of file
+}
+
+# Search backend for the marks/student search boxes and the API ?search=
+# (student.search.IcontainsSearch restores the old multi-column icontains)
+TMS_SEARCH_BACKEND = "student.search.DocumentSearch"
+
+# A mark passes at this percentage of the paper's max marks (stored on StudentMark, student/scores.py).
+# After changing it run `manage.py rebuild_summaries` to re-score existing marks.
+TMS_PASS_THRESHOLD = float(os.environ.get("TMS_PASS_THRESHOLD", 35))
+
+# Versioned read cache for list pages, dashboards and API reads (student/cache.py).
+# Version bumps must reach every worker process, so the default is a file cache shared
+# through TMS_CACHE_DIR; TMS_REDIS_URL switches to Redis. Only the test runner (or
+# TMS_CACHE_BACKEND=locmem, for a single process) uses per-process local memory.
+if sys.argv[1:2] == ["test"] or os.environ.get("TMS_CACHE_BACKEND") == "locmem":
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "trackmyscore",
+            "OPTIONS": {"MAX_ENTRIES": 5000},
+        }
+    }
+elif os.environ.get("TMS_REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ["TMS_REDIS_URL"],
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.environ.get("TMS_CACHE_DIR", str(BASE_DIR / "cache")),
+        }
+    }
+TMS_CACHE_TIMEOUT = int(os.environ.get("TMS_CACHE_TIMEOUT", 300))
+
+# Background CSV exports (student/jobs.py): in-process worker threads, files kept on disk
+TMS_EXPORT_DIR = os.environ.get("TMS_EXPORT_DIR", str(BASE_DIR / "exports"))
+TMS_EXPORT_WORKERS = int(os.environ.get("TMS_EXPORT_WORKERS", 2))
+
+# Report cards (student/reportcards.py): render processes, 0 = one per CPU
+TMS_REPORTCARD_WORKERS = int(os.environ.get("TMS_REPORTCARD_WORKERS", 0))
+
+# Request metrics (student/metrics.py): /metrics in Prometheus format. Scrapers send
+# "Authorization: Bearer $TMS_METRICS_TOKEN"; without a token only admin/staff sessions can read it.
+TMS_METRICS_TOKEN = os.environ.get("TMS_METRICS_TOKEN", "")
+# add a Server-Timing header (app / db time, query count) to every response
+TMS_SERVER_TIMING = os.environ.get("TMS_SERVER_TIMING", "") == "1"
@@ -16,11 +16,12 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
-from student.views import master
+from student.views import master, metrics
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('student/', include('student.urls')),
     path('', master, name='master'),
     path('api/', include('student.api_urls')),
+    path('metrics', metrics, name='metrics'),
 ]